@@ -432,6 +432,16 @@ def simgenotype(
     show_default="all variants",
     help="If using a PGEN file, read genotypes in chunks of X variants; reduces memory",
 )
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    show_default="no caching",
+    help=(
+        "A directory in which to cache the parsed genotypes, so that later runs on the"
+        " same genotypes file are faster"
+    ),
+)
 @click.option(
     "--repeats",
     type=click.Path(exists=True, path_type=Path),
@@ -478,6 +488,7 @@ def simphenotype(
     ids: tuple[str] = tuple(),
     ids_file: Path = None,
     chunk_size: int = None,
+    cache_dir: Path = None,
     repeats: Path = None,
     seed: int = None,
     output: Path = Path("-"),
@@ -537,6 +548,7 @@ def simphenotype(
         samples,
         ids,
         chunk_size,
+        cache_dir,
         repeats,
         seed,
         output,
@@ -608,6 +620,16 @@ def simphenotype(
     show_default="all variants",
     help="If using a PGEN file, read genotypes in chunks of X variants; reduces memory",
 )
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    show_default="no caching",
+    help=(
+        "A directory in which to cache the parsed genotypes, so that later runs on the"
+        " same genotypes file are faster"
+    ),
+)
 @click.option(
     "--discard-missing",
     is_flag=True,
@@ -647,6 +669,7 @@ def transform(
     ids: tuple[str] = tuple(),
     ids_file: Path = None,
     chunk_size: int = None,
+    cache_dir: Path = None,
     discard_missing: bool = False,
     ancestry: bool = False,
     output: Path = Path("-"),
@@ -692,6 +715,7 @@ def transform(
         samples,
         ids,
         chunk_size,
+        cache_dir,
         discard_missing,
         ancestry,
         output,
@@ -768,6 +792,16 @@ def transform(
     show_default="all variants",
     help="If using a PGEN file, read genotypes in chunks of X variants; reduces memory",
 )
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    show_default="no caching",
+    help=(
+        "A directory in which to cache the parsed genotypes, so that later runs on the"
+        " same genotypes file are faster"
+    ),
+)
 @click.option(
     "--discard-missing",
     is_flag=True,
@@ -811,6 +845,7 @@ def ld(
     ids: tuple[str] = tuple(),
     ids_file: Path = None,
     chunk_size: int = None,
+    cache_dir: Path = None,
     discard_missing: bool = False,
     from_gts: bool = False,
     output: Path = Path("/dev/stdout"),
@@ -864,6 +899,7 @@ def ld(
         samples,
         ids,
         chunk_size,
+        cache_dir,
         discard_missing,
         from_gts,
         output,
@@ -871,7 +907,7 @@ def ld(
     )
 
 
-@main.command(short_help="Sort and index .hap files")
+@main.command(short_help="Sort and index .hap files or the variant IDs in a VCF")
 @click.argument("haplotypes", type=click.Path(exists=True, path_type=Path))
 @click.option(
     "--sort/--no-sort",
@@ -904,16 +940,121 @@ def index(
 ):
     """
     Takes in an unsorted .hap file and outputs it as a .gz and a .tbi file
+
+    If a VCF or BCF file is provided instead, an index of the variant IDs in the file
+    is written alongside it, so that variants can later be fetched by their IDs
+    without scanning the entire file
+
+    If a PGEN or PVAR file is provided, the variants in the PVAR file are stored in a
+    binary file alongside it, so that they can be loaded without parsing the PVAR file
     """
 
     from .index import index_haps
+    from .data import Genotypes, GenotypesPLINK
     from .logging import getLogger
 
     log = getLogger(name="index", level=verbosity)
 
+    if ".vcf" in haplotypes.suffixes or haplotypes.suffix == ".bcf":
+        Genotypes(haplotypes, log=log).build_id_index()
+        return
+    if haplotypes.suffix in (".pgen", ".pvar"):
+        GenotypesPLINK(haplotypes, log=log).build_pvar_cache()
+        return
+
     index_haps(haplotypes, sort, output, log)
 
 
+@main.command(short_help="Convert genotypes between the VCF/BCF and PGEN formats")
+@click.argument("genotypes", type=click.Path(exists=True, path_type=Path))
+@click.argument("output", type=click.Path(path_type=Path))
+@click.option(
+    "--region",
+    type=str,
+    default=None,
+    show_default="all variants",
+    help=(
+        "The region from which to extract genotypes; ex: 'chr1:1234-34566' or 'chr7'."
+        "\nFor this to work, the VCF must be indexed and the seqname provided must "
+        "correspond with one in the file"
+    ),
+)
+@click.option(
+    "-s",
+    "--sample",
+    "samples",
+    type=str,
+    multiple=True,
+    show_default="all samples",
+    help=(
+        "A list of the samples to subset from the genotypes file (ex: '-s sample1 -s"
+        " sample2')"
+    ),
+)
+@click.option(
+    "-S",
+    "--samples-file",
+    type=click.File("r"),
+    show_default="all samples",
+    help=(
+        "A single column txt file containing a list of the samples (one per line) to"
+        " subset from the genotypes file"
+    ),
+)
+@click.option(
+    "-c",
+    "--chunk-size",
+    type=int,
+    default=1000,
+    show_default=True,
+    help="Convert genotypes in chunks of X variants; reduces memory",
+)
+@click.option(
+    "-v",
+    "--verbosity",
+    type=click.Choice(["CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG", "NOTSET"]),
+    default="INFO",
+    show_default=True,
+    help="The level of verbosity desired",
+)
+def convert(
+    genotypes: Path,
+    output: Path,
+    region: str = None,
+    samples: tuple[str] = tuple(),
+    samples_file: Path = None,
+    chunk_size: int = 1000,
+    verbosity: str = "INFO",
+):
+    """
+    Convert a genotypes file from VCF/BCF to PGEN format or vice versa
+
+    GENOTYPES must be formatted as a VCF, BCF, or PGEN. The format of OUTPUT is
+    inferred from its file extension: PGEN if it ends with .pgen and VCF/BCF if it
+    ends with .vcf, .vcf.gz, or .bcf
+    """
+    from .logging import getLogger
+    from .convert import convert_genotypes
+
+    log = getLogger(name="convert", level=verbosity)
+
+    # handle samples
+    if samples and samples_file:
+        raise click.UsageError(
+            "You may only use one of --sample or --samples-file but not both."
+        )
+    if samples_file:
+        with samples_file as samps_file:
+            samples = set(samps_file.read().splitlines())
+    elif samples:
+        # needs to be converted from tuple to set
+        samples = set(samples)
+    else:
+        samples = None
+
+    convert_genotypes(genotypes, output, region, samples, chunk_size, log)
+
+
 @main.command(short_help="Clump summary stat files.")
 @click.option(
     "--summstats-snps",
@@ -0,0 +1,188 @@
+from __future__ import annotations
+import logging
+from contextlib import suppress
+from pathlib import Path
+
+import numpy as np
+import pgenlib
+from cyvcf2 import VCF
+
+from . import data
+from .logging import getLogger
+
+
+def _is_pgen(fname: Path) -> bool:
+    """
+    Infer the format of a genotypes file from its extension
+
+    Parameters
+    ----------
+    fname: Path
+        The path to the genotypes file
+
+    Raises
+    ------
+    ValueError
+        If the extension doesn't belong to a VCF/BCF or PGEN file
+
+    Returns
+    -------
+    bool
+        True if the file is a PGEN file and False if it is a VCF/BCF file
+    """
+    if fname.suffix == ".pgen":
+        return True
+    if ".vcf" in fname.suffixes or fname.suffix == ".bcf" or str(fname) == "-":
+        return False
+    raise ValueError(
+        f"Unsupported file extension for {fname}. Genotypes must be in VCF (.vcf or "
+        ".vcf.gz), BCF (.bcf), or PGEN (.pgen) format."
+    )
+
+
+def _scan_variants(
+    gts: data.GenotypesVCF, region: str = None, contigs: bool = True
+) -> tuple[int, list[str], int]:
+    """
+    Count the variants in a genotypes file, list their contigs, and find the max
+    number of alleles of any variant without loading any genotypes
+
+    Parameters
+    ----------
+    gts: data.GenotypesVCF
+        The genotypes file to scan
+    region : str, optional
+        See documentation for :py:meth:`~.data.Genotypes.read`
+    contigs: bool, optional
+        Whether the contigs of the variants are needed
+
+        If they aren't, the number of variants in a PGEN file can be obtained from its
+        header without parsing the PVAR file at all, unless a region is requested
+
+    Returns
+    -------
+    tuple[int, list[str], int]
+        The number of variants, the contigs of the variants in the order that they
+        first appear (or None if the contigs weren't needed), and the max number of
+        alleles of any variant
+
+        For PGEN files, the number of alleles is an upper bound taken from the whole
+        file, even if a region was requested
+    """
+    if isinstance(gts, data.GenotypesPLINK):
+        pv = pgenlib.PvarReader(bytes(str(gts.fname.with_suffix(".pvar")), "utf8"))
+        with pgenlib.PgenReader(bytes(str(gts.fname), "utf8"), pvar=pv) as pgen:
+            num_variants = pgen.get_variant_ct()
+        max_allele_ct = pv.get_max_allele_ct()
+        pv.close()
+        if region is None and not contigs:
+            return num_variants, None, max_allele_ct
+        scan = data.GenotypesPLINK(gts.fname, log=gts.log)
+        scan.read_variants(region=region, compact=True)
+        chroms = scan.variants["chrom"]
+        _, first_idxs = np.unique(chroms, return_index=True)
+        return len(chroms), chroms[np.sort(first_idxs)].tolist(), max_allele_ct
+    # the sample columns are not parsed, so this is much faster than reading them
+    vcf = VCF(str(gts.fname), samples=[], lazy=True)
+    num_variants = 0
+    max_allele_ct = 2
+    chroms = {}
+    for variant in vcf(region) if region else vcf:
+        chroms.setdefault(variant.CHROM, None)
+        max_allele_ct = max(max_allele_ct, len(variant.ALT) + 1)
+        num_variants += 1
+    vcf.close()
+    return num_variants, list(chroms) if contigs else None, max_allele_ct
+
+
+def convert_genotypes(
+    genotypes: Path,
+    output: Path,
+    region: str = None,
+    samples: set[str] = None,
+    chunk_size: int = 1000,
+    log: logging.Logger = None,
+):
+    """
+    Convert a genotypes file between the VCF/BCF and PGEN formats
+
+    The genotypes are streamed from the input to the output in chunks of variants,
+    so that at most chunk_size variants are ever stored in memory
+
+    Parameters
+    ----------
+    genotypes : Path
+        The path to the genotypes in VCF/BCF or PGEN format
+    output : Path
+        The path to which to write the genotypes
+
+        The format of the output is inferred from its extension: a .pgen extension
+        indicates a PGEN file, and a .vcf, .vcf.gz, or .bcf extension indicates a
+        VCF/BCF file
+    region : str, optional
+        See documentation for :py:meth:`~.data.Genotypes.read`
+    samples : set[str], optional
+        See documentation for :py:meth:`~.data.Genotypes.read`
+    chunk_size: int, optional
+        The max number of variants to store in memory at any given time
+    log : Logger, optional
+        A logging module to which to write messages about progress and any errors
+
+    Raises
+    ------
+    ValueError
+        If the format of the genotypes or output can't be inferred from its extension,
+        if there aren't any variants to convert, or if the number of variants that
+        were converted differs from the number that were counted beforehand
+    """
+    if log is None:
+        log = getLogger(name="convert", level="ERROR")
+
+    if _is_pgen(genotypes):
+        log.info("Loading genotypes from PGEN file")
+        gts = data.GenotypesPLINK(fname=genotypes, log=log, chunk_size=chunk_size)
+    else:
+        log.info("Loading genotypes from VCF/BCF file")
+        gts = data.GenotypesVCF(fname=genotypes, log=log)
+
+    if _is_pgen(output):
+        out = data.GenotypesPLINK(fname=output, log=log, chunk_size=chunk_size)
+    else:
+        out = data.GenotypesVCF(fname=output, log=log)
+
+    # the PGEN format needs to know the number of variants before writing any of them
+    # but only VCFs need to declare their contigs in the header
+    num_variants, contigs, max_allele_ct = _scan_variants(
+        gts, region, contigs=not isinstance(out, data.GenotypesPLINK)
+    )
+    if num_variants == 0:
+        raise ValueError("Didn't load any variants from the genotypes file")
+    log.info(f"Converting {num_variants} variants to {output}")
+
+    chunks = gts.iter_chunks(chunk_size=chunk_size, region=region, samples=samples)
+    out.samples = gts.samples
+    if isinstance(out, data.GenotypesPLINK):
+        out.open(num_variants, contigs=contigs, max_allele_ct=max_allele_ct)
+    else:
+        out.open(num_variants, contigs=contigs)
+    num_written = 0
+    try:
+        for chunk in chunks:
+            num_written += len(chunk.variants)
+            if num_written > num_variants:
+                break
+            # the writers expect the variants to be the rows of each chunk
+            out.append_chunk(chunk.data.transpose((1, 0, 2)), chunk.variants)
+        if num_written != num_variants:
+            # the variants were counted separately from the genotypes, so make sure
+            # that we don't write a truncated file if they somehow disagree
+            raise ValueError(
+                f"Expected to convert {num_variants} variants but found "
+                f"{'at least ' if num_written > num_variants else ''}{num_written}"
+            )
+    except Exception:
+        # don't let any errors from closing the file mask the original error
+        with suppress(Exception):
+            out.close()
+        raise
+    out.close()
@@ -1,4 +1,7 @@
 from .data import Data
+from .bgzf import BGZFWriter
+from .cache import GenotypesCache
+from .variants import VariantTable
 from .phenotypes import Phenotypes
 from .covariates import Covariates
 from .breakpoints import Breakpoints, HapBlock
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import os
+import io
+import zlib
+import struct
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pysam import tabix_index
+
+
+class BGZFWriter(io.BufferedIOBase):
+    """
+    A writable file object that BGZF-compresses its contents with multiple threads
+
+    BGZF files are a series of independent gzip blocks, each holding at most 64 KB of
+    uncompressed data. Since each block is independent, they can be compressed in
+    parallel. zlib releases the GIL while compressing, so a pool of threads is
+    enough. The blocks are still written to the file in order, so the output is a
+    regular BGZF file that can be read by gzip, bgzip, htslib, and tabix.
+
+    Unless the number of threads is requested explicitly, the blocks are compressed
+    in the calling thread until :py:attr:`~.BGZFWriter.THREAD_THRESHOLD` blocks have
+    been written, so that small files don't pay for starting a pool of threads
+
+    Attributes
+    ----------
+    fname : Path
+        The path to the file that is being written
+    threads : int
+        The max number of threads with which to compress blocks
+
+        Defaults to the number of CPUs, up to at most
+        :py:attr:`~.BGZFWriter.MAX_DEFAULT_THREADS`
+    level : int
+        The zlib compression level
+    index : dict
+        Keyword arguments to pysam's tabix_index() for indexing the file after it is
+        closed or None if it shouldn't be indexed
+
+    Examples
+    --------
+    >>> with BGZFWriter('output.vcf.gz', index={'preset': 'vcf'}) as bgzf:
+    ...     bgzf.write(b'...')
+    """
+
+    # the max amount of uncompressed data in each block, just like in htslib
+    BLOCK_SIZE = 0xFF00
+    # the max size of a compressed block
+    MAX_BLOCK_SIZE = 0x10000
+    # the empty block that marks the end of every BGZF file
+    EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+    # the max number of threads to use unless more are requested
+    MAX_DEFAULT_THREADS = 4
+    # the number of blocks to compress before starting the threads by default
+    THREAD_THRESHOLD = 16
+
+    def __init__(
+        self,
+        fname: Path | str,
+        threads: int = None,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+        index: dict = None,
+    ):
+        super().__init__()
+        self.fname = Path(fname)
+        if threads is None:
+            threads = min(self.MAX_DEFAULT_THREADS, os.cpu_count() or 1)
+            # wait to start the threads until we know there is enough data to need them
+            self._blocks_left = self.THREAD_THRESHOLD
+        else:
+            self._blocks_left = 0
+        self.threads = threads
+        self.level = level
+        self.index = index
+        self._file = open(self.fname, mode="wb")
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._pool = None
+
+    @classmethod
+    def _compress_block(cls, data: bytes, level: int) -> bytes:
+        """
+        Compress a single BGZF block
+
+        Parameters
+        ----------
+        data: bytes
+            At most :py:attr:`~.BGZFWriter.BLOCK_SIZE` bytes of uncompressed data
+        level: int
+            The zlib compression level
+
+        Returns
+        -------
+        bytes
+            The block, including its gzip header and footer
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+        if len(cdata) + 26 > cls.MAX_BLOCK_SIZE:
+            # incompressible data might not fit in a block unless it is stored as-is
+            compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+            cdata = compressor.compress(data) + compressor.flush()
+        # the BC extra field stores the size of the block minus one
+        header = struct.pack(
+            "<BBBBIBBHBBHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25
+        )
+        footer = struct.pack("<II", zlib.crc32(data), len(data))
+        return header + cdata + footer
+
+    def _submit(self, data: bytes):
+        """
+        Compress a block, possibly in the background, and write any finished blocks
+
+        Parameters
+        ----------
+        data: bytes
+            See documentation for :py:meth:`~.BGZFWriter._compress_block`
+        """
+        if self._pool is None and self.threads > 1 and self._blocks_left <= 0:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads)
+        if self._pool is None:
+            self._blocks_left -= 1
+            self._file.write(self._compress_block(data, self.level))
+            return
+        self._pending.append(self._pool.submit(self._compress_block, data, self.level))
+        # limit the number of blocks that are held in memory at any given time
+        while len(self._pending) > 4 * self.threads:
+            self._file.write(self._pending.popleft().result())
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        """
+        Write data to the file
+
+        Parameters
+        ----------
+        data: bytes
+            The uncompressed data
+
+        Returns
+        -------
+        int
+            The number of bytes that were written
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        self._buffer += data
+        num_blocks = len(self._buffer) // self.BLOCK_SIZE
+        if num_blocks:
+            view = memoryview(self._buffer)
+            for start in range(0, num_blocks * self.BLOCK_SIZE, self.BLOCK_SIZE):
+                self._submit(bytes(view[start : start + self.BLOCK_SIZE]))
+            view.release()
+            del self._buffer[: num_blocks * self.BLOCK_SIZE]
+        return len(data)
+
+    def flush(self):
+        """
+        Compress any buffered data into a block and write all pending blocks
+
+        The next call to :py:meth:`~.BGZFWriter.write` will start a new block.
+        """
+        if self.closed or self._file.closed:
+            return
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+        self._file.flush()
+
+    def close(self):
+        """
+        Write any remaining data and the EOF marker and then close the file
+
+        If requested, the file is also indexed with tabix afterward
+        """
+        if self.closed:
+            return
+        try:
+            self.flush()
+            self._file.write(self.EOF)
+        finally:
+            self._file.close()
+            if self._pool is not None:
+                self._pool.shutdown()
+            super().close()
+        if self.index is not None:
+            tabix_index(str(self.fname), force=True, **self.index)
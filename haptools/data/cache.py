@@ -0,0 +1,194 @@
+from __future__ import annotations
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from logging import getLogger, Logger
+
+import numpy as np
+
+from .variants import VariantTable
+
+
+class GenotypesCache:
+    """
+    A persistent cache of genotypes that have been decoded from a file
+
+    Each entry in the cache is a directory containing the
+    :py:attr:`~.Genotypes.data`, :py:attr:`~.Genotypes.variants`, and
+    :py:attr:`~.Genotypes.samples` properties of a Genotypes object. The genotypes and
+    samples are stored as .npy files, and the variants are stored as a
+    :class:`VariantTable`, so no Python objects need to be pickled. The genotype
+    matrix is memory-mapped when it is loaded from the cache, so it isn't copied into
+    memory until it is modified.
+
+    Entries are keyed on the path, modification time, and size of the genotypes file
+    (and of any files that accompany it, like the PVAR and PSAM files of a PGEN file)
+    along with the region, samples, variants, and max_variants that were requested
+    from it. The least recently used entries are evicted whenever the size of the
+    cache exceeds :py:attr:`~.GenotypesCache.max_size`.
+
+    Attributes
+    ----------
+    cache_dir : Path
+        The directory in which the cache entries are stored
+    max_size : int
+        The maximum total size of the cache, in bytes
+    log: Logger
+        A logging instance for recording debug statements
+
+    Examples
+    --------
+    >>> cache = GenotypesCache('/tmp/haptools-cache')
+    >>> genotypes = GenotypesVCF('tests/data/simple.vcf.gz')
+    >>> genotypes.read_cached(cache, region='1:10115-10117')
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | str,
+        max_size: int = 10 * 1024**3,
+        log: Logger = None,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.log = log or getLogger(self.__class__.__name__)
+
+    def key(
+        self,
+        gts,
+        region: str = None,
+        samples: set[str] = None,
+        variants: set[str] = None,
+        max_variants: int = None,
+    ) -> str:
+        """
+        Create a key that uniquely identifies a set of genotypes read from a file
+
+        Parameters
+        ----------
+        gts: Genotypes
+            The Genotypes object into which the genotypes will be read
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        samples : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        max_variants : int, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Returns
+        -------
+        str
+            A hash of the files' metadata and the requested genotypes
+        """
+        contents = [gts.__class__.__name__]
+        for fname in gts._source_files():
+            fname = fname.resolve()
+            stat = fname.stat()
+            contents.extend((str(fname), stat.st_mtime_ns, stat.st_size))
+        contents.extend(
+            (
+                gts._prephased,
+                region,
+                None if samples is None else sorted(samples),
+                None if variants is None else sorted(variants),
+                max_variants,
+            )
+        )
+        return hashlib.sha256(json.dumps(contents).encode()).hexdigest()
+
+    def load(self, gts, key: str, compact: bool = False) -> bool:
+        """
+        Load genotypes from the cache into a Genotypes object
+
+        Parameters
+        ----------
+        gts: Genotypes
+            The Genotypes object into which the genotypes should be loaded
+        key: str
+            The key of the cache entry, from :py:meth:`~.GenotypesCache.key`
+        compact: bool, optional
+            Whether to keep the variants in a compact :class:`VariantTable` rather
+            than converting them into a structured array
+
+        Returns
+        -------
+        bool
+            True if the genotypes were found in the cache and False otherwise
+        """
+        entry = self.cache_dir / key
+        if not entry.is_dir():
+            self.log.debug(f"Couldn't find genotypes in cache entry {entry}")
+            return False
+        self.log.info(f"Loading genotypes from cache entry {entry}")
+        # the genotypes are stored in variant-major order, just like they are read
+        try:
+            data = np.load(entry / "data.npy", mmap_mode="c")
+        except ValueError:
+            # empty arrays can't be memory-mapped
+            data = np.load(entry / "data.npy")
+        gts.data = data.transpose((1, 0, 2))
+        # the variants are stored as a VariantTable, so that nothing must be pickled
+        variants = VariantTable.load(entry / "variants")
+        gts.variants = variants if compact else np.asarray(variants)
+        gts.samples = tuple(np.load(entry / "samples.npy").tolist())
+        gts._samp_idx = None
+        gts._var_idx = None
+        # mark this entry as the most recently used one
+        os.utime(entry)
+        return True
+
+    def save(self, gts, key: str):
+        """
+        Save the genotypes in a Genotypes object to the cache
+
+        Parameters
+        ----------
+        gts: Genotypes
+            The Genotypes object containing the genotypes to store
+        key: str
+            The key of the cache entry, from :py:meth:`~.GenotypesCache.key`
+        """
+        entry = self.cache_dir / key
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # write to a temporary directory first, so that other processes never see a
+        # partially written entry
+        tmp_entry = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-"))
+        try:
+            np.save(tmp_entry / "data.npy", gts.data.transpose((1, 0, 2)))
+            variants = gts.variants
+            if not isinstance(variants, VariantTable):
+                variants = VariantTable(variants)
+            variants.save(tmp_entry / "variants")
+            np.save(tmp_entry / "samples.npy", np.array(gts.samples, dtype=str))
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # another process might have already created this entry
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            if not entry.is_dir():
+                raise
+        self.log.info(f"Saved genotypes to cache entry {entry}")
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache fits in
+        :py:attr:`~.GenotypesCache.max_size`
+        """
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry))
+        total_size = sum(size for mtime, size, entry in entries)
+        for mtime, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self.log.debug(f"Evicting cache entry {entry}")
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import os
+import io
 import gzip
 from csv import reader
 from pathlib import Path
@@ -10,6 +11,8 @@ from logging import getLogger, Logger
 
 import numpy as np
 
+from .bgzf import BGZFWriter
+
 
 class Data(ABC):
     """
@@ -105,6 +108,10 @@ class Data(ABC):
             mode += "t"
         ext = os.path.splitext(filename)[1]
         if ext == ".gz":
+            if "w" in mode:
+                # BGZF files can be read by gzip, but they are compressed in parallel
+                bgzf = BGZFWriter(filename)
+                return bgzf if "b" in mode else io.TextIOWrapper(bgzf)
             return gzip.open(filename, mode)
         else:
             return open(filename, mode)
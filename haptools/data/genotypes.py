@@ -1,16 +1,21 @@
 from __future__ import annotations
+import os
 import re
-import gc
+import shutil
+import tempfile
 from csv import reader
 from pathlib import Path
 from logging import Logger
-from typing import Iterator
+from typing import Iterator, IO
+from itertools import islice
+from contextlib import contextmanager
+from multiprocessing import Pool
 from collections import namedtuple, Counter
 
 import pgenlib
 import numpy as np
 import numpy.typing as npt
-from pysam import VariantFile
+from pysam import VariantFile, tabix_index
 from cyvcf2 import VCF, Variant
 
 try:
@@ -19,6 +24,9 @@ except ModuleNotFoundError:
     from . import tr_harmonizer as trh
 
 from .data import Data
+from .bgzf import BGZFWriter
+from .cache import GenotypesCache
+from .variants import VariantTable
 
 
 class Genotypes(Data):
@@ -29,6 +37,9 @@ class Genotypes(Data):
     ----------
     data : npt.NDArray
         The genotypes in an n (samples) x p (variants) x 2 (strands) array
+
+        If the genotypes have been packed via :py:meth:`~.Genotypes.pack`, this is
+        instead a p (variants) x 2 (strands) x w (words) array of np.uint64 words
     fname : Path | str
         The path to the read-only file containing the data
     samples : tuple[str]
@@ -40,6 +51,8 @@ class Genotypes(Data):
             3. POS
     log: Logger
         A logging instance for recording debug statements
+    _POPCOUNT : npt.NDArray
+        A lookup table containing the number of set bits in each possible byte
     _prephased : bool
         If True, assume that the genotypes are phased. Otherwise, extract their phase
         when reading from the VCF.
@@ -47,6 +60,11 @@ class Genotypes(Data):
         Sample index; maps samples to indices in self.samples
     _var_idx : dict[str, int]
         Variant index; maps variant IDs to indices in self.variants
+    _view : tuple[npt.NDArray, npt.NDArray]
+        The indices of the samples and variants that have been requested from the
+        genotype matrix (or None for all of them) but that haven't been gathered yet
+
+        See documentation for :py:meth:`~.Genotypes.subset`
 
     Examples
     --------
@@ -72,6 +90,37 @@ class Genotypes(Data):
         self._samp_idx = None
         self._var_idx = None
 
+    _POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], np.uint8)
+
+    @property
+    def data(self) -> npt.NDArray:
+        """
+        The genotype matrix
+
+        If these genotypes were created by :py:meth:`~.Genotypes.subset`, the requested
+        samples and variants are gathered from the original genotype matrix the first
+        time this property is accessed
+        """
+        if self._view is not None:
+            self._data = self._gather(self._data, *self._view)
+            self._view = None
+        return self._data
+
+    @data.setter
+    def data(self, data: npt.NDArray):
+        self._view = None
+        self._data = data
+
+    @property
+    def packed(self) -> bool:
+        """
+        Whether the genotypes in :py:attr:`~.Genotypes.data` are bit-packed
+
+        See documentation for :py:meth:`~.Genotypes.pack`
+        """
+        # check the original genotype matrix, so that we don't gather a pending subset
+        return self._data is not None and self._data.dtype == np.uint64
+
     @classmethod
     def load(
         cls: Genotypes,
@@ -103,9 +152,7 @@ class Genotypes(Data):
         """
         genotypes = cls(fname)
         genotypes.read(region, samples, variants)
-        genotypes.check_missing()
-        genotypes.check_biallelic()
-        genotypes.check_phase()
+        genotypes.qc()
         # genotypes.to_MAC()
         return genotypes
 
@@ -115,6 +162,8 @@ class Genotypes(Data):
         samples: set[str] = None,
         variants: set[str] = None,
         max_variants: int = None,
+        workers: int = 1,
+        compact: bool = False,
     ):
         """
         Read genotypes from a VCF into a numpy matrix stored in :py:attr:`~.Genotypes.data`
@@ -149,55 +198,104 @@ class Genotypes(Data):
             intensive. You should use this option if your processes are frequently
             "Killed" from memory overuse.
 
-            If you don't know how many variants there are, set this to a large number
-            greater than what you would except. The np array will be resized
-            appropriately. You can also use the bcftools "counts" plugin to obtain the
-            number of expected sites within a region.
+            If this value is not provided, we will try to obtain the number of
+            variants from the index of the VCF (if it has one). Otherwise, the arrays
+            will be grown geometrically as records are read and then shrunk to fit.
+            You can also use the bcftools "counts" plugin to obtain the number of
+            expected sites within a region.
 
             Note that this value is ignored if the variants argument is provided.
+        workers : int, optional
+            The number of processes to use when reading the VCF
+
+            If this is greater than 1, the region (or every contig in the VCF) is split
+            into sub-regions and each process decodes its sub-regions into a genotype
+            matrix that is shared among all of the processes. The VCF must be indexed
+            for this to work. Note that max_variants is ignored in this case.
+        compact : bool, optional
+            If True, store :py:attr:`~.Genotypes.variants` in a compact
+            :class:`VariantTable` rather than a structured array
+
+            Each block of variants is compacted as soon as it is read, so the full
+            structured array is never created. See
+            :py:meth:`~.Genotypes.compact_variants` for more details.
         """
         super().read()
-        records = self.__iter__(region=region, samples=samples, variants=variants)
+        vcf = self._open_vcf(samples)
+        if workers > 1 and not self._has_index():
+            self.log.warning(
+                "The VCF must be indexed in order to read it with multiple processes."
+                " Proceeding with only one process."
+            )
+            workers = 1
         if variants is not None:
             max_variants = len(variants)
+        elif max_variants is None and workers == 1:
+            max_variants = self._num_records(vcf, region)
+        num_cols = 2 + (not self._prephased)
+        num_seen = 0
+        # when compacting, each block of variants is stored in its own table
+        dtype = self.variants.dtype
+        tables = None
+        if compact:
+            tables = [VariantTable(np.empty((0,), dtype=dtype))]
+            self.variants = tables[0]
+        if workers > 1:
+            self._read_regions(vcf, region, samples, variants, workers, compact)
+            num_seen = len(self.variants)
         # check whether we can preallocate memory instead of making copies
-        if max_variants is None:
-            self.log.warning(
-                "The max_variants parameter was not specified. We have no choice but to"
-                " append to an ever-growing array, which can lead to memory overuse!"
+        elif max_variants is None:
+            self.log.debug(
+                "Couldn't determine the number of variants ahead of time. The arrays "
+                "will be resized as records are read."
             )
-            variants_arr = []
-            data_arr = []
-            for rec in records:
-                variants_arr.append(rec.variants)
-                data_arr.append(rec.data)
-            self.log.info(f"Copying {len(variants_arr)} variants into np arrays.")
-            # convert to np array for speedy operations later on
-            self.variants = np.array(variants_arr, dtype=self.variants.dtype)
-            self.data = np.array(data_arr, dtype=np.uint8)
+            capacity = 0
+            if not compact:
+                self.variants = np.empty((capacity,), dtype=dtype)
+            self.data = np.empty((capacity, len(self.samples), num_cols), np.uint8)
+            for block in self._iterate_blocks(vcf, region, variants):
+                end = num_seen + len(block.variants)
+                if end > capacity:
+                    # grow the arrays geometrically, so that the number of resizes is
+                    # only logarithmic in the number of records
+                    capacity = max(end, 2 * capacity)
+                    self.log.debug(f"Resizing arrays to hold {capacity} variants")
+                    self._resize(capacity)
+                self.data[num_seen:end] = block.data
+                if compact:
+                    tables.append(VariantTable(np.array(block.variants, dtype)))
+                else:
+                    self.variants[num_seen:end] = block.variants
+                num_seen = end
         else:
             # preallocate arrays! this will save us lots of memory and speed b/c
             # appends can sometimes make copies
-            self.variants = np.empty((max_variants,), dtype=self.variants.dtype)
+            if not compact:
+                self.variants = np.empty((max_variants,), dtype=dtype)
             # in order to check_phase() later, we must store the phase info, as well
             self.data = np.empty(
-                (max_variants, len(self.samples), (2 + (not self._prephased))),
-                dtype=np.uint8,
+                (max_variants, len(self.samples), num_cols), dtype=np.uint8
             )
-            num_seen = 0
-            for rec in records:
-                if num_seen >= max_variants:
-                    break
-                self.variants[num_seen] = rec.variants
-                self.data[num_seen] = rec.data
-                num_seen += 1
-            if max_variants > num_seen:
-                self.log.info(
-                    f"Removing {max_variants-num_seen} unneeded variant records that "
-                    "were preallocated b/c max_variants was specified."
-                )
-                self.variants = self.variants[:num_seen]
-                self.data = self.data[:num_seen]
+            # the genotypes are decoded directly into self.data, so we only need to
+            # copy the variant metadata from each block
+            for block in self._iterate_blocks(vcf, region, variants, out=self.data):
+                end = num_seen + len(block.variants)
+                if compact:
+                    tables.append(VariantTable(np.array(block.variants, dtype)))
+                else:
+                    self.variants[num_seen:end] = block.variants
+                num_seen = end
+            # the last block is a view into self.data, which would prevent us from
+            # resizing it in place
+            block = None
+        if compact and workers == 1:
+            self.variants = VariantTable.concatenate(tables)
+        if len(self.data) > num_seen:
+            self.log.info(
+                f"Removing {len(self.data)-num_seen} unneeded variant records that "
+                "were preallocated."
+            )
+            self._resize(num_seen)
         if 0 in self.data.shape:
             self.log.warning(
                 "Failed to load genotypes. If you specified a region, check that the"
@@ -209,67 +307,238 @@ class Genotypes(Data):
             self.log.info(f"Transposing genotype matrix of size {self.data.shape}")
             self.data = self.data.transpose((1, 0, 2))
 
-    def _variant_arr(self, record: Variant):
+    def read_cached(
+        self,
+        cache: GenotypesCache,
+        region: str = None,
+        samples: set[str] = None,
+        variants: set[str] = None,
+        max_variants: int = None,
+        **kwargs,
+    ):
         """
-        Construct a np array from the metadata in a line of the VCF
+        Read genotypes from a cache of previously read genotypes, if possible
 
-        This is a helper function for :py:meth:`~.Genotypes._iterate`. It's separate
-        so that it can easily be overridden in any child classes.
+        Otherwise, read them from the file via :py:meth:`~.Genotypes.read` and store
+        them in the cache for next time. Only :py:attr:`~.Genotypes.data`,
+        :py:attr:`~.Genotypes.variants`, and :py:attr:`~.Genotypes.samples` are cached.
 
         Parameters
         ----------
-        record: Variant
-            A Variant object from which to fetch metadata
+        cache : GenotypesCache
+            The cache in which to look for the genotypes
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        samples : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        max_variants : int, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        **kwargs
+            Any other parameters to pass to :py:meth:`~.Genotypes.read`
 
-        Returns
-        -------
-        npt.NDArray
-            A row from the :py:attr:`~.Genotypes.variants` array
+            These must not affect which genotypes are read (ex: workers), since they
+            aren't part of the key of the cache entry
         """
-        return np.array(
-            (record.ID, record.CHROM, record.POS),
-            dtype=self.variants.dtype,
+        key = cache.key(self, region, samples, variants, max_variants)
+        if cache.load(self, key, compact=kwargs.get("compact", False)):
+            return
+        self.read(
+            region=region,
+            samples=samples,
+            variants=variants,
+            max_variants=max_variants,
+            **kwargs,
         )
+        cache.save(self, key)
 
-    def _vcf_iter(self, vcf: VCF, region: str):
+    def _num_records(self, vcf: VCF, region: str = None) -> int | None:
         """
-        Yield all variants within a region in the VCF file.
+        Obtain the number of records in a VCF from its index, if it has one
+
+        This is a helper function for :py:meth:`~.Genotypes.read`
 
         Parameters
         ----------
         vcf: VCF
-            The VCF object from which to fetch variant records
+            The VCF object from which variant records will be fetched
         region : str, optional
             See documentation for :py:meth:`~.Genotypes.read`
 
         Returns
         -------
-        vcffile : VCF
-            Iterable cyvcf2 instance.
+        int | None
+            The number of records in the VCF or None if it could not be determined
+
+            The index only stores the number of records in each contig, so this will
+            also be None if a region was requested
         """
-        return vcf(region)
+        if region is not None or not self._has_index():
+            return None
+        try:
+            num_records = vcf.num_records
+        except ValueError:
+            return None
+        self.log.debug(f"Found {num_records} records in the index of the VCF")
+        return num_records
 
-    def _return_data(self, variant: Variant):
+    def _has_index(self) -> bool:
         """
-        Collect genotypes from current variant
+        Whether the VCF has a tabix or CSI index alongside it
+
+        Returns
+        -------
+        bool
+            True if a .tbi or .csi file could be found for the VCF and False otherwise
+        """
+        fname = str(self.fname)
+        return any(Path(fname + ext).exists() for ext in (".tbi", ".csi"))
+
+    def _id_index_paths(self) -> tuple[Path, Path]:
+        """
+        Get the paths to the sidecar files of the variant ID index of the VCF
+
+        Returns
+        -------
+        tuple[Path, Path]
+            The path to the sorted variant IDs and the path to their loci
+        """
+        fname = str(self.fname)
+        return Path(fname + ".ids.npy"), Path(fname + ".loci.npy")
+
+    def build_id_index(self, chunk_size: int = 1000000) -> tuple[Path, Path]:
+        """
+        Create a sidecar index mapping each variant ID in the VCF to its locus
+
+        The index is stored alongside the VCF as two .npy files: one containing the
+        sorted variant IDs and another containing the contig, position, and record
+        number of each ID. Afterward, whenever :py:meth:`~.Genotypes.read` is asked
+        for a set of variants (without a region), it will look up their loci in the
+        index and fetch only the records at those loci from the VCF, instead of
+        scanning through every record in the file. For this to work, the VCF must
+        also be indexed via tabix.
+
+        The index is ignored if it is older than the VCF, so you should rebuild it
+        whenever the VCF changes.
 
         Parameters
         ----------
-        variant: Variant
-            A Variant object from which to fetch genotypes
+        chunk_size: int, optional
+            The max number of records to hold in lists at any given time
+
+            The IDs are converted to numpy arrays in chunks of this size, to limit
+            memory usage when indexing large files
 
         Returns
         -------
-        data: npt.NDArray[np.uint8]
-            Numpy array storing all genotypes
+        tuple[Path, Path]
+            The paths to the sidecar files containing the IDs and their loci
+        """
+        ids_fname, loci_fname = self._id_index_paths()
+        self.log.info(f"Indexing the variant IDs in {self.fname}")
+        # we don't need to parse the sample columns to get the IDs
+        vcf = VCF(str(self.fname), samples=[], lazy=True)
+        ids, chroms, loci = [], [], []
+        chunk = []
+        for rec_num, variant in enumerate(vcf):
+            if variant.ID is None:
+                # this record doesn't have an ID, so it can never be requested by one
+                continue
+            chunk.append((variant.ID, variant.CHROM, variant.POS, rec_num))
+            if len(chunk) == chunk_size:
+                ids.append(np.array([rec[0] for rec in chunk], dtype="S"))
+                chroms.append(np.array([rec[1] for rec in chunk], dtype="S"))
+                loci.append(np.array([rec[2:] for rec in chunk], dtype=np.int64))
+                chunk = []
+        if len(chunk) or not len(ids):
+            ids.append(np.array([rec[0] for rec in chunk], dtype="S"))
+            chroms.append(np.array([rec[1] for rec in chunk], dtype="S"))
+            loci.append(np.array([rec[2:] for rec in chunk], dtype=np.int64))
+        vcf.close()
+        ids, chroms = np.concatenate(ids), np.concatenate(chroms)
+        loci = np.concatenate(loci).reshape((-1, 2))
+        order = np.argsort(ids, kind="stable")
+        index = np.empty(
+            len(ids),
+            dtype=[("chrom", chroms.dtype), ("pos", np.int64), ("rec", np.int64)],
+        )
+        index["chrom"] = chroms
+        index["pos"] = loci[:, 0]
+        index["rec"] = loci[:, 1]
+        np.save(ids_fname, ids[order])
+        np.save(loci_fname, index[order])
+        self.log.info(f"Wrote an index of {len(ids)} variant IDs to {ids_fname}")
+        return ids_fname, loci_fname
+
+    def _lookup_ids(self, variants: set[str]) -> npt.NDArray | None:
         """
-        return variant.genotype.array().astype(np.uint8)
+        Look up the loci of a set of variant IDs in the variant ID index of the VCF
 
-    def _iterate(self, vcf: VCF, region: str = None, variants: set[str] = None):
+        This is a helper function for :py:meth:`~.Genotypes._fetch_records`
+
+        Parameters
+        ----------
+        variants : set[str]
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Returns
+        -------
+        npt.NDArray | None
+            The contig, position, and record number of each of the variants that was
+            found in the index, sorted by their order in the VCF
+
+            None if the VCF doesn't have an up-to-date ID index or a tabix index
         """
-        A generator over the lines of a VCF
+        ids_fname, loci_fname = self._id_index_paths()
+        if not (ids_fname.exists() and loci_fname.exists()):
+            return None
+        if not self._has_index():
+            self.log.warning(
+                "Ignoring the variant ID index because the VCF isn't tabix-indexed"
+            )
+            return None
+        vcf_mtime = Path(self.fname).stat().st_mtime
+        if min(ids_fname.stat().st_mtime, loci_fname.stat().st_mtime) < vcf_mtime:
+            self.log.warning(
+                f"Ignoring the variant ID index {ids_fname} because it is older than"
+                " the VCF. Please rebuild it."
+            )
+            return None
+        try:
+            ids = np.load(ids_fname, mmap_mode="r")
+            loci = np.load(loci_fname, mmap_mode="r")
+        except ValueError:
+            # empty arrays can't be memory-mapped
+            ids, loci = np.load(ids_fname), np.load(loci_fname)
+        # IDs that are longer than any in the index would be truncated upon comparison
+        query = [var.encode() for var in variants]
+        query = np.array(
+            [var for var in query if len(var) <= ids.dtype.itemsize], dtype=ids.dtype
+        )
+        starts = np.searchsorted(ids, query, side="left")
+        ends = np.searchsorted(ids, query, side="right")
+        found = np.concatenate(
+            [np.arange(beg, end) for beg, end in zip(starts, ends)] + [[]]
+        ).astype(np.int64)
+        found = np.asarray(loci[np.sort(found)])
+        self.log.debug(
+            f"Found {len(found)} of {len(variants)} variant IDs in the ID index"
+        )
+        return found[np.argsort(found["rec"], kind="stable")]
 
-        This is a helper function for :py:meth:`~.Genotypes.__iter__`
+    def _fetch_records(
+        self, vcf: VCF, region: str = None, variants: set[str] = None
+    ) -> Iterator[Variant]:
+        """
+        Fetch the records within a region in the VCF file
+
+        If only a set of variants was requested and the VCF has an up-to-date ID
+        index (see :py:meth:`~.Genotypes.build_id_index`), the records will be fetched
+        by querying the loci of the variants, rather than by scanning the entire VCF.
+        Otherwise, all of the records in the region are fetched. Either way, the
+        records are fetched in the same order as they appear in the VCF, and callers
+        should still filter them by their ID.
 
         Parameters
         ----------
@@ -280,154 +549,1072 @@ class Genotypes(Data):
         variants : set[str], optional
             See documentation for :py:meth:`~.Genotypes.read`
 
+        Returns
+        -------
+        Iterator[Variant]
+            An iterator over the records
+        """
+        loci = None
+        if region is None and variants is not None:
+            loci = self._lookup_ids(variants)
+        if loci is None:
+            return vcf(region)
+        return self._fetch_loci(vcf, loci)
+
+    def _fetch_loci(
+        self, vcf: VCF, loci: npt.NDArray, max_gap: int = 16384
+    ) -> Iterator[Variant]:
+        """
+        Fetch the records at a set of loci in the VCF file
+
+        Nearby loci are merged into a single region query, so that the same blocks of
+        the file are not decompressed multiple times.
+
+        This is a helper function for :py:meth:`~.Genotypes._fetch_records`
+
+        Parameters
+        ----------
+        vcf: VCF
+            The VCF object from which to fetch variant records
+        loci : npt.NDArray
+            The loci from :py:meth:`~.Genotypes._lookup_ids`
+        max_gap: int, optional
+            The max distance between two loci that should be fetched in the same query
+
         Yields
         ------
-        Iterator[namedtuple]
-            An iterator over each line in the file, where each line is encoded as a
-            namedtuple containing each of the class properties
+        Iterator[Variant]
+            An iterator over the records at (or near) each of the loci
         """
-        self.log.info(f"Loading genotypes from {len(self.samples)} samples")
-        Record = namedtuple("Record", "data variants")
-        num_seen = 0
-        # iterate over each line in the VCF
-        # note, this can take a lot of time if there are many samples
-        for variant in self._vcf_iter(vcf, region):
-            if variants is not None and variant.ID not in variants:
-                if num_seen >= len(variants):
-                    # exit early if we've already found all the variants
-                    break
-                continue
-            # save meta information about each variant
-            variant_arr = self._variant_arr(variant)
-            # extract the genotypes to a matrix of size n x 3
-            # the last dimension has three items:
-            # 1) presence of REF in strand one
-            # 2) presence of REF in strand two
-            # 3) whether the genotype is phased (if self._prephased is False)
-            data = self._return_data(variant)
-            data = data[:, : (2 + (not self._prephased))]
-            yield Record(data, variant_arr)
-            num_seen += 1
-        vcf.close()
+        regions = []
+        for chrom, pos, rec in loci:
+            chrom = chrom.decode()
+            if len(regions) and regions[-1][0] == chrom:
+                if 0 <= pos - regions[-1][2] <= max_gap:
+                    regions[-1][2] = pos
+                    continue
+            regions.append([chrom, pos, pos])
+        self.log.info(f"Fetching records from {len(regions)} regions in the ID index")
+        for chrom, start, end in regions:
+            for variant in vcf(f"{chrom}:{start}-{end}"):
+                # skip records that overlap the start of the region, since they should
+                # have been fetched by the previous query
+                if variant.POS < start:
+                    continue
+                yield variant
 
-    def __iter__(
-        self, region: str = None, samples: set[str] = None, variants: set[str] = None
-    ) -> Iterator[namedtuple]:
+    def _split_region(
+        self, vcf: VCF, region: str = None, num_pieces: int = 1
+    ) -> list[tuple[str, int]]:
         """
-        Read genotypes from a VCF line by line without storing anything
+        Split a region (or every contig in the VCF) into roughly num_pieces sub-regions
+
+        Contigs are split in proportion to their lengths, as declared in the header of
+        the VCF. Contigs without a declared length are never split. If no region is
+        provided, only the contigs listed in the index of the VCF are considered.
+
+        This is a helper function for :py:meth:`~.Genotypes._read_regions`
 
         Parameters
         ----------
+        vcf: VCF
+            The VCF object from which variant records will be fetched
         region : str, optional
             See documentation for :py:meth:`~.Genotypes.read`
-        samples : set[str], optional
-            See documentation for :py:meth:`~.Genotypes.read`
-        variants : set[str], optional
-            See documentation for :py:meth:`~.Genotypes.read`
+        num_pieces: int, optional
+            The desired number of sub-regions
 
         Returns
         -------
-        Iterator[namedtuple]
-            See documentation for :py:meth:`~.Genotypes._iterate`
+        list[tuple[str, int]]
+            A list of sub-regions in genomic order. Each sub-region is a tuple of the
+            region string and the minimum position of any record that should be loaded
+            from it (or None if all records should be loaded)
+
+            Records that overlap the start of a sub-region belong to the previous
+            sub-region, so they should only be loaded from there.
         """
-        if samples is not None:
-            if not isinstance(samples, set):
-                self.log.warning(
-                    "Samples cannot be loaded in a particular order. "
-                    "Use subset() to reorder the samples after loading them."
-                )
-            samples = list(samples)
-        vcf = VCF(str(self.fname), samples=samples, lazy=True)
-        self.samples = tuple(vcf.samples)
-        # call another function to force the lines above to be run immediately
-        # see https://stackoverflow.com/a/36726497
-        return self._iterate(vcf, region, variants)
+        if region is None:
+            # only consider the contigs that actually have records in them
+            with VariantFile(str(self.fname)) as vf:
+                contigs = [(chrom, 1, None) for chrom in vf.index.keys()]
+        else:
+            chrom, *coords = re.split(":|-", region)
+            start = int(coords[0]) if len(coords) and coords[0] else 1
+            end = int(coords[1]) if len(coords) > 1 and coords[1] else None
+            contigs = [(chrom, start, end)]
+        try:
+            lengths = dict(zip(vcf.seqnames, vcf.seqlens))
+        except AttributeError:
+            # there aren't any contig lengths in the header
+            lengths = {}
+        # the region we'll split up must be closed, so try to get the length of the
+        # contig from the header if the user didn't provide an end position
+        spans = [
+            (end if end else lengths.get(chrom, 0)) - start + 1
+            for chrom, start, end in contigs
+        ]
+        total = sum(span for span in spans if span > 0)
+        pieces = []
+        for (chrom, start, end), span in zip(contigs, spans):
+            num = max(1, round(num_pieces * span / total)) if span > 0 else 1
+            if num == 1:
+                pieces.append((region or chrom, None))
+                continue
+            bounds = np.linspace(start, start + span, num + 1, dtype=np.int64)
+            for idx in range(num):
+                beg, stop = bounds[idx], bounds[idx + 1] - 1
+                sub_region = f"{chrom}:{beg}-{stop}"
+                if idx == num - 1 and end is None:
+                    # the last sub-region should extend to the end of the contig, in
+                    # case it is longer than its declared length
+                    sub_region = f"{chrom}:{beg}"
+                # the first sub-region should include any records that overlap it
+                pieces.append((sub_region, None if idx == 0 else int(beg)))
+        return pieces
+
+    def _init_kwargs(self) -> dict:
+        """
+        Get the arguments needed to create an empty copy of this object
 
-    def index(self, samples: bool = True, variants: bool = True):
+        This is used to recreate the object within other processes, so that none of the
+        data that has already been loaded needs to be pickled and sent to them
+
+        Returns
+        -------
+        dict
+            Keyword arguments to the constructor of this class
         """
-        Call this function once to improve the amortized time-complexity of look-ups of
-        samples and variants by their ID. This is useful if you intend to later subset
-        by a set of samples or variant IDs.
-        The time complexity of this function should be roughly O(n+p) if both
-        parameters are True. Otherwise, it will be either O(n) or O(p).
+        return {"fname": self.fname, "log": self.log}
+
+    def _source_files(self) -> tuple[Path]:
+        """
+        Get the paths of all of the files from which the genotypes are read
+
+        This is used by :py:meth:`~.GenotypesCache.key` to tell when a file changes
+
+        Returns
+        -------
+        tuple[Path]
+            The path to each file
+        """
+        return (Path(self.fname),)
+
+    @classmethod
+    def _count_region(
+        cls,
+        kwargs: dict,
+        region: str,
+        min_pos: int = None,
+        variants: set[str] = None,
+    ) -> int:
+        """
+        Count the number of records that will be loaded from a sub-region of the VCF
+
+        The sample columns are not parsed, so this is much faster than reading them.
+        But the records are fetched in the same way as in
+        :py:meth:`~.Genotypes._read_region`, so that the counts always agree.
+
+        This is a helper function for :py:meth:`~.Genotypes._read_regions` and is meant
+        to be run within a separate process
 
         Parameters
         ----------
-        samples: bool, optional
-            Whether to index the samples for fast loop-up. Adds complexity O(n).
-        variants: bool, optional
-            Whether to index the variants for fast look-up. Adds complexity O(p).
+        kwargs: dict
+            The arguments with which to create the object, from
+            :py:meth:`~.Genotypes._init_kwargs`
+        region : str
+            A sub-region from :py:meth:`~.Genotypes._split_region`
+        min_pos : int, optional
+            The minimum position of any record that should be counted
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
 
-        Raises
-        ------
-        ValueError
-            If any samples or variants appear more than once
+        Returns
+        -------
+        int
+            The number of records in the sub-region
         """
-        if samples and self._samp_idx is None:
-            self._samp_idx = dict(zip(self.samples, range(len(self.samples))))
-            if len(self._samp_idx) < len(self.samples):
-                duplicates = Counter(self.samples).items()
-                duplicates = [samp_id for samp_id, count in duplicates if count > 1]
-                a_few = 5 if len(duplicates) > 5 else len(duplicates)
-                raise ValueError(f"Found duplicate sample IDs: {duplicates[:a_few]}")
-        if variants and self._var_idx is None:
-            self._var_idx = dict(zip(self.variants["id"], range(len(self.variants))))
-            if len(self._var_idx) < len(self.variants):
-                duplicates = Counter(self.variants["id"]).items()
-                duplicates = [var_id for var_id, count in duplicates if count > 1]
-                a_few = 5 if len(duplicates) > 5 else len(duplicates)
-                raise ValueError(f"Found duplicate variant IDs: {duplicates[:a_few]}")
+        gts = cls(**kwargs)
+        vcf = VCF(str(gts.fname), samples=[], lazy=True)
+        num_records = 0
+        for variant in gts._vcf_iter(vcf, region, variants):
+            if min_pos is not None and variant.POS < min_pos:
+                continue
+            if variants is not None and variant.ID not in variants:
+                continue
+            num_records += 1
+        vcf.close()
+        return num_records
 
-    def subset(
-        self,
-        samples: tuple[str] = None,
-        variants: tuple[str] = None,
-        inplace: bool = False,
-    ):
+    @classmethod
+    def _read_region(
+        cls,
+        kwargs: dict,
+        prephased: bool,
+        region: str,
+        min_pos: int,
+        samples: set[str],
+        variants: set[str],
+        fname: str,
+        shape: tuple[int, int, int],
+        offset: int,
+        num_records: int,
+    ) -> npt.NDArray:
         """
-        Subset these genotypes to a smaller set of samples or a smaller set of variants
+        Decode the genotypes in a sub-region of the VCF into a shared genotype matrix
 
-        The order of the samples and variants in the subsetted instance will match
-        the order in the provided tuple parameters.
+        This is a helper function for :py:meth:`~.Genotypes._read_regions` and is meant
+        to be run within a separate process
+
+        Raises
+        ------
+        ValueError
+            If the number of records in the sub-region differs from num_records
 
         Parameters
         ----------
-        samples: tuple[str]
-            A subset of samples to keep
-        variants: tuple[str]
-            A subset of variant IDs to keep
-        inplace: bool, optional
-            If False, return a new Genotypes object; otherwise, alter the current one
+        kwargs: dict
+            The arguments with which to create the object, from
+            :py:meth:`~.Genotypes._init_kwargs`
+        prephased: bool
+            Whether the genotypes should be treated as phased
+        region : str
+            A sub-region from :py:meth:`~.Genotypes._split_region`
+        min_pos : int
+            The minimum position of any record that should be loaded
+        samples : set[str]
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str]
+            See documentation for :py:meth:`~.Genotypes.read`
+        fname: str
+            The path to the memory-mapped file backing the shared genotype matrix
+        shape: tuple[int, int, int]
+            The shape of the shared genotype matrix (variants x samples x strands)
+        offset: int
+            The index of the first variant of this sub-region in the shared matrix
+        num_records: int
+            The number of records in the sub-region, from
+            :py:meth:`~.Genotypes._count_region`
 
         Returns
         -------
-            A new Genotypes object if inplace is set to False, else returns None
+        npt.NDArray
+            The rows of the :py:attr:`~.Genotypes.variants` array for this sub-region
         """
-        # First, initialize variables
-        gts = self
-        if not inplace:
-            gts = self.__class__(self.fname, self.log)
-        gts.samples = self.samples
-        gts.variants = self.variants
-        gts.data = self.data
-        # Index the current set of samples and variants so we can have fast look-up
-        self.index(samples=(samples is not None), variants=(variants is not None))
-        # Subset the samples
-        if samples is not None:
-            gts.samples = tuple(samp for samp in samples if samp in self._samp_idx)
-            if len(gts.samples) < len(samples):
-                diff = len(samples) - len(gts.samples)
-                self.log.warning(
+        gts = cls(**kwargs)
+        gts._prephased = prephased
+        arr = np.empty((num_records,), dtype=gts.variants.dtype)
+        if not num_records:
+            return arr
+        vcf = gts._open_vcf(samples)
+        data = np.memmap(
+            fname,
+            dtype=np.uint8,
+            mode="r+",
+            shape=(num_records, *shape[1:]),
+            offset=offset * shape[1] * shape[2],
+        )
+        num_seen = 0
+        for block in gts._iterate_blocks(
+            vcf, region, variants, out=data, min_pos=min_pos
+        ):
+            end = num_seen + len(block.variants)
+            arr[num_seen:end] = block.variants
+            num_seen = end
+        data.flush()
+        if num_seen != num_records:
+            # otherwise, some rows of the shared matrix would never be initialized
+            raise ValueError(
+                f"Expected {num_records} records in {region} but only found {num_seen}"
+            )
+        return arr
+
+    @contextmanager
+    def _shared_matrix(self, shape: tuple[int, ...]) -> Iterator[tuple[str, np.memmap]]:
+        """
+        Allocate a genotype matrix that can be shared among processes
+
+        The matrix is backed by a temporary file in /dev/shm, a RAM-backed file system,
+        if it has enough free space for the matrix. Otherwise, the file is created in
+        the default temporary directory. The file is deleted once the context exits,
+        but the matrix remains usable until it is garbage collected.
+
+        This is a helper function for :py:meth:`~.Genotypes._read_regions` and
+        :py:meth:`~.GenotypesPLINK._read_groups`
+
+        Parameters
+        ----------
+        shape: tuple[int, ...]
+            The shape of the matrix
+
+        Yields
+        ------
+        tuple[str, np.memmap]
+            The path to the file backing the matrix and the matrix, itself
+        """
+        size = int(np.prod(shape))
+        tmp_dir = None
+        for path in ("/dev/shm", tempfile.gettempdir()):
+            if not os.path.isdir(path):
+                continue
+            stat = os.statvfs(path)
+            if stat.f_bavail * stat.f_frsize >= size:
+                tmp_dir = path
+                break
+            # writing past the end of a full tmpfs would crash the processes (SIGBUS)
+            self.log.debug(f"Not enough free space in {path} for {size} bytes")
+        else:
+            self.log.warning(
+                f"There might not be enough free space for a genotype matrix of {size}"
+                " bytes. Set the TMPDIR environment variable to a directory with more"
+                " space or use fewer processes."
+            )
+        self.log.debug(f"Allocating shared genotype matrix of shape {shape}")
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, suffix=".gts") as tmp:
+            yield tmp.name, np.memmap(tmp.name, dtype=np.uint8, mode="w+", shape=shape)
+
+    def _read_regions(
+        self,
+        vcf: VCF,
+        region: str = None,
+        samples: set[str] = None,
+        variants: set[str] = None,
+        workers: int = 2,
+        compact: bool = False,
+    ):
+        """
+        Read genotypes from sub-regions of a VCF in parallel
+
+        The number of records in each sub-region is counted first, so that a single
+        variant-major genotype matrix can be allocated in shared memory. Each process
+        then decodes its sub-regions directly into its own slice of the matrix, so that
+        the slices don't need to be copied or concatenated afterward.
+
+        This is a helper function for :py:meth:`~.Genotypes.read`
+
+        Parameters
+        ----------
+        vcf: VCF
+            The VCF object from which variant records will be fetched
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        samples : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        workers : int, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        compact : bool, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        """
+        # oversubscribe the processes a bit, since some sub-regions will be denser
+        pieces = self._split_region(vcf, region, num_pieces=4 * workers)
+        vcf.close()
+        # release any previously loaded genotypes before allocating the new ones
+        self.data = None
+        num_cols = 2 + (not self._prephased)
+        self.log.info(
+            f"Reading genotypes from {len(pieces)} sub-regions with {workers} processes"
+        )
+        kwargs = self._init_kwargs()
+        with Pool(workers) as pool:
+            counts = pool.starmap(
+                self._count_region,
+                [(kwargs, piece, min_pos, variants) for piece, min_pos in pieces],
+            )
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            shape = (int(offsets[-1]), len(self.samples), num_cols)
+            if not shape[0]:
+                self.variants = np.empty((0,), dtype=self.variants.dtype)
+                if compact:
+                    self.variants = VariantTable(self.variants)
+                self.data = np.empty(shape, dtype=np.uint8)
+                return
+            with self._shared_matrix(shape) as (tmp_name, self.data):
+                variants_arrs = pool.starmap(
+                    self._read_region,
+                    [
+                        (kwargs, self._prephased, piece, min_pos, samples, variants)
+                        + (tmp_name, shape, *loc)
+                        for (piece, min_pos), loc in zip(pieces, zip(offsets, counts))
+                    ],
+                )
+        # the file has been deleted, but our mapping of it will persist until the
+        # genotype matrix is garbage collected
+        self.data = self.data.view(np.ndarray)
+        if compact:
+            tables = [VariantTable(arr) for arr in variants_arrs]
+            del variants_arrs
+            self.variants = VariantTable.concatenate(tables)
+        else:
+            self.variants = np.concatenate(variants_arrs)
+
+    def _resize(self, num_variants: int):
+        """
+        Resize the variant-major arrays created by :py:meth:`~.Genotypes.read`
+
+        A compact :class:`VariantTable` is left as it is, since
+        :py:meth:`~.Genotypes.read` assembles it from blocks of variants instead
+
+        Parameters
+        ----------
+        num_variants: int
+            The new number of variants in the arrays
+        """
+        if not isinstance(self.variants, VariantTable):
+            self._resize_attr("variants", num_variants)
+        self._resize_attr("data", num_variants)
+
+    def _resize_attr(self, name: str, length: int):
+        """
+        Resize the first axis of an array attribute, in place if possible
+
+        The attribute is cleared while the array is resized, so that the array can be
+        resized in place whenever nothing else refers to it. Unlike slicing, this
+        releases any unused memory when shrinking the array. And unlike creating a new
+        array and copying into it, the underlying buffer can usually be extended by the
+        OS without making a copy when growing it. Otherwise, the array is copied into a
+        new one, so that any views of the old array remain valid.
+
+        This is a helper function for :py:meth:`~.Genotypes._resize`
+
+        Parameters
+        ----------
+        name: str
+            The name of the attribute storing the array
+        length: int
+            The new length of the first axis of the array
+        """
+        arr = getattr(self, name)
+        shape = (length, *arr.shape[1:])
+        # the only remaining reference to the array must be the local variable
+        setattr(self, name, None)
+        try:
+            # this raises a ValueError if any other objects refer to the array
+            arr.resize(shape)
+        except ValueError:
+            self.log.debug(f"Copying {name} since it can't be resized in place")
+            if length <= len(arr):
+                arr = arr[:length].copy()
+            else:
+                resized = np.empty(shape, dtype=arr.dtype)
+                resized[: len(arr)] = arr
+                arr = resized
+        finally:
+            setattr(self, name, arr)
+
+    def _variant_tuple(self, record: Variant) -> tuple:
+        """
+        Extract the metadata in a line of the VCF as a tuple
+
+        This is a helper function for :py:meth:`~.Genotypes._variant_arr` and
+        :py:meth:`~.Genotypes._iterate_blocks`. It's separate so that it can easily be
+        overridden in any child classes.
+
+        Parameters
+        ----------
+        record: Variant
+            A Variant object from which to fetch metadata
+
+        Returns
+        -------
+        tuple
+            The fields of a row from the :py:attr:`~.Genotypes.variants` array
+        """
+        return (record.ID, record.CHROM, record.POS)
+
+    def _variant_arr(self, record: Variant):
+        """
+        Construct a np array from the metadata in a line of the VCF
+
+        This is a helper function for :py:meth:`~.Genotypes._iterate`
+
+        Parameters
+        ----------
+        record: Variant
+            A Variant object from which to fetch metadata
+
+        Returns
+        -------
+        npt.NDArray
+            A row from the :py:attr:`~.Genotypes.variants` array
+        """
+        return np.array(self._variant_tuple(record), dtype=self.variants.dtype)
+
+    def _vcf_iter(self, vcf: VCF, region: str = None, variants: set[str] = None):
+        """
+        Yield all variants within a region in the VCF file.
+
+        Parameters
+        ----------
+        vcf: VCF
+            The VCF object from which to fetch variant records
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Returns
+        -------
+        vcffile : Iterator[Variant]
+            Iterable over cyvcf2 records. See :py:meth:`~.Genotypes._fetch_records`
+        """
+        return self._fetch_records(vcf, region, variants)
+
+    def _return_data(self, variant: Variant):
+        """
+        Collect genotypes from current variant
+
+        Parameters
+        ----------
+        variant: Variant
+            A Variant object from which to fetch genotypes
+
+        Returns
+        -------
+        data: npt.NDArray
+            Numpy array storing all genotypes
+
+            The array is not necessarily of type np.uint8; callers are expected to cast
+            it (ex: by assigning it into a preallocated np.uint8 array)
+        """
+        return variant.genotype.array()
+
+    def _iterate(self, vcf: VCF, region: str = None, variants: set[str] = None):
+        """
+        A generator over the lines of a VCF
+
+        This is a helper function for :py:meth:`~.Genotypes.__iter__`
+
+        Parameters
+        ----------
+        vcf: VCF
+            The VCF object from which to fetch variant records
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Yields
+        ------
+        Iterator[namedtuple]
+            An iterator over each line in the file, where each line is encoded as a
+            namedtuple containing each of the class properties
+        """
+        self.log.info(f"Loading genotypes from {len(self.samples)} samples")
+        Record = namedtuple("Record", "data variants")
+        num_seen = 0
+        # iterate over each line in the VCF
+        # note, this can take a lot of time if there are many samples
+        for variant in self._vcf_iter(vcf, region, variants):
+            if variants is not None and variant.ID not in variants:
+                if num_seen >= len(variants):
+                    # exit early if we've already found all the variants
+                    break
+                continue
+            # save meta information about each variant
+            variant_arr = self._variant_arr(variant)
+            # extract the genotypes to a matrix of size n x 3
+            # the last dimension has three items:
+            # 1) presence of REF in strand one
+            # 2) presence of REF in strand two
+            # 3) whether the genotype is phased (if self._prephased is False)
+            data = self._return_data(variant)
+            data = data[:, : (2 + (not self._prephased))].astype(np.uint8)
+            yield Record(data, variant_arr)
+            num_seen += 1
+        vcf.close()
+
+    def _iterate_blocks(
+        self,
+        vcf: VCF,
+        region: str = None,
+        variants: set[str] = None,
+        chunk_size: int = 1000,
+        out: npt.NDArray = None,
+        min_pos: int = None,
+    ):
+        """
+        A generator over blocks of lines in a VCF
+
+        Unlike :py:meth:`~.Genotypes._iterate`, the genotypes of each record are
+        written directly into a variant-major buffer, so that no temporary arrays need
+        to be created for each record
+
+        This is a helper function for :py:meth:`~.Genotypes.read`
+
+        Parameters
+        ----------
+        vcf: VCF
+            The VCF object from which to fetch variant records
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        chunk_size: int, optional
+            The max number of records to decode in each block
+        out: npt.NDArray, optional
+            A preallocated np.uint8 array of shape p x n x (2 or 3) into which the
+            genotypes of each record should be written, in order
+
+            Iteration stops once this array has been filled. If this is not provided,
+            a single buffer of shape chunk_size x n x (2 or 3) will be allocated and
+            reused for every block, so the genotypes of each block must be consumed (or
+            copied) before requesting the next block.
+        min_pos: int, optional
+            If provided, skip any records that start before this position (ex: records
+            that overlap the start of the region)
+
+        Yields
+        ------
+        Iterator[namedtuple]
+            An iterator over each block of lines in the file, where each block is
+            encoded as a namedtuple containing a view into the buffer of genotypes (of
+            shape chunk_size x n x (2 or 3)) and a list of tuples of variant metadata
+        """
+        self.log.info(f"Loading genotypes from {len(self.samples)} samples")
+        Block = namedtuple("Block", "data variants")
+        num_cols = 2 + (not self._prephased)
+        reuse = out is None
+        if reuse:
+            out = np.empty((chunk_size, len(self.samples), num_cols), dtype=np.uint8)
+        num_seen = 0
+        start = idx = 0
+        block = []
+        if not len(out):
+            vcf.close()
+            return
+        # iterate over each line in the VCF
+        # note, this can take a lot of time if there are many samples
+        for variant in self._vcf_iter(vcf, region, variants):
+            if min_pos is not None and variant.POS < min_pos:
+                continue
+            if variants is not None and variant.ID not in variants:
+                if num_seen >= len(variants):
+                    # exit early if we've already found all the variants
+                    break
+                continue
+            # decode the genotypes straight into the buffer, casting them to np.uint8
+            # see _iterate() for a description of the last dimension
+            out[idx] = self._return_data(variant)[:, :num_cols]
+            block.append(self._variant_tuple(variant))
+            idx += 1
+            num_seen += 1
+            if len(block) == chunk_size or idx == len(out):
+                yield Block(out[start:idx], block)
+                block = []
+                if reuse:
+                    idx = 0
+                elif idx == len(out):
+                    # there isn't any room left in the buffer
+                    break
+                start = idx
+        if len(block):
+            yield Block(out[start:idx], block)
+        vcf.close()
+
+    def __iter__(
+        self, region: str = None, samples: set[str] = None, variants: set[str] = None
+    ) -> Iterator[namedtuple]:
+        """
+        Read genotypes from a VCF line by line without storing anything
+
+        Parameters
+        ----------
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        samples : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Returns
+        -------
+        Iterator[namedtuple]
+            See documentation for :py:meth:`~.Genotypes._iterate`
+        """
+        vcf = self._open_vcf(samples)
+        # call another function to force the lines above to be run immediately
+        # see https://stackoverflow.com/a/36726497
+        return self._iterate(vcf, region, variants)
+
+    def _iterate_chunks(
+        self,
+        vcf: VCF,
+        region: str = None,
+        variants: set[str] = None,
+        chunk_size: int = 1000,
+    ):
+        """
+        A generator over chunks of lines in a VCF
+
+        This is a helper function for :py:meth:`~.Genotypes.iter_chunks`
+
+        Parameters
+        ----------
+        vcf: VCF
+            The VCF object from which to fetch variant records
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        chunk_size: int, optional
+            See documentation for :py:meth:`~.Genotypes.iter_chunks`
+
+        Yields
+        ------
+        Iterator[namedtuple]
+            An iterator over each chunk of lines in the file, where each chunk is
+            encoded as a namedtuple containing a contiguous n (samples) x c (variants)
+            x 2 (strands) genotype matrix and the c rows of the variants array
+
+            Just like in :py:meth:`~.Genotypes.read`, the last dimension of the
+            genotype matrix will also contain the phase of each genotype unless
+            :py:attr:`~.Genotypes._prephased` is True
+        """
+        Chunk = namedtuple("Chunk", "data variants")
+        for block in self._iterate_blocks(vcf, region, variants, chunk_size):
+            variants_arr = np.empty((len(block.variants),), dtype=self.variants.dtype)
+            variants_arr[:] = block.variants
+            # copy the genotypes out of the reused buffer, so that samples are rows and
+            # variants are columns
+            data = block.data.transpose((1, 0, 2)).copy()
+            yield Chunk(data, variants_arr)
+
+    def iter_chunks(
+        self,
+        chunk_size: int = 1000,
+        region: str = None,
+        samples: set[str] = None,
+        variants: set[str] = None,
+    ) -> Iterator[namedtuple]:
+        """
+        Read genotypes from a VCF in chunks of variants without storing anything
+
+        Unlike :py:meth:`~.Genotypes.__iter__`, this yields many variants at a time,
+        so that they can be processed with vectorized operations while only ever
+        storing chunk_size variants in memory
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            The max number of variants in each chunk
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        samples : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Returns
+        -------
+        Iterator[namedtuple]
+            See documentation for :py:meth:`~.Genotypes._iterate_chunks`
+        """
+        vcf = self._open_vcf(samples)
+        # call another function to force the lines above to be run immediately
+        # see https://stackoverflow.com/a/36726497
+        return self._iterate_chunks(vcf, region, variants, chunk_size)
+
+    def _open_vcf(self, samples: set[str] = None) -> VCF:
+        """
+        Open the VCF for reading and record the samples that will be loaded from it
+
+        This is a helper function for :py:meth:`~.Genotypes.__iter__` and
+        :py:meth:`~.Genotypes.read`
+
+        Parameters
+        ----------
+        samples : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Returns
+        -------
+        VCF
+            A cyvcf2 VCF object from which to fetch variant records
+        """
+        if samples is not None:
+            if not isinstance(samples, set):
+                self.log.warning(
+                    "Samples cannot be loaded in a particular order. "
+                    "Use subset() to reorder the samples after loading them."
+                )
+            samples = list(samples)
+        vcf = VCF(str(self.fname), samples=samples, lazy=True)
+        self.samples = tuple(vcf.samples)
+        return vcf
+
+    @staticmethod
+    def _num_words(num_samples: int) -> int:
+        """
+        The number of 64-bit words needed to store one bit for each sample
+
+        Parameters
+        ----------
+        num_samples: int
+            The number of samples
+
+        Returns
+        -------
+        int
+            The number of np.uint64 words in the last axis of a packed genotype matrix
+        """
+        return (num_samples + 63) // 64
+
+    @classmethod
+    def _pack_bits(cls, arr: npt.NDArray[np.bool_]) -> npt.NDArray[np.uint64]:
+        """
+        Pack the last axis of a boolean array into 64-bit words
+
+        Any unused bits in the last word are set to 0
+
+        Parameters
+        ----------
+        arr: npt.NDArray[np.bool_]
+            An array of shape (..., n)
+
+        Returns
+        -------
+        npt.NDArray[np.uint64]
+            An array of shape (..., w), where w is the number of words needed for n bits
+        """
+        num_bytes = 8 * cls._num_words(arr.shape[-1])
+        bits = np.packbits(arr, axis=-1, bitorder="little")
+        words = np.zeros(arr.shape[:-1] + (num_bytes,), dtype=np.uint8)
+        words[..., : bits.shape[-1]] = bits
+        return words.view(np.uint64)
+
+    @staticmethod
+    def _unpack_bits(
+        arr: npt.NDArray[np.uint64], num_bits: int
+    ) -> npt.NDArray[np.bool_]:
+        """
+        Unpack the 64-bit words in the last axis of an array into a boolean array
+
+        This is the inverse of :py:meth:`~.Genotypes._pack_bits`
+
+        Parameters
+        ----------
+        arr: npt.NDArray[np.uint64]
+            An array of shape (..., w)
+        num_bits: int
+            The number of bits (n) to unpack from each row of words
+
+        Returns
+        -------
+        npt.NDArray[np.bool_]
+            An array of shape (..., n)
+        """
+        arr = np.ascontiguousarray(arr).view(np.uint8)
+        bits = np.unpackbits(arr, axis=-1, count=num_bits, bitorder="little")
+        return bits.view(np.bool_)
+
+    def _unpacked_data(self, start: int = None, end: int = None) -> npt.NDArray:
+        """
+        Obtain a range of variants from the genotype matrix in its unpacked form
+
+        Parameters
+        ----------
+        start: int, optional
+            The index of the first variant to return
+        end: int, optional
+            The index after the last variant to return
+
+        Returns
+        -------
+        npt.NDArray
+            An n (samples) x (end - start) (variants) x 2 (strands) array
+        """
+        if not self.packed:
+            return self.data[:, start:end]
+        bits = self._unpack_bits(self.data[start:end], len(self.samples))
+        return bits.transpose((2, 0, 1))
+
+    def pack(self, chunk_size: int = 10000):
+        """
+        Store the genotypes in bit-packed form, using only one bit per allele
+
+        :py:attr:`~.Genotypes.data` is replaced by a p (variants) x 2 (strands) x w
+        (words) array, where each np.uint64 word stores the alleles of 64 samples. This
+        takes 8x less memory than a np.bool_ array. :py:meth:`~.Genotypes.subset`,
+        :py:meth:`~.Genotypes.check_maf`, and the write methods work directly on the
+        packed genotypes, but you should call :py:meth:`~.Genotypes.unpack` before
+        accessing :py:attr:`~.Genotypes.data` yourself.
+
+        .. note::
+            You must call :py:meth:`~.Genotypes.check_biallelic` and
+            :py:meth:`~.Genotypes.check_phase` before executing this method
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            The number of variants to pack at once. Larger values use more memory.
+
+        Raises
+        ------
+        ValueError
+            If the genotypes are not biallelic or if they still contain phase info
+        """
+        if self.packed:
+            self.log.warning("The genotypes are already packed")
+            return
+        if self.data.dtype != np.bool_ or self.data.shape[2] != 2:
+            raise ValueError(
+                "Only biallelic genotypes without phase info can be packed. Call "
+                "check_biallelic() and check_phase() first."
+            )
+        num_samps, num_variants = self.data.shape[:2]
+        self.log.debug(f"Packing genotypes into chunks of {chunk_size} variants")
+        data = np.empty((num_variants, 2, self._num_words(num_samps)), dtype=np.uint64)
+        for start in range(0, num_variants, chunk_size):
+            end = start + chunk_size
+            data[start:end] = self._pack_bits(
+                self.data[:, start:end].transpose((1, 2, 0))
+            )
+        self.data = data
+
+    def unpack(self):
+        """
+        Convert bit-packed genotypes back into an n x p x 2 array of type np.bool_
+
+        This is the inverse of :py:meth:`~.Genotypes.pack`
+        """
+        if not self.packed:
+            self.log.warning("The genotypes are not packed")
+            return
+        self.data = self._unpacked_data()
+
+    def compact_variants(self):
+        """
+        Store :py:attr:`~.Genotypes.variants` in a compact :class:`VariantTable`
+
+        Contigs are stored as integer codes, and variant IDs and alleles are stored as
+        variable-length byte strings, rather than as fixed-width unicode strings and
+        Python objects. This can reduce the memory used by the variants by an order of
+        magnitude. The table can still be accessed just like the original structured
+        array (ex: ``variants["id"]``), but each access decodes the requested fields,
+        so you should save the result if you intend to use it many times.
+        """
+        if isinstance(self.variants, VariantTable):
+            self.log.warning("The variants are already compact")
+            return
+        old_size = self.variants.nbytes
+        self.variants = VariantTable(self.variants)
+        self.log.debug(
+            f"Compacted variants from {old_size} to {self.variants.nbytes} bytes"
+        )
+
+    def index(self, samples: bool = True, variants: bool = True):
+        """
+        Call this function once to improve the amortized time-complexity of look-ups of
+        samples and variants by their ID. This is useful if you intend to later subset
+        by a set of samples or variant IDs.
+        The time complexity of this function should be roughly O(n+p) if both
+        parameters are True. Otherwise, it will be either O(n) or O(p).
+
+        Parameters
+        ----------
+        samples: bool, optional
+            Whether to index the samples for fast loop-up. Adds complexity O(n).
+        variants: bool, optional
+            Whether to index the variants for fast look-up. Adds complexity O(p).
+
+        Raises
+        ------
+        ValueError
+            If any samples or variants appear more than once
+        """
+        if samples and self._samp_idx is None:
+            self._samp_idx = dict(zip(self.samples, range(len(self.samples))))
+            if len(self._samp_idx) < len(self.samples):
+                duplicates = Counter(self.samples).items()
+                duplicates = [samp_id for samp_id, count in duplicates if count > 1]
+                a_few = 5 if len(duplicates) > 5 else len(duplicates)
+                raise ValueError(f"Found duplicate sample IDs: {duplicates[:a_few]}")
+        if variants and self._var_idx is None:
+            self._var_idx = dict(zip(self.variants["id"], range(len(self.variants))))
+            if len(self._var_idx) < len(self.variants):
+                duplicates = Counter(self.variants["id"]).items()
+                duplicates = [var_id for var_id, count in duplicates if count > 1]
+                a_few = 5 if len(duplicates) > 5 else len(duplicates)
+                raise ValueError(f"Found duplicate variant IDs: {duplicates[:a_few]}")
+
+    def subset(
+        self,
+        samples: tuple[str] = None,
+        variants: tuple[str] = None,
+        inplace: bool = False,
+    ):
+        """
+        Subset these genotypes to a smaller set of samples or a smaller set of variants
+
+        The order of the samples and variants in the subsetted instance will match
+        the order in the provided tuple parameters.
+
+        Parameters
+        ----------
+        samples: tuple[str]
+            A subset of samples to keep
+        variants: tuple[str]
+            A subset of variant IDs to keep
+        inplace: bool, optional
+            If False, return a new Genotypes object; otherwise, alter the current one
+
+        Returns
+        -------
+            A new Genotypes object if inplace is set to False, else returns None. When
+            the requested samples and variants form contiguous ranges, the
+            :py:attr:`~.Genotypes.data` of the new object is a view that shares memory
+            with the genotypes of this object, so writing to one will also change the
+            other.
+
+        Notes
+        -----
+        The genotypes are not copied right away. Instead, the indices of the requested
+        samples and variants are recorded and the genotypes are only gathered from the
+        original genotype matrix once the :py:attr:`~.Genotypes.data` property of the
+        subsetted instance is accessed. Subsets of subsets are composed without
+        gathering anything, and requests for contiguous ranges of samples or variants
+        are served by views into the original matrix, so that nothing is copied.
+        Thus, you should call ``.copy()`` on :py:attr:`~.Genotypes.data` before
+        modifying it in place if the original genotypes must be left unchanged. For
+        example, ``gts.subset(variants=ids).data.copy()``. Methods that reassign
+        :py:attr:`~.Genotypes.data` (like :py:meth:`~.Genotypes.check_missing` with
+        ``discard_also=True``) never write to the original genotypes.
+        """
+        # First, initialize variables
+        gts = self
+        if not inplace:
+            gts = self.__class__(self.fname, self.log)
+        gts.samples = self.samples
+        gts.variants = self.variants
+        # compose our pending subset (if any) with the requested one
+        samp_view, var_view = self._view or (None, None)
+        gts._data, gts._view = self._data, self._view
+        # Index the current set of samples and variants so we can have fast look-up
+        self.index(samples=(samples is not None), variants=(variants is not None))
+        # Subset the samples
+        if samples is not None:
+            gts.samples = tuple(samp for samp in samples if samp in self._samp_idx)
+            if len(gts.samples) < len(samples):
+                diff = len(samples) - len(gts.samples)
+                self.log.warning(
                     f"Saw {diff} fewer samples than requested. Proceeding with "
                     f"{len(gts.samples)} samples."
                 )
-            samp_idx = tuple(self._samp_idx[samp] for samp in gts.samples)
+            samp_idx = np.array(
+                [self._samp_idx[samp] for samp in gts.samples], dtype=np.intp
+            )
             if inplace:
                 self._samp_idx = None
-            gts.data = gts.data[samp_idx, :]
+            samp_view = samp_idx if samp_view is None else samp_view[samp_idx]
         # Subset the variants
         if variants is not None:
-            var_idx = [self._var_idx[var] for var in variants if var in self._var_idx]
+            var_idx = np.array(
+                [self._var_idx[var] for var in variants if var in self._var_idx],
+                dtype=np.intp,
+            )
             if len(var_idx) < len(variants):
                 diff = len(variants) - len(var_idx)
                 self.log.warning(
@@ -437,10 +1624,248 @@ class Genotypes(Data):
             gts.variants = self.variants[var_idx]
             if inplace:
                 self._var_idx = None
-            gts.data = gts.data[:, var_idx]
+            var_view = var_idx if var_view is None else var_view[var_idx]
+        if gts._data is not None and (samp_view is not None or var_view is not None):
+            gts._view = (samp_view, var_view)
         if not inplace:
             return gts
 
+    @staticmethod
+    def _as_slice(idx: npt.NDArray | None) -> slice | npt.NDArray:
+        """
+        Convert an array of indices into a slice, if the indices are contiguous
+
+        This is a helper function for :py:meth:`~.Genotypes._gather`
+
+        Parameters
+        ----------
+        idx: npt.NDArray | None
+            An array of indices or None to indicate all of them
+
+        Returns
+        -------
+        slice | npt.NDArray
+            A slice over the same indices or the original array if they weren't
+            contiguous
+        """
+        if idx is None:
+            return slice(None)
+        if len(idx) and idx[-1] - idx[0] == len(idx) - 1 and np.all(np.diff(idx) == 1):
+            return slice(idx[0], idx[-1] + 1)
+        return idx
+
+    def _gather(
+        self,
+        data: npt.NDArray,
+        samp_idx: npt.NDArray = None,
+        var_idx: npt.NDArray = None,
+    ) -> npt.NDArray:
+        """
+        Gather a subset of samples and variants from a genotype matrix
+
+        This is a helper function for :py:attr:`~.Genotypes.data`
+
+        Parameters
+        ----------
+        data: npt.NDArray
+            The original genotype matrix
+        samp_idx: npt.NDArray, optional
+            The indices of the samples to keep, in the order they should appear
+        var_idx: npt.NDArray, optional
+            The indices of the variants to keep, in the order they should appear
+
+        Returns
+        -------
+        npt.NDArray
+            The requested subset of the genotype matrix
+
+            This is a view into the original matrix if the indices are contiguous
+        """
+        samps, variants = self._as_slice(samp_idx), self._as_slice(var_idx)
+        if data.dtype == np.uint64:
+            # packed genotypes are stored in variant-major order
+            data = data[variants]
+            if samp_idx is not None:
+                data = self._subset_packed(data, samp_idx)
+            return data
+        if isinstance(variants, slice):
+            # slicing first creates a view, so at most one copy is made
+            return data[:, variants][samps]
+        if isinstance(samps, slice):
+            return data[samps][:, variants]
+        return data[np.ix_(samps, variants)]
+
+    def _subset_packed(
+        self, data: npt.NDArray[np.uint64], samp_idx: npt.NDArray, chunk_size=10000
+    ) -> npt.NDArray[np.uint64]:
+        """
+        Subset the samples in a packed genotype matrix
+
+        This is a helper function for :py:meth:`~.Genotypes.subset`
+
+        Parameters
+        ----------
+        data: npt.NDArray[np.uint64]
+            A packed genotype matrix
+        samp_idx: npt.NDArray
+            The indices of the samples to keep, in the order they should appear
+        chunk_size: int, optional
+            The number of variants to repack at once. Larger values use more memory.
+
+        Returns
+        -------
+        npt.NDArray[np.uint64]
+            A packed genotype matrix containing only the requested samples
+        """
+        subset = np.empty(
+            (len(data), 2, self._num_words(len(samp_idx))), dtype=np.uint64
+        )
+        for start in range(0, len(data), chunk_size):
+            end = start + chunk_size
+            # unpack every bit, including the padding, since none of it is selected
+            bits = self._unpack_bits(data[start:end], data.shape[2] * 64)
+            subset[start:end] = self._pack_bits(bits[:, :, samp_idx])
+        return subset
+
+    def qc(
+        self,
+        discard_missing: bool = False,
+        discard_multiallelic: bool = False,
+        chunk_size: int = 10000,
+    ):
+        """
+        Check for missing genotypes, multiallelic variants, and unphased genotypes
+
+        This is equivalent to calling :py:meth:`~.Genotypes.check_missing`,
+        :py:meth:`~.Genotypes.check_biallelic`, and :py:meth:`~.Genotypes.check_phase`
+        one after the other, except that the genotype matrix is only scanned once, in
+        chunks of variants, and it is converted to np.bool_ in-place rather than
+        copied. So it should be faster and require less memory.
+
+        Raises
+        ------
+        ValueError
+            If any of the samples have missing genotypes 'GT: .|.', if any of the
+            genotypes have more than two alleles, or if any heterozygous genotypes are
+            unphased
+
+        Parameters
+        ----------
+        discard_missing : bool, optional
+            If True, discard any samples that are missing genotypes without raising a
+            ValueError
+        discard_multiallelic : bool, optional
+            If True, discard any multiallelic variants without raising a ValueError
+        chunk_size: int, optional
+            The number of variants to scan at once. Larger values use more memory.
+        """
+        if self.packed:
+            self.log.warning("Packed genotypes have already been checked")
+            return
+        data = self.data
+        num_samps, num_variants = data.shape[:2]
+        check_alleles = data.dtype != np.bool_
+        check_phase = not self._prephased and data.shape[2] >= 3
+        # A genotype value equal to the max or one less than max for uint8 indicates
+        #   the value was missing
+        missing_val = np.iinfo(np.uint8).max - 1
+        missing = np.zeros(num_samps, dtype=np.bool_)
+        multiallelic = np.zeros(num_variants, dtype=np.bool_)
+        unphased = np.zeros(num_samps, dtype=np.bool_)
+        for start in range(0, num_variants, chunk_size):
+            end = start + chunk_size
+            chunk = data[:, start:end]
+            if check_alleles:
+                miss = np.any(chunk[:, :, :2] >= missing_val, axis=2)
+                missing |= miss.any(axis=1)
+                multi = np.any(chunk[:, :, :2] > 1, axis=2) & ~miss
+                multiallelic[start:end] = multi.any(axis=0)
+            if check_phase:
+                # heterozygous genotypes are unphased if the phase bit isn't set
+                het = (chunk[:, :, 0] != 0) ^ (chunk[:, :, 1] != 0)
+                unphased |= np.any(het & (chunk[:, :, 2] == 0), axis=1)
+        # these masks are a superset of the offending samples and variants, so we must
+        # narrow them down to those that remain after each check
+        samp_idx = np.flatnonzero(~missing)
+        if np.any(missing):
+            if not discard_missing:
+                samp = np.flatnonzero(missing)[0]
+                variant = np.flatnonzero(np.any(data[samp, :, :2] >= missing_val, 1))
+                raise ValueError(
+                    "Genotype with ID {} at POS {}:{} is missing for sample {}".format(
+                        *tuple(self.variants[variant[0]])[:3], self.samples[samp]
+                    )
+                )
+            self.log.warning(
+                f"Ignoring missing genotypes from {np.sum(missing)} samples"
+            )
+            if not len(samp_idx):
+                self.log.warning(
+                    "All samples were discarded! Check that that none of your variants"
+                    " are missing genotypes (GT: '.|.')."
+                )
+        variant_idx = np.flatnonzero(multiallelic)
+        if len(variant_idx):
+            multi = np.any(data[np.ix_(samp_idx, variant_idx)][:, :, :2] > 1, axis=2)
+            samp, variant = np.nonzero(multi)
+            if len(samp) and not discard_multiallelic:
+                raise ValueError(
+                    "Variant with ID {} at POS {}:{} is multiallelic for sample {}"
+                    .format(
+                        *tuple(self.variants[variant_idx[variant[0]]])[:3],
+                        self.samples[samp_idx[samp[0]]],
+                    )
+                )
+            multiallelic[variant_idx] = multi.any(axis=0)
+            if np.any(multiallelic):
+                self.log.info(f"Ignoring {np.sum(multiallelic)} multiallelic variants")
+                if not np.any(~multiallelic):
+                    self.log.warning(
+                        "All variants were discarded! Check that there are biallelic "
+                        "variants in your dataset."
+                    )
+        variant_idx = np.flatnonzero(~multiallelic)
+        unphased_idx = np.flatnonzero(unphased & ~missing)
+        if len(unphased_idx):
+            gts = data[np.ix_(unphased_idx, variant_idx)] != 0
+            samp, variant = np.nonzero((gts[:, :, 0] ^ gts[:, :, 1]) & ~gts[:, :, 2])
+            if len(samp):
+                raise ValueError(
+                    "Variant with ID {} at POS {}:{} is unphased for sample {}".format(
+                        *tuple(self.variants[variant_idx[variant[0]]])[:3],
+                        self.samples[unphased_idx[samp[0]]],
+                    )
+                )
+        if np.any(missing) or np.any(multiallelic):
+            data = data[np.ix_(samp_idx, variant_idx)]
+            self.samples = tuple(self.samples[samp] for samp in samp_idx)
+            self.variants = self.variants[variant_idx]
+            self._samp_idx = None
+            self._var_idx = None
+        if check_alleles:
+            # every allele is now either 0 or 1, so we can just reinterpret the bytes
+            data = data.view(np.bool_)
+        if check_phase:
+            # remove the last dimension that contains the phase info
+            data = data[:, :, :2]
+        self.data = data
+
+    def _delete_variants(self, idx: npt.NDArray):
+        """
+        Delete variants from :py:attr:`~.Genotypes.variants`
+
+        Unlike np.delete(), this keeps a compact :class:`VariantTable` compact instead
+        of converting it back into a structured array
+
+        Parameters
+        ----------
+        idx: npt.NDArray
+            The indices of the variants to delete. They may contain duplicates.
+        """
+        keep = np.ones(len(self.variants), dtype=np.bool_)
+        keep[idx] = False
+        self.variants = self.variants[keep]
+
     def check_missing(self, discard_also=False):
         """
         Check that each sample is properly genotyped
@@ -456,6 +1881,9 @@ class Genotypes(Data):
             If True, discard any samples that are missing genotypes without raising a
             ValueError
         """
+        if self.packed:
+            # packed genotypes can't have any missing values
+            return
         # check: are there any samples that have genotype values that are empty?
         # A genotype value equal to the max or one less than max for uint8 indicates
         #   the value was missing
@@ -500,7 +1928,7 @@ class Genotypes(Data):
         discard_also : bool, optional
             If True, discard any multiallelic variants without raising a ValueError
         """
-        if self.data.dtype == np.bool_:
+        if self.packed or self.data.dtype == np.bool_:
             self.log.warning("All genotypes are already biallelic")
             return
         # check: are there any variants that have genotype values above 1?
@@ -511,7 +1939,7 @@ class Genotypes(Data):
             if discard_also:
                 self.log.info(f"Ignoring {len(variant_idx)} multiallelic variants")
                 self.data = np.delete(self.data, variant_idx, axis=1)
-                self.variants = np.delete(self.variants, variant_idx)
+                self._delete_variants(variant_idx)
                 self._var_idx = None
             else:
                 raise ValueError(
@@ -539,7 +1967,7 @@ class Genotypes(Data):
         ValueError
             If any heterozgyous genotpyes are unphased
         """
-        if self._prephased or self.data.shape[2] < 3:
+        if self._prephased or self.packed or self.data.shape[2] < 3:
             self.log.warning("Phase information has already been removed from the data")
             return
         # check: are there any variants that are heterozygous and unphased?
@@ -595,9 +2023,14 @@ class Genotypes(Data):
         -------
             The minor allele frequency of each variant
         """
-        num_strands = 2 * self.data.shape[0]
-        # TODO: make this work for multi-allelic variants, too?
-        ref_af = self.data[:, :, :2].astype(np.bool_).sum(axis=(0, 2)) / num_strands
+        num_strands = 2 * len(self.samples)
+        if self.packed:
+            # count the set bits in each variant, one byte at a time
+            alt_cts = self._POPCOUNT[self.data.view(np.uint8)]
+            ref_af = alt_cts.sum(axis=(1, 2), dtype=np.uint64) / num_strands
+        else:
+            # TODO: make this work for multi-allelic variants, too?
+            ref_af = self.data[:, :, :2].astype(np.bool_).sum(axis=(0, 2)) / num_strands
         maf = np.array([ref_af, 1 - ref_af]).min(axis=0)
         if threshold is None:
             return maf
@@ -606,8 +2039,8 @@ class Genotypes(Data):
             idx = np.nonzero(rare_variants)[0]
             if discard_also:
                 original_num_variants = len(self.variants)
-                self.data = np.delete(self.data, idx, axis=1)
-                self.variants = np.delete(self.variants, idx)
+                self.data = np.delete(self.data, idx, axis=(0 if self.packed else 1))
+                self._delete_variants(idx)
                 maf = np.delete(maf, idx)
                 self.log.info(
                     f"Ignoring {original_num_variants - len(self.variants)} variants "
@@ -690,18 +2123,23 @@ class Genotypes(Data):
         gts.samples = objs[0].samples
         dtypes = list(gts.variants.dtype.names)
         gts.variants = np.concatenate(tuple(obj.variants[dtypes] for obj in objs))
-        unphased = [obj.data.shape[2] == 3 for obj in objs]
+        if all(obj.packed for obj in objs):
+            gts.data = np.concatenate(tuple(obj.data for obj in objs), axis=0)
+            return gts
+        # otherwise, unpack any packed genotypes before merging them
+        objs_data = [obj._unpacked_data() for obj in objs]
+        unphased = [data.shape[2] == 3 for data in objs_data]
         # check: do we have a mix of phased and unphased objects?
         if any(unphased) and not all(unphased):
             data = (
-                obj.data if phase else np.insert(obj.data, 2, 1, axis=2)
-                for phase, obj in zip(unphased, objs)
+                data if phase else np.insert(data, 2, 1, axis=2)
+                for phase, data in zip(unphased, objs_data)
             )
         else:
-            data = (obj.data for obj in objs)
+            data = objs_data
         # TODO: fix Genotypes.check_biallelic so it always keeps data as np.uint8 and then adjust this code accordingly
         dtype = (
-            np.bool_ if all(obj.data.dtype == np.bool_ for obj in objs) else np.uint8
+            np.bool_ if all(data.dtype == np.bool_ for data in objs_data) else np.uint8
         )
         gts.data = np.concatenate(tuple(data), axis=1, dtype=dtype)
         return gts
@@ -735,28 +2173,224 @@ class GenotypesVCF(Genotypes):
         super().__init__(fname, log)
         dtype = {k: v[0] for k, v in self.variants.dtype.fields.items()}
         self.variants = np.array([], dtype=list(dtype.items()) + [("alleles", object)])
+        self._writer = None
 
-    def _variant_arr(self, record: Variant):
+    def _variant_tuple(self, record: Variant) -> tuple:
+        """
+        See documentation for :py:meth:`~.Genotypes._variant_tuple`
+        """
+        return (record.ID, record.CHROM, record.POS, (record.REF, *record.ALT))
+
+    def _contigs(self) -> list[str]:
+        """
+        List the contigs of the variants in the order that they first appear
+
+        Returns
+        -------
+        list[str]
+            The name of each contig in :py:attr:`~.GenotypesVCF.variants`
+        """
+        chroms = self.variants["chrom"]
+        _, first_idxs = np.unique(chroms, return_index=True)
+        return chroms[np.sort(first_idxs)].tolist()
+
+    @staticmethod
+    def _format_header(contigs: list[str], samples: tuple[str] = None) -> str:
+        """
+        Format the header of a VCF
+
+        Parameters
+        ----------
+        contigs: list[str]
+            The contigs to declare in the header
+        samples: tuple[str], optional
+            The sample columns of the VCF, if it should have a GT FORMAT field
+
+        Returns
+        -------
+        str
+            The lines of the header, each terminated by a newline
+        """
+        header = "##fileformat=VCFv4.2\n"
+        header += '##FILTER=<ID=PASS,Description="All filters passed">\n'
+        header += "".join(f"##contig=<ID={contig}>\n" for contig in contigs)
+        columns = "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"
+        if samples is not None:
+            header += '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+            if len(samples):
+                columns = "\t".join((columns, "FORMAT", *samples))
+        return header + columns + "\n"
+
+    @staticmethod
+    def _format_variants(variants: npt.NDArray, suffix: str = "\n") -> list[str]:
         """
-        See documentation for :py:meth:`~.Genotypes._variant_arr`
+        Format the fixed columns (CHROM through INFO) of a block of variants
+
+        Parameters
+        ----------
+        variants: npt.NDArray
+            The variants, in the same format as :py:attr:`~.GenotypesVCF.variants`
+        suffix: str, optional
+            A string to append to each line
+
+        Returns
+        -------
+        list[str]
+            The fixed columns of each variant, separated by tabs
         """
-        return np.array(
-            (
-                record.ID,
-                record.CHROM,
-                record.POS,
-                (record.REF, *record.ALT),
-            ),
-            dtype=self.variants.dtype,
+        columns = zip(
+            variants["chrom"].tolist(),
+            variants["pos"].tolist(),
+            variants["id"].tolist(),
+            variants["alleles"].tolist(),
         )
+        return [
+            f"{chrom}\t{pos}\t{vid}\t{alts[0]}\t{','.join(alts[1:]) or '.'}\t.\t.\t."
+            + suffix
+            for chrom, pos, vid, alts in columns
+        ]
 
-    def write(self):
+    def _gt_fields(self, data: npt.NDArray) -> npt.NDArray:
         """
-        Write the variants in this class to a VCF at :py:attr:`~.GenotypesVCF.fname`
+        Format the GT fields of every sample for a chunk of variants
+
+        The fields are rendered for the entire chunk at once with vectorized
+        operations, rather than one sample at a time
+
+        Parameters
+        ----------
+        data: npt.NDArray
+            See documentation for :py:meth:`~.GenotypesVCF.append_chunk`
+
+        Returns
+        -------
+        npt.NDArray
+            A p (variants) x n (samples) array of GT fields, as byte strings
+        """
+        size, num_samples = data.shape[:2]
+        if data.dtype != np.uint8:
+            data = data.view(np.uint8)
+        missing_val = np.iinfo(np.uint8).max
+        alleles = data[:, :, :2]
+        if self._prephased or data.shape[2] < 3:
+            phased = np.ones((size, num_samples), dtype=np.bool_)
+        else:
+            phased = data[:, :, 2].astype(np.bool_)
+        max_allele = np.max(alleles, where=alleles != missing_val, initial=0)
+        if max_allele < 10:
+            # every allele is a single character, so each field has the same width
+            chars = np.full(missing_val + 1, ord("."), dtype=np.uint8)
+            chars[:10] = np.frombuffer(b"0123456789", dtype=np.uint8)
+            fields = np.empty((size, num_samples, 3), dtype=np.uint8)
+            fields[:, :, 0] = chars[alleles[:, :, 0]]
+            fields[:, :, 1] = np.where(phased, ord("|"), ord("/"))
+            fields[:, :, 2] = chars[alleles[:, :, 1]]
+            return fields.view("S3")[:, :, 0]
+        tokens = np.array([str(i).encode() for i in range(missing_val)] + [b"."])
+        tokens = tokens.astype(object)
+        seps = np.where(phased, b"|", b"/").astype(object)
+        fields = tokens[alleles[:, :, 0]] + seps + tokens[alleles[:, :, 1]]
+        return fields.astype(bytes)
+
+    @staticmethod
+    def _join_fields(fields: npt.NDArray) -> list[bytes]:
+        """
+        Join the FORMAT fields of every sample for a chunk of variants
+
+        Parameters
+        ----------
+        fields: npt.NDArray
+            A p (variants) x n (samples) array of byte strings
+
+        Returns
+        -------
+        list[bytes]
+            The tab-separated fields of each variant, terminated by a newline
+        """
+        size, num_samples = fields.shape
+        width = fields.dtype.itemsize
+        raw = np.ascontiguousarray(fields).view(np.uint8).reshape((size, -1, width))
+        if num_samples and np.all(raw[:, :, -1]):
+            # none of the fields are padded, so we can append the tabs all at once
+            rows = np.empty((size, num_samples, width + 1), dtype=np.uint8)
+            rows[:, :, :width] = raw
+            rows[:, :, width] = ord("\t")
+            rows[:, -1, width] = ord("\n")
+            return [row.tobytes() for row in rows.reshape((size, -1))]
+        return [b"\t".join(row) + b"\n" for row in fields.tolist()]
+
+    def open(
+        self, num_variants: int = None, contigs: list[str] = None, index: bool = False
+    ):
+        """
+        Start writing genotypes to a VCF at :py:attr:`~.GenotypesVCF.fname` one chunk
+        of variants at a time
+
+        Afterward, call :py:meth:`~.GenotypesVCF.append_chunk` with each chunk of
+        variants and then :py:meth:`~.GenotypesVCF.close`. Only one chunk needs to be
+        held in memory at any given time.
+
+        VCFs are written as plain text unless the file name ends with .gz, in which
+        case they are BGZF-compressed with multiple threads. BCFs are encoded by pysam,
+        instead.
+
+        Parameters
+        ----------
+        num_variants: int, optional
+            The total number of variants that will be written
+
+            This is not needed for VCFs, but it is accepted for consistency with
+            :py:meth:`~.GenotypesPLINK.open`
+        contigs: list[str], optional
+            The contigs to declare in the header of the VCF
+
+            Every variant must belong to one of these contigs
+        index: bool, optional
+            Whether to also index the file once it is closed
+
+            BGZF-compressed VCFs get a tabix index and BCFs get a CSI index. Plain-text
+            VCFs cannot be indexed.
+        """
+        fname = str(self.fname)
+        if index and not fname.endswith((".gz", ".bcf")):
+            self.log.warning(f"Cannot index {fname} because it isn't compressed.")
+            index = False
+        if fname.endswith(".bcf"):
+            self._open_pysam(
+                contigs or [], {"preset": "bcf", "csi": True} if index else None
+            )
+            return
+        if fname.endswith(".gz"):
+            vcf = BGZFWriter(fname, index={"preset": "vcf"} if index else None)
+        elif fname == "-":
+            # write to the file descriptor of stdout, just like pysam
+            vcf = open(1, mode="wb", closefd=False)
+        else:
+            vcf = open(fname, mode="wb")
+        vcf.write(self._format_header(contigs or [], self.samples).encode())
+        if isinstance(vcf, BGZFWriter):
+            # like htslib, keep the header in its own BGZF blocks
+            vcf.flush()
+        self._writer = (vcf, False, [0], None)
+        self.log.info("Writing VCF records")
+
+    def _open_pysam(self, contigs: list[str], index: dict = None):
+        """
+        Start writing genotypes to a VCF or BCF through pysam
+
+        This is a helper function for :py:meth:`~.GenotypesVCF.open`
+
+        Parameters
+        ----------
+        contigs: list[str]
+            See documentation for :py:meth:`~.GenotypesVCF.open`
+        index: dict, optional
+            Keyword arguments to pysam's tabix_index() for indexing the file after it
+            is closed
         """
         vcf = VariantFile(str(self.fname), mode="w")
         # make sure the header is properly structured
-        for contig in set(self.variants["chrom"]):
+        for contig in contigs:
             vcf.header.contigs.add(contig)
         vcf.header.add_meta(
             "FORMAT",
@@ -776,10 +2410,54 @@ class GenotypesVCF(Genotypes):
             )
             for sample in self.samples:
                 vcf.header.add_sample(sample)
+        self._writer = (vcf, True, [0], index)
         self.log.info("Writing VCF records")
-        phased = self._prephased or (self.data.shape[2] < 3)
+
+    def append_chunk(self, data: npt.NDArray, variants: npt.NDArray):
+        """
+        Write a chunk of variants to the VCF opened by
+        :py:meth:`~.GenotypesVCF.open`
+
+        Parameters
+        ----------
+        data: npt.NDArray
+            A p (variants) x n (samples) x 2 genotype matrix, or p x n x 3 if the
+            genotypes aren't all phased
+
+            Note that the variants are the rows, unlike in
+            :py:attr:`~.GenotypesVCF.data`
+        variants: npt.NDArray
+            The p variants, in the same format as :py:attr:`~.GenotypesVCF.variants`
+        """
+        vcf, is_pysam, num_written, _ = self._writer
+        num_written[0] += len(variants)
+        if is_pysam:
+            self._append_pysam(vcf, data, variants)
+        elif len(self.samples):
+            lines = self._format_variants(variants, suffix="\tGT\t")
+            gts = self._join_fields(self._gt_fields(data))
+            vcf.write(b"".join(line.encode() + gt for line, gt in zip(lines, gts)))
+        else:
+            vcf.write("".join(self._format_variants(variants)).encode())
+
+    def _append_pysam(self, vcf: VariantFile, data: npt.NDArray, variants: npt.NDArray):
+        """
+        Write a chunk of variants through pysam
+
+        This is a helper function for :py:meth:`~.GenotypesVCF.append_chunk`
+
+        Parameters
+        ----------
+        vcf: VariantFile
+            The pysam VariantFile opened by :py:meth:`~.GenotypesVCF._open_pysam`
+        data: npt.NDArray
+            See documentation for :py:meth:`~.GenotypesVCF.append_chunk`
+        variants: npt.NDArray
+            See documentation for :py:meth:`~.GenotypesVCF.append_chunk`
+        """
+        phased = self._prephased or (data.shape[2] < 3)
         missing_val = np.iinfo(np.uint8).max
-        for var_idx, var in enumerate(self.variants):
+        for var_data, var in zip(data, variants):
             rec = {
                 "contig": var["chrom"],
                 "start": var["pos"],
@@ -796,22 +2474,53 @@ class GenotypesVCF(Genotypes):
             for samp_idx, sample in enumerate(self.samples):
                 record.samples[sample]["GT"] = tuple(
                     None if val == missing_val else val
-                    for val in self.data[samp_idx, var_idx, :2]
+                    for val in var_data[samp_idx, :2]
                 )
                 # add proper phasing info
                 if phased:
                     record.samples[sample].phased = True
                 else:
-                    record.samples[sample].phased = self.data[samp_idx, var_idx, 2]
+                    record.samples[sample].phased = var_data[samp_idx, 2]
             # write the record to a file
             vcf.write(record)
+
+    def close(self):
+        """
+        Finish writing the VCF opened by :py:meth:`~.GenotypesVCF.open`
+        """
+        vcf, is_pysam, num_written, index = self._writer
+        self._writer = None
+        if num_written[0] == 0:
+            self.log.warning(f"No variants in {self.fname}.")
         try:
             vcf.close()
         except OSError as e:
-            if e.errno == 9 and len(self.variants) == 0:
-                self.log.warning(f"No variants in {self.fname}.")
-            else:
+            # pysam complains when closing a file without any variants
+            if not (is_pysam and e.errno == 9 and num_written[0] == 0):
                 raise e
+        if index is not None:
+            tabix_index(str(self.fname), force=True, **index)
+
+    def write(self, chunk_size: int = 1000, index: bool = False):
+        """
+        Write the variants in this class to a VCF at :py:attr:`~.GenotypesVCF.fname`
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            The max number of variants to unpack at once, if the genotypes are packed
+        index: bool, optional
+            See documentation for :py:meth:`~.GenotypesVCF.open`
+        """
+        self.open(len(self.variants), self._contigs(), index)
+        try:
+            for start in range(0, len(self.variants), chunk_size):
+                end = start + chunk_size
+                # pass the variants as rows
+                chunk = self._unpacked_data(start, end).transpose((1, 0, 2))
+                self.append_chunk(chunk, self.variants[start:end])
+        finally:
+            self.close()
 
 
 class TRRecordHarmonizerRegion(trh.TRRecordHarmonizer):
@@ -880,6 +2589,12 @@ class GenotypesTR(Genotypes):
         super().__init__(fname, log)
         self.vcftype = vcftype
 
+    def _init_kwargs(self) -> dict:
+        """
+        See documentation for :py:meth:`~.Genotypes._init_kwargs`
+        """
+        return {**super()._init_kwargs(), "vcftype": self.vcftype}
+
     @classmethod
     def load(
         cls: GenotypesTR,
@@ -915,7 +2630,7 @@ class GenotypesTR(Genotypes):
         genotypes.check_phase()
         return genotypes
 
-    def _vcf_iter(self, vcf: VCF, region: str = None):
+    def _vcf_iter(self, vcf: VCF, region: str = None, variants: set[str] = None):
         """
         Collect GTs (trh.TRRecord objects) to iterate over
 
@@ -925,6 +2640,8 @@ class GenotypesTR(Genotypes):
             The VCF object from which to fetch variant records
         region : str, optional
             See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
 
         Returns
         -------
@@ -932,43 +2649,169 @@ class GenotypesTR(Genotypes):
             TRRecord objects yielded from TRRecordHarmonizer
         """
         for record in TRRecordHarmonizerRegion(
-            vcffile=vcf, vcfiter=vcf(region), vcftype=self.vcftype
+            vcffile=vcf,
+            vcfiter=self._fetch_records(vcf, region, variants),
+            vcftype=self.vcftype,
         ):
             record.ID = record.record_id
             record.CHROM = record.chrom
             record.POS = record.pos
             yield record
 
-    def _return_data(self, variant: trh.TRRecord):
+    def _allele_lengths(self, variant: trh.TRRecord) -> npt.NDArray[np.uint8]:
+        """
+        Get the repeat length of each allele of a TR, rounded to the nearest integer
+
+        Parameters
+        ----------
+        variant: trh.TRRecord
+            A trh.TRRecord object from which to collect allele lengths
+
+        Returns
+        -------
+        npt.NDArray[np.uint8]
+            The length of the REF allele, followed by the length of each ALT allele
+        """
+        lengths = [variant.ref_allele_length, *variant.alt_allele_lengths]
+        return np.rint(lengths).astype(np.uint8)
+
+    def _return_indices(self, variant: trh.TRRecord) -> npt.NDArray:
+        """
+        Collect the allele indices of the genotypes in a TR
+
+        Parameters
+        ----------
+        variant: trh.TRRecord
+            A trh.TRRecord object from which to collect genotypes
+
+        Returns
+        -------
+        npt.NDArray
+            An array of allele indices, as described in the documentation for
+            GetGenotypeIndicies(), but with at least two alleles per sample
+        """
+        gts = variant.GetGenotypeIndicies()
+
+        # If only one GT present fill rest with empty gts (-1)
+        if gts.shape[1] == 2:
+            self.log.warning(
+                "The current variant in the VCF only has one allele per sample."
+            )
+            # Only one GT so phase will always be 0
+            haploid = gts
+            gts = np.full((haploid.shape[0], 3), -1, dtype=haploid.dtype)
+            gts[:, 0] = haploid[:, 0]
+            gts[:, 2] = 0
+
+        return gts
+
+    def _return_data(self, variant: trh.TRRecord):
+        """
+        Collect Genotypes, transform them to copy number, and return them.
+
+        Parameters
+        ----------
+        variant: trh.TRRecord
+            A trh.TRRecord object from which to collect copy number genotypes
+
+        Returns
+        -------
+        data: npt.NDArray[np.uint8]
+            Numpy array storing all genotypes
+        """
+        gts = self._return_indices(variant)
+        # the missing (-1) and empty (-2) allele indices wrap around to the end of the
+        # table, where they are mapped to their usual np.uint8 codes
+        table = np.append(self._allele_lengths(variant), np.uint8([254, 255]))
+        gts[:, :-1] = table[gts[:, :-1]]
+        return gts.astype(np.uint8)
+
+    def _iterate_blocks(
+        self,
+        vcf: VCF,
+        region: str = None,
+        variants: set[str] = None,
+        chunk_size: int = 1000,
+        out: npt.NDArray = None,
+        min_pos: int = None,
+    ):
+        """
+        See documentation for :py:meth:`~.Genotypes._iterate_blocks`
+
+        The allele index of each genotype is decoded into the buffer first, along with
+        a lookup table of the allele lengths of each record. Once a block is full, all
+        of its allele indices are converted to lengths with a single gather from those
+        tables.
+        """
+        self.log.info(f"Loading genotypes from {len(self.samples)} samples")
+        Block = namedtuple("Block", "data variants")
+        num_cols = 2 + (not self._prephased)
+        reuse = out is None
+        if reuse:
+            out = np.empty((chunk_size, len(self.samples), num_cols), dtype=np.uint8)
+        # the lookup table of each record in the block, indexed by the np.uint8 code
+        # of each allele; the missing and empty codes (255 and 254) map to themselves
+        tables = np.empty((chunk_size, 256), dtype=np.uint8)
+        tables[:, 254:] = (254, 255)
+        num_seen = 0
+        start = idx = 0
+        block = []
+        if not len(out):
+            vcf.close()
+            return
+        # iterate over each line in the VCF
+        # note, this can take a lot of time if there are many samples
+        for variant in self._vcf_iter(vcf, region, variants):
+            if min_pos is not None and variant.POS < min_pos:
+                continue
+            if variants is not None and variant.ID not in variants:
+                if num_seen >= len(variants):
+                    # exit early if we've already found all the variants
+                    break
+                continue
+            gts = self._return_indices(variant)
+            lengths = self._allele_lengths(variant)
+            if len(lengths) <= 254 and gts.shape[1] == 3:
+                out[idx] = gts[:, :num_cols]
+                tables[len(block), : len(lengths)] = lengths
+            else:
+                # the allele indices can't be encoded as np.uint8 codes, so we convert
+                # the genotypes now and leave them unchanged later
+                out[idx] = self._return_data(variant)[:, :num_cols]
+                tables[len(block)] = np.arange(256)
+            block.append(self._variant_tuple(variant))
+            idx += 1
+            num_seen += 1
+            if len(block) == chunk_size or idx == len(out):
+                self._gather_lengths(out[start:idx], tables)
+                yield Block(out[start:idx], block)
+                block = []
+                if reuse:
+                    idx = 0
+                elif idx == len(out):
+                    # there isn't any room left in the buffer
+                    break
+                start = idx
+        if len(block):
+            self._gather_lengths(out[start:idx], tables)
+            yield Block(out[start:idx], block)
+        vcf.close()
+
+    @staticmethod
+    def _gather_lengths(data: npt.NDArray[np.uint8], tables: npt.NDArray[np.uint8]):
         """
-        Collect Genotypes, transform them to copy number, and return them.
+        Convert the allele indices of a block of records to their lengths, in place
 
         Parameters
         ----------
-        variant: trh.TRRecord
-            A trh.TRRecord object from which to collect copy number genotypes using the
-            GetLengthGenotypes() function
-
-        Returns
-        -------
         data: npt.NDArray[np.uint8]
-            Numpy array storing all genotypes
+            A block of p records, of shape p x n x (2 or 3)
+        tables: npt.NDArray[np.uint8]
+            A lookup table of the length of each allele in each record, of shape at
+            least p x 256
         """
-        # Grab GT Lengths and round to lowest integer
-        gts = np.rint(variant.GetLengthGenotypes())
-
-        # If only one GT present fill rest with empty gts (-1)
-        if gts.shape[1] == 2:
-            self.log.warning(
-                "The current variant in the VCF only has one allele per sample."
-            )
-            # Only one GT so phase will always be 0
-            zeros = np.zeros((gts.shape[0], 1))
-            missing = -1 * np.ones((gts.shape[0],))
-            gts = np.concatenate((gts, zeros), axis=1)
-            gts[:, 1] = missing
-
-        return gts.astype(np.uint8)
+        strands = data[:, :, :2]
+        strands[:] = np.take_along_axis(tables[: len(data), np.newaxis], strands, 2)
 
     def check_biallelic(self):
         """
@@ -976,6 +2819,85 @@ class GenotypesTR(Genotypes):
         """
         raise NotImplementedError
 
+    def qc(self, discard_missing: bool = False, chunk_size: int = 10000):
+        """
+        Check for missing genotypes and unphased genotypes
+
+        This is equivalent to calling :py:meth:`~.Genotypes.check_missing` and
+        :py:meth:`~.Genotypes.check_phase` one after the other, except that the
+        genotype matrix is only scanned once, in chunks of variants. Unlike
+        :py:meth:`~.Genotypes.qc`, variants are not checked for being biallelic since
+        TRs usually have more than two alleles, so the genotypes remain allele lengths.
+
+        Raises
+        ------
+        ValueError
+            If any of the samples have missing genotypes 'GT: .|.' or if any
+            heterozygous genotypes are unphased
+
+        Parameters
+        ----------
+        discard_missing : bool, optional
+            If True, discard any samples that are missing genotypes without raising a
+            ValueError
+        chunk_size: int, optional
+            The number of variants to scan at once. Larger values use more memory.
+        """
+        data = self.data
+        num_samps, num_variants = data.shape[:2]
+        check_phase = not self._prephased and data.shape[2] >= 3
+        # A genotype value equal to the max or one less than max for uint8 indicates
+        #   the value was missing
+        missing_val = np.iinfo(np.uint8).max - 1
+        missing = np.zeros(num_samps, dtype=np.bool_)
+        unphased = np.zeros(num_samps, dtype=np.bool_)
+        for start in range(0, num_variants, chunk_size):
+            chunk = data[:, start : start + chunk_size]
+            miss = np.any(chunk[:, :, :2] >= missing_val, axis=2)
+            missing |= miss.any(axis=1)
+            if check_phase:
+                # a TR genotype is heterozygous if its alleles have different lengths
+                het = (chunk[:, :, 0] != chunk[:, :, 1]) & ~miss
+                unphased |= np.any(het & (chunk[:, :, 2] == 0), axis=1)
+        if np.any(missing):
+            if not discard_missing:
+                samp = np.flatnonzero(missing)[0]
+                variant = np.flatnonzero(np.any(data[samp, :, :2] >= missing_val, 1))
+                raise ValueError(
+                    "Genotype with ID {} at POS {}:{} is missing for sample {}".format(
+                        *tuple(self.variants[variant[0]])[:3], self.samples[samp]
+                    )
+                )
+            self.log.warning(
+                f"Ignoring missing genotypes from {np.sum(missing)} samples"
+            )
+            if np.all(missing):
+                self.log.warning(
+                    "All samples were discarded! Check that that none of your variants"
+                    " are missing genotypes (GT: '.|.')."
+                )
+        unphased_idx = np.flatnonzero(unphased & ~missing)
+        if len(unphased_idx):
+            gts = data[unphased_idx]
+            samp, variant = np.nonzero(
+                (gts[:, :, 0] != gts[:, :, 1]) & (gts[:, :, 2] == 0)
+            )
+            raise ValueError(
+                "Variant with ID {} at POS {}:{} is unphased for sample {}".format(
+                    *tuple(self.variants[variant[0]])[:3],
+                    self.samples[unphased_idx[samp[0]]],
+                )
+            )
+        if np.any(missing):
+            samp_idx = np.flatnonzero(~missing)
+            data = data[samp_idx]
+            self.samples = tuple(self.samples[samp] for samp in samp_idx)
+            self._samp_idx = None
+        if check_phase:
+            # remove the last dimension that contains the phase info
+            data = data[:, :, :2]
+        self.data = data
+
     def check_maf(self):
         """
         See documentation for :py:meth:`~.Genotypes.check_maf`
@@ -1078,75 +3000,412 @@ class GenotypesPLINK(GenotypesVCF):
             self.samples = tuple(self.samples.values())
             return indices
 
-    def _check_region(
-        self, pos: tuple, chrom: str, start: int = 0, end: int = float("inf")
-    ):
+    def _read_pvar_header(self, pvar: IO) -> list[str]:
         """
-        Check that pos lies within the provided chrom, start, and end coordinates
+        Read the header lines at the start of a PVAR file
 
-        This is a helper function for :py:meth:`~.GenotypesPLINK.read_variants`
+        This is a helper function for :py:meth:`~.GenotypesPLINK._parse_pvar`
 
         Parameters
         ----------
-        pos : tuple[str, int]
-            A tuple of two elements: contig (str) and chromosomal position (int)
-        chrom: str
-            The contig of the region to check
-        start: int, optional
-            The start position of the region
-        end: int, optional
-            The end position of the region
+        pvar: IO
+            The PVAR file, opened for reading text
+
+            Afterward, it will be positioned at the first line after the header
+
+        Returns
+        -------
+        list[str]
+            The name of each of the columns in the PVAR file
+        """
+        # find the line that declares the header
+        for line in pvar:
+            if not line.startswith("##"):
+                break
+        header = line.rstrip("\n").split("\t")
+        # there should be at least five columns
+        if len(header) < 5:
+            raise ValueError("Your PVAR file should have at least five columns.")
+        if header[0][0] == "#":
+            header[0] = header[0][1:]
+        else:
+            raise ValueError("Your PVAR file is missing a header!")
+            # TODO: add proper support for missing headers
+            # The PVAR spec says "If no header lines are present, the file is
+            # treated as if it had a '#CHROM ID CM POS ALT REF' header line if it
+            # has 6 or more columns, and '#CHROM ID POS ALT REF' if there are
+            # exactly five"
+        return header
+
+    def _split_pvar(
+        self, chunk_size: int = 100000, variants: set[str] = None, extra: tuple = ()
+    ) -> Iterator[tuple[npt.NDArray, dict[str, list[str]]]]:
         """
-        return (pos[0] == chrom) and (start <= pos[1]) and (end >= pos[1])
+        A generator over the columns of blocks of lines in a PVAR file
 
-    def _variant_arr(
-        self,
-        record: list[str],
-        cid: dict[str, int] = dict(zip(["CHROM", "POS", "ID", "REF", "ALT"], range(5))),
-    ):
+        Each block of lines is split into columns all at once, rather than line by line
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK._parse_pvar`
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            The max number of lines to parse at once
+        variants : set[str], optional
+            If provided, only keep the variants with these IDs
+        extra : tuple[str], optional
+            The names of any optional columns to keep, in addition to the CHROM, POS,
+            ID, REF, and ALT columns. They are skipped if they aren't in the file.
+
+        Yields
+        ------
+        Iterator[tuple[npt.NDArray, dict[str, list[str]]]]
+            An iterator over the values in each column of each block of variants in
+            the file, along with the index of each variant within the file
+        """
+        with self.hook_compressed(self.fname.with_suffix(".pvar"), mode="r") as pvar:
+            header = self._read_pvar_header(pvar)
+            num_cols = len(header)
+            cid = {
+                col: header.index(col) for col in ("CHROM", "POS", "ID", "REF", "ALT")
+            }
+            cid.update({col: header.index(col) for col in extra if col in header})
+            offset = 0
+            while True:
+                lines = list(islice(pvar, chunk_size))
+                if not lines:
+                    break
+                # split every field in the block at once and then stride over them
+                # this only works if every line has the same number of fields, since
+                # a short line next to a long one would shift the columns otherwise
+                if all(line.count("\t") == num_cols - 1 for line in lines):
+                    text = "".join(lines)
+                    if not text.endswith("\n"):
+                        text += "\n"
+                    fields = text.replace("\n", "\t").split("\t")[:-1]
+                    cols = {col: fields[idx::num_cols] for col, idx in cid.items()}
+                else:
+                    # some lines must be blank or have a different number of fields
+                    rows = [line.rstrip("\n").split("\t") for line in lines]
+                    rows = [row for row in rows if len(row) > 1]
+                    cols = {col: [row[idx] for row in rows] for col, idx in cid.items()}
+                indices = np.arange(offset, offset + len(cols["ID"]), dtype=np.uint32)
+                offset += len(cols["ID"])
+                if variants is not None:
+                    # checking membership in a set is cheaper than encoding every ID
+                    keep = [
+                        i for i, var_id in enumerate(cols["ID"]) if var_id in variants
+                    ]
+                    indices = indices[keep]
+                    cols = {col: [vals[i] for i in keep] for col, vals in cols.items()}
+                yield indices, cols
+
+    def _parse_pvar(
+        self, chunk_size: int = 100000, variants: set[str] = None
+    ) -> Iterator[tuple[npt.NDArray, VariantTable]]:
         """
-        Construct a np array from the metadata in a line of the PVAR file
+        A generator over blocks of lines in a PVAR file
 
-        This is a helper function for :py:meth:`~.GenotypesPLINK._iterate_variants`.
-        It's separate so that it can easily be overridden in any child classes.
+        Each block of lines is split into columns all at once, rather than line by
+        line, and then encoded into a :class:`VariantTable`
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK._iterate_pvar`
 
         Parameters
         ----------
-        record: list[str]
-            A list of the tab-separated fields in a line from the PVAR file
-        cid: dict[str, int]
-            A dictionary mapping each column of the PVAR file to its index, as declared
-            in the header
+        chunk_size: int, optional
+            The max number of lines to parse at once
+        variants : set[str], optional
+            If provided, only encode the variants with these IDs
+
+        Yields
+        ------
+        Iterator[tuple[npt.NDArray, VariantTable]]
+            An iterator over each block of variants in the file, along with the index
+            of each variant within the file
+        """
+        for indices, cols in self._split_pvar(chunk_size, variants):
+            yield indices, self._encode_pvar(cols)
+
+    def _encode_pvar(self, cols: dict[str, list[str]]) -> VariantTable:
+        """
+        Encode the columns of a block of lines in a PVAR file into a
+        :class:`VariantTable`
 
-            This helps cover cases where the order of the fields might be different
+        Parameters
+        ----------
+        cols: dict[str, list[str]]
+            The columns of the block, from :py:meth:`~.GenotypesPLINK._split_pvar`
 
         Returns
         -------
-        npt.NDArray
-            A row from the :py:attr:`~.GenotypesPLINK.variants` array
-        """
-        # Parse the REF and ALT alleles from the PVAR record
-        alleles = (record[cid["REF"]], *record[cid["ALT"]].split(","))
-        return np.array(
-            (
-                record[cid["ID"]],
-                record[cid["CHROM"]],
-                record[cid["POS"]],
-                alleles,
-            ),
-            dtype=self.variants.dtype,
+        VariantTable
+            The variants in the block
+        """
+        return VariantTable.from_columns(
+            self.variants.dtype,
+            {
+                "id": cols["ID"],
+                "chrom": cols["CHROM"],
+                "pos": np.array(cols["POS"], dtype=np.uint32),
+                "alleles": [
+                    f"{ref},{alt}" for ref, alt in zip(cols["REF"], cols["ALT"])
+                ],
+            },
+        )
+
+    def _source_files(self) -> tuple[Path]:
+        """
+        See documentation for :py:meth:`~.Genotypes._source_files`
+        """
+        fname = Path(self.fname)
+        return (fname, fname.with_suffix(".pvar"), fname.with_suffix(".psam"))
+
+    def _pvar_cache_path(self) -> Path:
+        """
+        Get the path to the binary sidecar of the PVAR file
+
+        Returns
+        -------
+        Path
+            The path to the sidecar, which may or may not exist
+        """
+        return Path(str(self.fname.with_suffix(".pvar")) + ".table")
+
+    def _pos_index_path(self) -> Path:
+        """
+        Get the path to the positional index of the PVAR file
+
+        Returns
+        -------
+        Path
+            The path to the index, which may or may not exist
+        """
+        return Path(str(self.fname.with_suffix(".pvar")) + ".pos")
+
+    def _check_sidecar(self, fname: Path) -> bool:
+        """
+        Check whether a sidecar of the PVAR file exists and is up to date
+
+        Parameters
+        ----------
+        fname: Path
+            The path to the sidecar
+
+        Returns
+        -------
+        bool
+            True if the sidecar can be used and False otherwise
+        """
+        if not fname.exists():
+            return False
+        if fname.stat().st_mtime >= self.fname.with_suffix(".pvar").stat().st_mtime:
+            return True
+        self.log.warning(
+            f"Ignoring {fname} because it is older than the PVAR file. Please "
+            "rebuild it."
+        )
+        return False
+
+    def build_pvar_cache(self, chunk_size: int = 100000) -> Path:
+        """
+        Parse the PVAR file and store its variants in a binary sidecar
+
+        The sidecar is a directory of .npy files stored alongside the PVAR file with an
+        additional .table extension. Afterward, the variants will be memory-mapped from the sidecar
+        instead of being parsed from the PVAR file whenever they are read. The sidecar
+        is ignored if it is older than the PVAR file, so you should rebuild it whenever
+        the PVAR file changes.
+
+        A positional index of the variants is also stored alongside the PVAR file in a
+        directory with an additional .pos extension. It is used to look up the variants within a
+        region without checking every variant in the file.
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            The max number of lines to parse from the PVAR file at once
+
+        Returns
+        -------
+        Path
+            The path to the sidecar
+        """
+        fname = self._pvar_cache_path()
+        self.log.info(f"Caching the variants in {self.fname.with_suffix('.pvar')}")
+        tables = [table for indices, table in self._parse_pvar(chunk_size)]
+        if not len(tables):
+            tables = [VariantTable(np.empty((0,), dtype=self.variants.dtype))]
+        table = VariantTable.concatenate(tables)
+        table.save(fname)
+        self.log.info(f"Wrote {len(table)} variants to {fname}")
+        self._build_pos_index(table)
+        return fname
+
+    def _build_pos_index(self, table: VariantTable):
+        """
+        Store the positions of the variants in a PVAR file, grouped by contig
+
+        The index consists of the sorted positions of the variants in each contig,
+        the range of these positions that belongs to each contig, and the index of
+        each variant within the PVAR file. The last is left empty when the PVAR file
+        is already sorted, since it would just be 0, 1, 2, ...
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK.build_pvar_cache`
+
+        Parameters
+        ----------
+        table: VariantTable
+            All of the variants in the PVAR file
+        """
+        fname = self._pos_index_path()
+        codes = table._codes
+        pos = table["pos"]
+        order = np.lexsort((pos, codes)).astype(np.uint32)
+        # the contigs are sorted, so we can find the range of each by its code
+        bounds = np.searchsorted(codes[order], np.arange(len(table.contigs) + 1))
+        if np.array_equal(order, np.arange(len(order))):
+            order = order[:0]
+            sorted_pos = pos
+        else:
+            sorted_pos = pos[order]
+        VariantTable._save_arrays(
+            fname,
+            {
+                "contigs": table.contigs,
+                "bounds": bounds.astype(np.int64),
+                "pos": sorted_pos,
+                "order": order,
+            },
+        )
+        self.log.info(f"Wrote positional index to {fname}")
+
+    def _lookup_region(self, region: str) -> npt.NDArray[np.uint32]:
+        """
+        Find the indices of the variants within a region of the PVAR file
+
+        This uses the positional index from
+        :py:meth:`~.GenotypesPLINK.build_pvar_cache` to binary search for the
+        variants, so it takes time logarithmic in the number of variants
+
+        Parameters
+        ----------
+        region : str
+            See documentation for :py:attr:`~.GenotypesVCF.read`
+
+        Returns
+        -------
+        npt.NDArray[np.uint32]
+            The sorted indices of the variants in the region or None if the index
+            can't be used
+        """
+        fname = self._pos_index_path()
+        if not self._check_sidecar(fname):
+            return None
+        index = VariantTable._load_arrays(fname)
+        chrom, *coords = re.split(":|-", region)
+        start = int(coords[0]) if len(coords) and coords[0] else 0
+        end = (
+            int(coords[1]) if len(coords) > 1 and coords[1] else np.iinfo(np.uint32).max
         )
+        contig = np.flatnonzero(np.asarray(index["contigs"]) == chrom)
+        if not len(contig):
+            return np.empty((0,), dtype=np.uint32)
+        lo, hi = index["bounds"][contig[0] : contig[0] + 2].tolist()
+        pos = index["pos"][lo:hi]
+        start = lo + np.searchsorted(pos, start, side="left")
+        end = lo + np.searchsorted(pos, end, side="right")
+        if not len(index["order"]):
+            return np.arange(start, end, dtype=np.uint32)
+        return np.sort(index["order"][start:end])
+
+    def _iterate_pvar(
+        self, chunk_size: int = 100000, region: str = None, variants: set[str] = None
+    ) -> Iterator[tuple[npt.NDArray, VariantTable]]:
+        """
+        A generator over blocks of variants in a PVAR file
+
+        The variants are memory-mapped from the binary sidecar of the PVAR file if it
+        exists and is up to date. Otherwise, they are parsed from the PVAR file.
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            The max number of variants in each block
+        region : str, optional
+            If provided and the positional index of the PVAR file can be used, only
+            yield the variants within this region
+        variants : set[str], optional
+            See documentation for :py:meth:`~.GenotypesPLINK._parse_pvar`
+
+            Note that the blocks may still contain other variants
+
+        Yields
+        ------
+        Iterator[tuple[npt.NDArray, VariantTable]]
+            An iterator over each block of variants in the file, in order, along with
+            the index of each variant within the file
+        """
+        cache = self._pvar_cache_path()
+        if self._check_sidecar(cache):
+            self.log.debug(f"Loading variants from {cache}")
+            table = VariantTable.load(cache)
+            indices = None if region is None else self._lookup_region(region)
+            if indices is None:
+                indices = np.arange(len(table), dtype=np.uint32)
+            for start in range(0, len(indices), chunk_size):
+                idxs = indices[start : start + chunk_size]
+                yield idxs, table[self._as_slice(idxs)]
+            return
+        yield from self._parse_pvar(chunk_size, variants)
+
+    def _filter_variants(
+        self, table: VariantTable, region: str = None, variants: set[str] = None
+    ) -> npt.NDArray[np.bool_]:
+        """
+        Determine which variants in a block of the PVAR file should be loaded
+
+        This is a helper function for
+        :py:meth:`~.GenotypesPLINK._iterate_variant_blocks` and
+        :py:meth:`~.GenotypesPLINK.read_variants`
+
+        Parameters
+        ----------
+        table: VariantTable
+            A block of variants from :py:meth:`~.GenotypesPLINK._iterate_pvar`
+        region : str, optional
+            See documentation for :py:attr:`~.GenotypesVCF.read`
+        variants : set[str], optional
+            See documentation for :py:attr:`~.GenotypesVCF.read`
+
+        Returns
+        -------
+        npt.NDArray[np.bool_]
+            A mask over the variants in the block
+        """
+        mask = np.ones(len(table), dtype=np.bool_)
+        if region is not None:
+            chrom, *coords = re.split(":|-", region)
+            start = int(coords[0]) if len(coords) and coords[0] else 0
+            end = int(coords[1]) if len(coords) > 1 and coords[1] else np.inf
+            pos = table["pos"]
+            mask &= (table["chrom"] == chrom) & (pos >= start) & (pos <= end)
+        if variants is not None:
+            ids = table.column("id", truncate=False)
+            mask &= np.isin(ids, np.array(list(variants), dtype=ids.dtype.kind))
+        return mask
 
-    def _iterate_variants(
+    def _iterate_variant_blocks(
         self,
         region: str = None,
         variants: set[str] = None,
-    ):
+        chunk_size: int = 1000,
+    ) -> Iterator[tuple[npt.NDArray[np.uint32], npt.NDArray]]:
         """
-        A generator over the lines of a PVAR file
+        A generator over blocks of the variants in a PVAR file that should be loaded
 
         This is a helper function for :py:meth:`~.GenotypesPLINK._iterate` and
-        :py:meth:`~.GenotypesPLINK.read_variants`
+        :py:meth:`~.GenotypesPLINK._iterate_chunks`
 
         Parameters
         ----------
@@ -1154,73 +3413,49 @@ class GenotypesPLINK(GenotypesVCF):
             See documentation for :py:attr:`~.GenotypesVCF.read`
         variants : set[str], optional
             See documentation for :py:attr:`~.GenotypesVCF.read`
+        chunk_size: int, optional
+            The number of variants in each block (except perhaps the last)
 
         Yields
         ------
-        Iterator[tuple[int, npt.NDArray]]
-            An iterator of tuples over each line in the file
+        Iterator[tuple[npt.NDArray[np.uint32], npt.NDArray]]
+            An iterator over each block of variants
 
-            The first value is the index of the variant and the second is a line from
-            the file, encoded as a numpy mixed array type
+            The first value contains the index of each variant and the second contains
+            the variants, encoded as a numpy mixed array type
         """
-        # split the region string so each portion is an element
-        if region is not None:
-            region = re.split(":|-", region)
-            if len(region) > 1:
-                region[1:] = [int(pos) for pos in region[1:] if pos]
-        with self.hook_compressed(self.fname.with_suffix(".pvar"), mode="r") as pvar:
-            pvariants = reader(pvar, delimiter="\t")
-            # find the line that declares the header
-            for header in pvariants:
-                if not header[0].startswith("##"):
-                    break
-            # there should be at least five columns
-            if len(header) < 5:
-                raise ValueError("Your PVAR file should have at least five columns.")
-            if header[0][0] == "#":
-                header[0] = header[0][1:]
-            else:
-                raise ValueError("Your PVAR file is missing a header!")
-                # TODO: add proper support for missing headers
-                # The PVAR spec says "If no header lines are present, the file is
-                # treated as if it had a '#CHROM ID CM POS ALT REF' header line if it
-                # has 6 or more columns, and '#CHROM ID POS ALT REF' if there are
-                # exactly five"
-                header = ["CHROM", "POS", "ID", "REF", "ALT"]
-                self.log.info(
-                    "Your PVAR file lacks a proper header! Assuming first five columns"
-                    " are [CHROM, POS, ID, REF, ALT] in that order..."
-                )
-                # TODO: add header back in to pvariants using itertools.chain?
-            # create a dictionary that translates between the variant dtypes and thee
-            # columns of the PVAR file
-            cid = {item: header.index(item.upper()) for item in ("chrom", "pos", "id")}
-            num_seen = 0
-            for ct, rec in enumerate(pvariants):
-                if region and not self._check_region(
-                    (rec[cid["chrom"]], int(rec[cid["pos"]])), *region
-                ):
-                    continue
-                if variants is not None:
-                    if rec[cid["id"]] not in variants:
-                        if num_seen >= len(variants):
-                            # exit early if we've already found all the variants
-                            break
-                        continue
-                yield ct, self._variant_arr(rec)
+        dtype = self.variants.dtype
+        pending = (np.empty((0,), dtype=np.uint32), np.empty((0,), dtype=dtype))
+        num_seen = 0
+        for indices, table in self._iterate_pvar(region=region, variants=variants):
+            idxs = np.flatnonzero(self._filter_variants(table, region, variants))
+            num_seen += len(idxs)
+            indices = np.concatenate((pending[0], indices[idxs]))
+            records = np.concatenate((pending[1], np.asarray(table[idxs])))
+            # regroup the variants that passed the filters into blocks of chunk_size
+            start = 0
+            while len(indices) - start >= chunk_size:
+                end = start + chunk_size
+                yield indices[start:end], records[start:end]
+                start = end
+            pending = (indices[start:], records[start:])
+            if variants is not None and num_seen >= len(variants):
+                # exit early if we've already found all the variants
+                break
+        if len(pending[0]):
+            yield pending
 
     def read_variants(
         self,
         region: str = None,
         variants: set[str] = None,
         max_variants: int = None,
+        compact: bool = False,
     ):
         """
         Read variants from a PVAR file into a numpy array stored in
         :py:attr:`~.GenotypesPLINK.variants`
 
-        One of either variants or max_variants MUST be specified!
-
         This method is called automatically by :py:meth:`~.GenotypesPLINK.read`
 
         Parameters
@@ -1231,6 +3466,11 @@ class GenotypesPLINK(GenotypesVCF):
             See documentation for :py:attr:`~.GenotypesVCF.read`
         max_variants : int, optional
             See documentation for :py:attr:`~.GenotypesVCF.read`
+        compact : bool, optional
+            See documentation for :py:attr:`~.GenotypesVCF.read`
+
+            The blocks of the PVAR file are parsed into tables, so they are kept
+            compact rather than decoded into a structured array
 
         Returns
         -------
@@ -1241,28 +3481,29 @@ class GenotypesPLINK(GenotypesVCF):
             self.log.warning("Variant data has already been loaded. Overriding.")
         if variants is not None:
             max_variants = len(variants)
-        if max_variants is None:
-            p = pgenlib.PvarReader(bytes(str(self.fname.with_suffix(".pvar")), "utf8"))
-            max_variants = p.get_variant_ct()
-        # first, preallocate the array and the indices of each variant
-        self.variants = np.empty((max_variants,), dtype=self.variants.dtype)
-        indices = np.empty((max_variants,), dtype=np.uint32)
+        dtype = self.variants.dtype
+        indices = [np.empty((0,), dtype=np.uint32)]
+        records = [np.empty((0,), dtype=dtype)]
+        if compact:
+            records = [VariantTable(records[0])]
         num_seen = 0
-        # iterate through each variant and save it
-        for ct, rec in self._iterate_variants(region, variants):
-            if num_seen >= max_variants:
+        # filter each block of variants all at once and save the ones we want
+        for block_indices, table in self._iterate_pvar(
+            region=region, variants=variants
+        ):
+            idxs = np.flatnonzero(self._filter_variants(table, region, variants))
+            if max_variants is not None:
+                idxs = idxs[: max_variants - num_seen]
+            indices.append(block_indices[idxs])
+            records.append(table[idxs] if compact else np.asarray(table[idxs]))
+            num_seen += len(idxs)
+            if max_variants is not None and num_seen >= max_variants:
                 break
-            indices[num_seen] = ct
-            self.variants[num_seen] = rec
-            num_seen += 1
-        # did we see more variants than was asked for?
-        if max_variants > num_seen:
-            self.log.info(
-                f"Removing {max_variants-num_seen} unneeded variant records that "
-                "were preallocated b/c max_variants was specified."
-            )
-            indices = indices[:num_seen]
-            self.variants = self.variants[:num_seen]
+        indices = np.concatenate(indices)
+        if compact:
+            self.variants = VariantTable.concatenate(records)
+        else:
+            self.variants = np.concatenate(records)
         if not len(indices):
             self.log.warning(
                 "Failed to load any variants. If you specified a region, check that "
@@ -1276,6 +3517,8 @@ class GenotypesPLINK(GenotypesVCF):
         samples: set[str] = None,
         variants: set[str] = None,
         max_variants: int = None,
+        workers: int = 1,
+        compact: bool = False,
     ):
         """
         Read genotypes from a PGEN file into a numpy matrix stored in
@@ -1291,6 +3534,14 @@ class GenotypesPLINK(GenotypesVCF):
             See documentation for :py:attr:`~.GenotypesVCF.read`
         max_variants : int, optional
             See documentation for :py:attr:`~.GenotypesVCF.read`
+        workers : int, optional
+            The number of processes to use when reading the PGEN file
+
+            If this is greater than 1, the variants are split into contiguous groups
+            and each process decodes its group, chunk by chunk, into a genotype matrix
+            that is shared among all of the processes
+        compact : bool, optional
+            See documentation for :py:attr:`~.GenotypesPLINK.read_variants`
         """
         super(Genotypes, self).read()
 
@@ -1319,18 +3570,23 @@ class GenotypesPLINK(GenotypesVCF):
                 max_variants = pgen.get_variant_ct()
             else:
                 max_variants = min(max_variants, pgen.get_variant_ct())
-            indices = self.read_variants(region, variants, max_variants)
+            indices = self.read_variants(region, variants, max_variants, compact)
             mat_shape = (len(sample_idxs), len(indices), (2 + (not self._prephased)))
+            # how many variants should we load at once?
+            chunks = self.chunk_size
+            if chunks is None or chunks > len(indices):
+                chunks = len(indices)
+            if workers > 1 and len(indices) > 1:
+                self._read_groups(indices, sample_idxs, chunks, workers)
+                return
             self.log.debug(
                 f"Allocating memory for genotype matrix of shape {mat_shape} and "
                 "dtype np.uint8"
             )
             # initialize the data array
             self.data = np.empty(mat_shape, dtype=np.uint8)
-            # how many variants should we load at once?
-            chunks = self.chunk_size
-            if chunks is None or chunks > len(indices):
-                chunks = len(indices)
+            # each chunk is decoded into the same scratch buffers
+            scratch = self._alloc_scratch(chunks, len(sample_idxs))
             self.log.info(
                 f"Reading genotypes from {len(self.samples)} samples and "
                 f"{len(indices)} variants in chunks of size {chunks} variants"
@@ -1340,47 +3596,236 @@ class GenotypesPLINK(GenotypesVCF):
                 end = start + chunks
                 if end > len(indices):
                     end = len(indices)
-                size = end - start
                 self.log.debug(f"Loading from variant #{start} to variant #{end}")
-                # the genotypes start out as a simple 2D array with twice the number
-                # of samples
-                if not self._prephased:
-                    # ...each column is a different chromosomal strand
-                    try:
-                        data = np.empty((size, len(sample_idxs) * 2), dtype=np.int32)
-                        phasing = np.zeros((size, len(sample_idxs)), dtype=np.uint8)
-                    except np.core._exceptions._ArrayMemoryError as e:
-                        raise ValueError(
-                            "You don't have enough memory to load these genotypes! Try"
-                            " specifying a value to the chunk_size parameter, instead"
-                        ) from e
-                    # The haplotype-major mode of read_alleles_and_phasepresent_list
-                    # has not been implemented yet, so we need to read the genotypes
-                    # in sample-major mode and then transpose them
-                    pgen.read_alleles_and_phasepresent_list(
-                        indices[start:end], data, phasing
-                    )
-                    # missing alleles will have a value of -9
-                    # let's make them be -1 to be consistent with cyvcf2
-                    data[data == -9] = -1
-                    # add phase info, then transpose the GT matrix so that samples are
-                    # rows and variants are columns
-                    self.data[:, start:end, :2] = data.reshape(
-                        (size, mat_shape[0], 2)
-                    ).transpose((1, 0, 2))
-                    self.data[:, start:end, 2] = phasing.transpose()
-                else:
-                    # ...each row is a different chromosomal strand
-                    data = np.empty((size, len(sample_idxs) * 2), dtype=np.int32)
-                    pgen.read_alleles_list(indices[start:end], data)
-                    # missing alleles will have a value of -9
-                    # let's make them be -1 to be consistent with cyvcf2
-                    data[data == -9] = -1
-                    self.data[:, start:end] = data.reshape(
-                        (size, mat_shape[0], 2)
-                    ).transpose((1, 0, 2))
-                del data
-                gc.collect()
+                self._read_chunk(
+                    pgen, indices[start:end], self.data[:, start:end], scratch
+                )
+
+    @staticmethod
+    def _read_group(
+        pgen_fname: Path,
+        prephased: bool,
+        indices: npt.NDArray[np.uint32],
+        sample_idxs: npt.NDArray[np.uint32],
+        chunk_size: int,
+        fname: str,
+        shape: tuple[int, int, int],
+        offset: int,
+    ):
+        """
+        Decode a group of variants from the PGEN file into a shared genotype matrix
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK._read_groups` and is
+        meant to be run within a separate process, each with its own PgenReader
+
+        Only the allele indices are decoded, just as they are stored in the PGEN file.
+        Subclasses that transform the genotypes should do so in the main process.
+
+        Parameters
+        ----------
+        pgen_fname: Path
+            The path to the PGEN file
+        prephased: bool
+            Whether the genotypes should be treated as phased
+        indices: npt.NDArray[np.uint32]
+            The indices of the variants in the group within the PGEN file
+        sample_idxs: npt.NDArray[np.uint32]
+            The indices of the samples to load, from
+            :py:meth:`~.GenotypesPLINK.read_samples`
+        chunk_size: int
+            The max number of variants to decode at once
+        fname: str
+            The path to the memory-mapped file backing the shared genotype matrix
+        shape: tuple[int, int, int]
+            The shape of the shared genotype matrix (samples x variants x strands)
+        offset: int
+            The index of the first variant of this group in the shared matrix
+        """
+        gts = GenotypesPLINK(pgen_fname)
+        gts._prephased = prephased
+        data = np.memmap(fname, dtype=np.uint8, mode="r+", shape=shape)
+        data = data[:, offset : offset + len(indices)]
+        pv = pgenlib.PvarReader(bytes(str(gts.fname.with_suffix(".pvar")), "utf8"))
+        with pgenlib.PgenReader(
+            bytes(str(gts.fname), "utf8"), sample_subset=sample_idxs, pvar=pv
+        ) as pgen:
+            scratch = gts._alloc_scratch(chunk_size, shape[0])
+            for start in range(0, len(indices), chunk_size):
+                end = min(start + chunk_size, len(indices))
+                gts._read_chunk(pgen, indices[start:end], data[:, start:end], scratch)
+        data.flush()
+
+    def _read_groups(
+        self,
+        indices: npt.NDArray[np.uint32],
+        sample_idxs: npt.NDArray[np.uint32],
+        chunk_size: int,
+        workers: int,
+    ):
+        """
+        Read the genotypes of the variants from the PGEN file in parallel
+
+        The variants are split into one contiguous group per process. A single
+        genotype matrix is allocated in shared memory, and each process decodes its
+        group directly into its own slice of the matrix, so that the slices don't
+        need to be copied or concatenated afterward.
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK.read`
+
+        Parameters
+        ----------
+        indices: npt.NDArray[np.uint32]
+            The indices of the variants to load within the PGEN file
+        sample_idxs: npt.NDArray[np.uint32]
+            The indices of the samples to load, from
+            :py:meth:`~.GenotypesPLINK.read_samples`
+        chunk_size: int
+            The max number of variants that each process should decode at once
+        workers: int
+            The number of processes to use
+        """
+        workers = min(workers, len(indices))
+        bounds = np.linspace(0, len(indices), workers + 1).astype(np.int64)
+        shape = (len(sample_idxs), len(indices), 2 + (not self._prephased))
+        # release any previously loaded genotypes before allocating the new ones
+        self.data = None
+        self.log.info(
+            f"Reading genotypes from {len(self.samples)} samples and "
+            f"{len(indices)} variants with {workers} processes, in chunks of size "
+            f"{chunk_size} variants"
+        )
+        with self._shared_matrix(shape) as (tmp_name, data):
+            with Pool(workers) as pool:
+                pool.starmap(
+                    self._read_group,
+                    [
+                        (
+                            self.fname,
+                            self._prephased,
+                            indices[start:end],
+                            sample_idxs,
+                            min(chunk_size, end - start),
+                            tmp_name,
+                            shape,
+                            start,
+                        )
+                        for start, end in zip(bounds[:-1], bounds[1:])
+                    ],
+                )
+        # the file has been deleted, but our mapping of it will persist until the
+        # genotype matrix is garbage collected
+        self.data = data.view(np.ndarray)
+
+    def _alloc_scratch(
+        self, size: int, num_samples: int
+    ) -> tuple[npt.NDArray[np.int32], npt.NDArray[np.uint8], npt.NDArray[np.uint8]]:
+        """
+        Allocate buffers into which pgenlib can decode a chunk of variants
+
+        pgenlib can only decode alleles into an int32 array, so the genotypes must be
+        staged there before they are copied into the uint8 genotype matrix. The
+        buffers can be reused for every chunk, so that there isn't any garbage to
+        collect afterward.
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK.read` and
+        :py:meth:`~.GenotypesPLINK._iterate_chunks`
+
+        Parameters
+        ----------
+        size: int
+            The max number of variants in a chunk
+        num_samples: int
+            The number of samples
+
+        Returns
+        -------
+        tuple[npt.NDArray[np.int32], npt.NDArray[np.uint8], npt.NDArray[np.uint8]]
+            A size x 2*num_samples int32 array for the alleles, a uint8 array of the
+            same shape into which they can be cast, and a size x num_samples array
+            for the phase of each genotype (or None if
+            :py:attr:`~.GenotypesPLINK._prephased`)
+        """
+        try:
+            data = np.empty((size, num_samples * 2), dtype=np.int32)
+            alleles = np.empty((size, num_samples * 2), dtype=np.uint8)
+            phasing = None
+            if not self._prephased:
+                phasing = np.empty((size, num_samples), dtype=np.uint8)
+        except MemoryError as e:
+            raise ValueError(
+                "You don't have enough memory to load these genotypes! Try"
+                " specifying a value to the chunk_size parameter, instead"
+            ) from e
+        return data, alleles, phasing
+
+    def _read_chunk(
+        self,
+        pgen: pgenlib.PgenReader,
+        indices: npt.NDArray[np.uint32],
+        out: npt.NDArray[np.uint8],
+        scratch: tuple[npt.NDArray, ...] = None,
+    ):
+        """
+        Read the genotypes of a chunk of variants from a PGEN file
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK.read` and
+        :py:meth:`~.GenotypesPLINK._iterate_chunks`
+
+        Parameters
+        ----------
+        pgen: pgenlib.PgenReader
+            The pgenlib.PgenReader object from which to fetch variant records
+        indices: npt.NDArray[np.uint32]
+            The indices of the variants within the PGEN file
+        out: npt.NDArray[np.uint8]
+            An n (samples) x len(indices) (variants) x 3 (or 2, if
+            :py:attr:`~.GenotypesPLINK._prephased`) array in which to store the
+            genotypes
+        scratch: tuple[npt.NDArray, ...], optional
+            Buffers from :py:meth:`~.GenotypesPLINK._alloc_scratch` with room for at
+            least len(indices) variants. If not provided, they will be allocated.
+        """
+        size, num_samples = len(indices), out.shape[0]
+        if scratch is None:
+            scratch = self._alloc_scratch(size, num_samples)
+        data, alleles, phasing = scratch
+        data, alleles = data[:size], alleles[:size]
+        # contiguous ranges of variants can be read without a list of their indices
+        span = self._as_slice(indices)
+        contiguous = isinstance(span, slice)
+        # the genotypes start out as a simple 2D array with twice the number
+        # of samples
+        if not self._prephased:
+            phasing = phasing[:size]
+            # ...each column is a different chromosomal strand
+            # The haplotype-major mode of read_alleles_and_phasepresent_list
+            # has not been implemented yet, so we need to read the genotypes
+            # in sample-major mode and then transpose them
+            if contiguous:
+                pgen.read_alleles_and_phasepresent_range(
+                    span.start, span.stop, data, phasing
+                )
+            else:
+                pgen.read_alleles_and_phasepresent_list(indices, data, phasing)
+            # add phase info to the GT matrix
+            out[:, :, 2] = phasing.transpose()
+        else:
+            # ...each row is a different chromosomal strand
+            if contiguous:
+                pgen.read_alleles_range(span.start, span.stop, data)
+            else:
+                pgen.read_alleles_list(indices, data)
+        # missing alleles will have a value of -9
+        # let's make them be -1 to be consistent with cyvcf2
+        # (this is done in place, so that we don't need to allocate a boolean mask)
+        np.maximum(data, -1, out=data)
+        # cast to uint8 while the alleles are still contiguous, so -1 becomes 255
+        np.copyto(alleles, data, casting="unsafe")
+        # transpose the GT matrix so that samples are rows and variants are columns
+        # copying one strand at a time is much faster than copying pairs of alleles
+        alleles = alleles.reshape((size, num_samples, 2))
+        out[:, :, 0] = alleles[:, :, 0].transpose()
+        out[:, :, 1] = alleles[:, :, 1].transpose()
 
     def _iterate(
         self,
@@ -1411,32 +3856,26 @@ class GenotypesPLINK(GenotypesVCF):
         self.log.info(f"Loading genotypes from {len(self.samples)} samples")
         Record = namedtuple("Record", "data variants")
 
-        # iterate over each line in the PVAR file
-        for idx, variant_arr in self._iterate_variants(region, variants):
-            # the genotypes start out as a simple 2D array with twice the number of samples
-            data = np.empty(len(self.samples) * 2, dtype=np.int32)
-            if not self._prephased:
-                phasing = np.empty(len(self.samples), dtype=np.uint8)
-                # The haplotype-major mode of read_alleles_and_phasepresent_list has
-                # not been implemented yet, so we need to read the genotypes in sample-
-                # major mode and then transpose them
-                pgen.read_alleles_and_phasepresent(idx, data, phasing)
-            else:
-                pgen.read_alleles(idx, data)
-            # missing alleles will have a value of -9
-            # let's make them be -1 to be consistent with cyvcf2
-            data[data == -9] = -1
-            # strand 1 is at even indices and strand 2 is at odd indices
-            data = np.dstack((data[::2], data[1::2]))[0].astype(np.uint8)
-            # concatenate phasing info into the data
-            if not self._prephased:
-                data = np.concatenate((data, phasing[:, np.newaxis]), axis=1)
-            # we extracted the genotypes to a matrix of size p x 3
-            # the last dimension has three items:
-            # 1) presence of REF in strand one
-            # 2) presence of REF in strand two
-            # 3) whether the genotype is phased (if self._prephased is False)
-            yield Record(data, variant_arr)
+        num_cols = 2 + (not self._prephased)
+        # decode the variants in batches, but keep the batches small enough that the
+        # scratch buffers stay at a few dozen MB even when there are many samples
+        batch_size = self.chunk_size or max(1, min(1000, 2**22 // len(self.samples)))
+        scratch = self._alloc_scratch(batch_size, len(self.samples))
+        # iterate over each batch of lines in the PVAR file
+        for indices, records in self._iterate_variant_blocks(
+            region, variants, batch_size
+        ):
+            # store the batch in variant-major order, so that the genotypes of each
+            # variant are contiguous
+            data = np.empty((len(indices), len(self.samples), num_cols), dtype=np.uint8)
+            self._read_chunk(pgen, indices, data.transpose((1, 0, 2)), scratch)
+            for i in range(len(indices)):
+                # we extracted the genotypes to a matrix of size n x 3
+                # the last dimension has three items:
+                # 1) presence of REF in strand one
+                # 2) presence of REF in strand two
+                # 3) whether the genotype is phased (if self._prephased is False)
+                yield Record(data[i], records[i, ...])
         pgen.close()
 
     def __iter__(
@@ -1471,6 +3910,84 @@ class GenotypesPLINK(GenotypesVCF):
         # see https://stackoverflow.com/a/36726497
         return self._iterate(pgen, region, variants)
 
+    def _iterate_chunks(
+        self,
+        pgen: pgenlib.PgenReader,
+        region: str = None,
+        variants: set[str] = None,
+        chunk_size: int = 1000,
+    ):
+        """
+        A generator over chunks of lines in a PGEN-PVAR file pair
+
+        This is a helper function for :py:meth:`~.GenotypesPLINK.iter_chunks`
+
+        Parameters
+        ----------
+        pgen: pgenlib.PgenReader
+            The pgenlib.PgenReader object from which to fetch variant records
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        chunk_size: int, optional
+            See documentation for :py:meth:`~.Genotypes.iter_chunks`
+
+        Yields
+        ------
+        Iterator[namedtuple]
+            See documentation for :py:meth:`~.Genotypes._iterate_chunks`
+        """
+        self.log.info(f"Loading genotypes from {len(self.samples)} samples")
+        Chunk = namedtuple("Chunk", "data variants")
+        num_cols = 2 + (not self._prephased)
+        scratch = self._alloc_scratch(chunk_size, len(self.samples))
+        for indices, records in self._iterate_variant_blocks(
+            region, variants, chunk_size
+        ):
+            data = np.empty((len(self.samples), len(indices), num_cols), dtype=np.uint8)
+            self._read_chunk(pgen, indices, data, scratch)
+            yield Chunk(data, records)
+        pgen.close()
+
+    def iter_chunks(
+        self,
+        chunk_size: int = 1000,
+        region: str = None,
+        samples: set[str] = None,
+        variants: set[str] = None,
+    ) -> Iterator[namedtuple]:
+        """
+        Read genotypes from a PGEN in chunks of variants without storing anything
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            See documentation for :py:meth:`~.Genotypes.iter_chunks`
+        region : str, optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        samples : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+        variants : set[str], optional
+            See documentation for :py:meth:`~.Genotypes.read`
+
+        Returns
+        -------
+        Iterator[namedtuple]
+            See documentation for :py:meth:`~.Genotypes._iterate_chunks`
+        """
+        super(Genotypes, self).read()
+
+        pv = pgenlib.PvarReader(bytes(str(self.fname.with_suffix(".pvar")), "utf8"))
+
+        sample_idxs = self.read_samples(samples)
+        pgen = pgenlib.PgenReader(
+            bytes(str(self.fname), "utf8"), sample_subset=sample_idxs, pvar=pv
+        )
+        # call another function to force the lines above to be run immediately
+        # see https://stackoverflow.com/a/36726497
+        return self._iterate_chunks(pgen, region, variants, chunk_size)
+
     def write_samples(self):
         """
         Write sample IDs to a PSAM file from a list stored in
@@ -1483,157 +4000,190 @@ class GenotypesPLINK(GenotypesVCF):
             psam.write("\n".join(self.samples))
             psam.write("\n")
 
-    def write_variants(self):
+    def write_variants(self, chunk_size: int = 100000):
         """
         Write variant IDs to a PVAR file from the numpy array stored in
         :py:attr:`~.GenotypesPLINK.variants`
 
-        This method is called automatically by :py:meth:`~.GenotypesPLINK.write`
+        The lines of the file are formatted and written in large blocks rather than
+        one at a time
+
+        Parameters
+        ----------
+        chunk_size: int, optional
+            The max number of lines to format at once
         """
-        with VariantFile(str(self.fname.with_suffix(".pvar")), mode="w") as vcf:
-            # make sure the header is properly structured
-            for contig in set(self.variants["chrom"]):
-                vcf.header.contigs.add(contig)
+        with self.hook_compressed(self.fname.with_suffix(".pvar"), mode="w") as pvar:
+            pvar.write(self._format_header(self._contigs()))
             self.log.info("Writing PVAR records")
-            for var in self.variants:
-                rec = {
-                    "contig": var["chrom"],
-                    "start": var["pos"],
-                    "stop": var["pos"] + len(var["alleles"][0]) - 1,
-                    "qual": None,
-                    "alleles": var["alleles"],
-                    "id": var["id"],
-                    "filter": None,
-                }
-                # handle pysam increasing the start site by 1
-                rec["start"] -= 1
-                # parse the record into a pysam.VariantRecord
-                record = vcf.new_record(**rec)
-                # write the record to a file
-                vcf.write(record)
+            for start in range(0, len(self.variants), chunk_size):
+                lines = self._format_variants(self.variants[start : start + chunk_size])
+                pvar.write("".join(lines))
+
+    def open(
+        self, num_variants: int, contigs: list[str] = None, max_allele_ct: int = None
+    ):
+        """
+        Start writing genotypes to PLINK2 files at :py:attr:`~.GenotypesPLINK.fname`
+        one chunk of variants at a time
 
-    def _num_unique_alleles(self, arr: npt.NDArray):
+        The samples in :py:attr:`~.GenotypesPLINK.samples` are written to the PSAM
+        file immediately. Afterward, call :py:meth:`~.GenotypesPLINK.append_chunk`
+        with each chunk of variants and then :py:meth:`~.GenotypesPLINK.close`. Only
+        one chunk needs to be held in memory at any given time.
+
+        Parameters
+        ----------
+        num_variants: int
+            The total number of variants that will be written
+
+            The PGEN format requires that this be known ahead of time
+        contigs: list[str], optional
+            The contigs to declare in the header of the PVAR file
+        max_allele_ct: int, optional
+            The max number of alleles (including the REF allele) of any variant that
+            will be written
+
+            Defaults to 2, so you must provide this if any of the variants are
+            multiallelic. :py:meth:`~.GenotypesPLINK.append_chunk` raises a ValueError
+            for any variant with more alleles than this.
         """
-        Obtain the number of unique elements in each row of a genotype matrix
-        Needed by https://groups.google.com/g/plink2-users/c/Sn5qVCyDlDw/m/GOWScY6tAQAJ
+        if num_variants < 1:
+            raise ValueError("At least one variant must be written to a PGEN file")
+        max_allele_ct = max(max_allele_ct or 2, 2)
+        if max_allele_ct > np.iinfo(np.uint8).max:
+            raise ValueError(
+                f"The PGEN format only allows up to {np.iinfo(np.uint8).max} alleles "
+                "per variant"
+            )
+        self.write_samples()
+        pvar = self.hook_compressed(self.fname.with_suffix(".pvar"), mode="w")
+        pvar.write(self._format_header(contigs or []))
+        pgen = pgenlib.PgenWriter(
+            filename=bytes(str(self.fname), "utf8"),
+            sample_ct=len(self.samples),
+            variant_ct=num_variants,
+            allele_ct_limit=max_allele_ct,
+            nonref_flags=False,
+            hardcall_phase_present=True,
+        )
+        self._writer = (pvar, pgen, [None], max_allele_ct)
+        self.log.info(
+            f"Writing genotypes from {len(self.samples)} samples and {num_variants} "
+            "variants"
+        )
 
-        Adapted from https://stackoverflow.com/a/46575580
+    def append_chunk(self, data: npt.NDArray, variants: npt.NDArray):
+        """
+        Write a chunk of variants to the files opened by
+        :py:meth:`~.GenotypesPLINK.open`
 
         Parameters
         ----------
-        arr : npt.NDArray
-            A genotype matrix of shape (num_variants, num_samples, 2) and type np.uint8
+        data: npt.NDArray
+            A p (variants) x n (samples) x 2 genotype matrix, or p x n x 3 if the
+            genotypes aren't all phased
+
+            Note that the variants are the rows, unlike in
+            :py:attr:`~.GenotypesPLINK.data`
+        variants: npt.NDArray
+            The p variants, in the same format as :py:attr:`~.GenotypesPLINK.variants`
+        """
+        pvar, pgen, scratch, max_allele_ct = self._writer
+        size, num_samples = data.shape[:2]
+        if data.dtype != np.uint8:
+            data = data.view(np.uint8)
+        # the int32 buffer that pgenlib expects can be reused for each chunk
+        if scratch[0] is None or len(scratch[0]) < size:
+            try:
+                scratch[0] = np.empty((size, num_samples * 2), dtype=np.int32)
+            except MemoryError as e:
+                raise ValueError(
+                    "You don't have enough memory to write these genotypes! Try"
+                    " specifying a value to the chunk_size parameter, instead"
+                ) from e
+        alleles = scratch[0][:size]
+        np.copyto(alleles.reshape((size, num_samples, 2)), data[:, :, :2])
+        # convert any missing genotypes to -9
+        alleles[alleles == np.iinfo(np.uint8).max] = -9
+        # every allele of a variant is counted, even if it isn't observed
+        # Needed by https://groups.google.com/g/plink2-users/c/Sn5qVCyDlDw/m/GOWScY6tAQAJ
+        allele_cts = np.fromiter(
+            map(len, variants["alleles"]), dtype=np.uint32, count=size
+        )
+        too_many = np.flatnonzero(allele_cts > max_allele_ct)
+        if len(too_many):
+            raise ValueError(
+                "Variant with ID {} has {} alleles, but open() was only told to expect "
+                "up to {} alleles per variant. Please provide a larger max_allele_ct."
+                .format(
+                    variants["id"][too_many[0]], allele_cts[too_many[0]], max_allele_ct
+                )
+            )
+        try:
+            # finally, append the genotypes to the PGEN file
+            if self._prephased or data.shape[2] < 3:
+                pgen.append_alleles_batch(
+                    alleles, all_phased=True, allele_cts=allele_cts
+                )
+            else:
+                # TODO: why does this sometimes leads to a corrupted file?
+                phase = np.ascontiguousarray(data[:, :, 2])
+                pgen.append_partially_phased_batch(
+                    alleles, phase, allele_cts=allele_cts
+                )
+        except RuntimeError as e:
+            if np.any(alleles.max(axis=1, initial=0) >= allele_cts):
+                raise ValueError("Variant(s) have more alleles than expected") from e
+            raise e
+        pvar.write("".join(self._format_variants(variants)))
 
-        Returns
-        -------
-        npt.NDArray
-            An array of shape (num_variants,) and type np.uint32 containing allele
-            counts for each variant
-        """
-        nrows = arr.shape[0]
-        row_coords = np.arange(nrows)[:, np.newaxis, np.newaxis]
-        allele_cts = np.zeros((nrows, np.iinfo(np.uint8).max + 1, 2), dtype=np.bool_)
-        # ensure the arr values are interpreted as uint8's
-        if arr.dtype != np.uint8:
-            arr = arr.view("uint8")
-        # mark whichever allele indices appear in arr then sum them to obtain counts
-        allele_cts[row_coords, arr] = 1
-        allele_cts = allele_cts.any(axis=2).sum(axis=1, dtype=np.uint32)
-        # there are always at least two alleles
-        allele_cts[allele_cts < 2] = 2
-        return allele_cts
+    def close(self):
+        """
+        Finish writing the files opened by :py:meth:`~.GenotypesPLINK.open`
+        """
+        pvar, pgen, _, _ = self._writer
+        self._writer = None
+        pvar.close()
+        pgen.close()
 
     def write(self):
         """
         Write the variants in this class to PLINK2 files at
         :py:attr:`~.GenotypesPLINK.fname`
         """
-        # write the psam and pvar files
-        self.write_samples()
-        self.write_variants()
-        self.log.debug(f"Transposing genotype matrix of size {self.data.shape}")
-        # transpose the data b/c pgenwriter expects things in "variant-major" order
-        # (ie where variants are rows instead of samples)
-        data = self.data.transpose((1, 0, 2))[:, :, :2]
+        if len(self.variants) == 0:
+            # write empty pvar and pgen files
+            self.write_samples()
+            self.write_variants()
+            with open(self.fname, "wb"):
+                pass
+            return
+        if not self.packed:
+            # transpose the data b/c pgenwriter expects things in "variant-major" order
+            # (ie where variants are rows instead of samples)
+            data = self.data.transpose((1, 0, 2))
+            if self._prephased:
+                data = data[:, :, :2]
         # how many variants should we write at once?
         chunks = self.chunk_size
         if chunks is None or chunks > len(self.variants):
             chunks = len(self.variants)
-
-        # write the pgen file
+        max_allele_ct = max(map(len, self.variants["alleles"]))
+        self.open(len(self.variants), self._contigs(), max(max_allele_ct, 2))
         try:
-            max_allele_ct = pgenlib.PvarReader(
-                bytes(str(self.fname.with_suffix(".pvar")), "utf8")
-            ).get_max_allele_ct()
-        except RuntimeError as e:
-            if len(self.variants) == 0:
-                # write an empty pgen file
-                with open(self.fname, "wb"):
-                    pass
-                return
-            else:
-                raise e
-        with pgenlib.PgenWriter(
-            filename=bytes(str(self.fname), "utf8"),
-            sample_ct=len(self.samples),
-            variant_ct=len(self.variants),
-            allele_ct_limit=max_allele_ct,
-            nonref_flags=False,
-            hardcall_phase_present=True,
-        ) as pgen:
-            self.log.info(
-                f"Writing genotypes from {len(self.samples)} samples and "
-                f"{len(self.variants)} variants in chunks of size {chunks} variants"
-            )
             # iterate through chunks of variants
             for start in range(0, len(self.variants), chunks):
-                end = start + chunks
-                if end > len(self.variants):
-                    end = len(self.variants)
+                end = min(start + chunks, len(self.variants))
                 self.log.debug(f"Writing variant #{start} through variant #{end}")
-                size = end - start
-                try:
-                    missing = np.ascontiguousarray(
-                        data[start:end] == np.iinfo(np.uint8).max
-                    )
-                    # obtain the number of unique alleles for each variant
-                    # https://stackoverflow.com/a/46575580
-                    allele_cts = self._num_unique_alleles(data[start:end])
-                    subset_data = np.ascontiguousarray(data[start:end], dtype=np.int32)
-                    subset_data.resize((size, len(self.samples) * 2))
-                    missing.resize((size, len(self.samples) * 2))
-                except (np.core._exceptions._ArrayMemoryError, MemoryError) as e:
-                    raise ValueError(
-                        "You don't have enough memory to write these genotypes! Try"
-                        " specifying a value to the chunk_size parameter, instead"
-                    ) from e
-                # convert any missing genotypes to -9
-                subset_data[missing] = -9
-                try:
-                    # finally, append the genotypes to the PGEN file
-                    if self._prephased or self.data.shape[2] < 3:
-                        pgen.append_alleles_batch(
-                            subset_data,
-                            all_phased=True,
-                            allele_cts=allele_cts,
-                        )
-                    else:
-                        # TODO: why does this sometimes leads to a corrupted file?
-                        subset_phase = self.data[:, start:end, 2].T.copy(order="C")
-                        pgen.append_partially_phased_batch(
-                            subset_data,
-                            subset_phase,
-                            allele_cts=allele_cts,
-                        )
-                        del subset_phase
-                except RuntimeError as e:
-                    if not np.all(allele_cts <= max_allele_ct):
-                        raise ValueError("Variant(s) have more alleles than expected")
-                    else:
-                        raise e
-            del subset_data
-            del missing
-            gc.collect()
+                if self.packed:
+                    # unpack only the current chunk of variants
+                    chunk = self._unpacked_data(start, end).transpose((1, 0, 2))
+                else:
+                    chunk = data[start:end]
+                self.append_chunk(chunk, self.variants[start:end])
+        finally:
+            self.close()
 
 
 class GenotypesPLINKTR(GenotypesPLINK):
@@ -1668,6 +4218,8 @@ class GenotypesPLINKTR(GenotypesPLINK):
     ):
         super().__init__(fname, log, chunk_size)
         self.vcftype = vcftype
+        # the allele lengths of the TRs, indexed by their position in the PVAR file
+        self._tr_lengths = None
 
     @classmethod
     def load(
@@ -1706,128 +4258,320 @@ class GenotypesPLINKTR(GenotypesPLINK):
         genotypes.check_phase()
         return genotypes
 
-    def _iter_TRRecords(self, region: str = None, variants: set[str] = None):
+    def _allele_lengths_path(self) -> Path:
+        """
+        Get the path to the binary sidecar of the allele lengths of the TRs
+
+        Returns
+        -------
+        Path
+            The path to the sidecar, which may or may not exist
+        """
+        return Path(str(self.fname.with_suffix(".pvar")) + ".lens")
+
+    def build_pvar_cache(self, chunk_size: int = 100000) -> Path:
+        """
+        See documentation for :py:meth:`~.GenotypesPLINK.build_pvar_cache`
+
+        The length of each allele of each TR is also stored alongside the PVAR file
+        in a directory of .npy files with an additional .lens extension, so that the
+        TRs don't need to be harmonized again whenever they are read. The lengths are
+        computed in the same pass over the PVAR file as the variants.
+        """
+        lens_fname = self._allele_lengths_path()
+        # remove the old sidecar, so that the lengths are extracted from the PVAR file
+        if lens_fname.is_dir():
+            shutil.rmtree(lens_fname)
+        fname = super().build_pvar_cache(chunk_size)
+        indices, offsets, lengths = self._merge_allele_lengths()
+        VariantTable._save_arrays(
+            lens_fname, {"indices": indices, "offsets": offsets, "lengths": lengths}
+        )
+        self.log.info(f"Wrote the allele lengths of {len(indices)} TRs to {lens_fname}")
+        return fname
+
+    def _read_pvar_meta(self) -> tuple[trh.VcfTypes, dict[str, type]]:
         """
-        Yield TRRecord objects from the PVAR file
+        Read the meta-information lines at the start of the PVAR file
+
+        Returns
+        -------
+        tuple[trh.VcfTypes, dict[str, type]]
+            The TR caller that created the variants, inferred from the meta-information
+            lines if :py:attr:`~.GenotypesPLINKTR.vcftype` is 'auto', and the type of
+            the values of each INFO field
+        """
+        lines = []
+        with self.hook_compressed(self.fname.with_suffix(".pvar"), mode="r") as pvar:
+            for line in pvar:
+                lines.append(line)
+                if not line.startswith("##"):
+                    break
+        # the caller is inferred from the header, just like for a VCF
+        Header = namedtuple("Header", "raw_header")
+        vcftype = trh.InferVCFType(Header("".join(lines)), self.vcftype)
+        casts = {"Integer": int, "Float": float}
+        types = {}
+        for line in lines:
+            match = re.match(r"##INFO=<ID=([^,>]+),.*Type=(\w+)", line)
+            if match:
+                types[match.group(1)] = casts.get(match.group(2), str)
+        return vcftype, types
+
+    @staticmethod
+    def _parse_info(info: str, types: dict[str, type]) -> dict:
+        """
+        Parse the INFO field of a line in the PVAR file, like cyvcf2 would
 
         Parameters
         ----------
-        region : str, optional
-            See documentation for :py:attr:`~.GenotypesVCF.read`
-        variants : set[str], optional
-            See documentation for :py:attr:`~.GenotypesVCF.read`
+        info: str
+            The INFO field, as written in the PVAR file
+        types: dict[str, type]
+            The type of the values of each INFO field, from
+            :py:meth:`~.GenotypesPLINKTR._read_pvar_meta`
 
-        Yields
-        ------
-        Iterator[trh.TRRecord]
-            An iterator over each line of the PVAR file
+        Returns
+        -------
+        dict
+            The value of each key in the INFO field
         """
-        vcf = VCF(self.fname.with_suffix(".pvar"))
-        tr_records = TRRecordHarmonizerRegion(
-            vcffile=vcf,
-            vcfiter=vcf(region),
-            vcftype=self.vcftype,
-        )
+        fields = {}
+        if info == ".":
+            return fields
+        for field in info.split(";"):
+            key, sep, val = field.partition("=")
+            if not sep:
+                # this must be a flag
+                fields[key] = True
+                continue
+            cast = types.get(key, str)
+            if cast is str:
+                fields[key] = val
+                continue
+            vals = tuple(map(cast, val.split(",")))
+            fields[key] = vals[0] if len(vals) == 1 else vals
+        return fields
 
-        # filter out TRs that we didn't want
-        if variants is not None:
-            tr_records = filter(lambda rec: rec.record_id in variants, tr_records)
-        yield from tr_records
+    def _harmonize_lengths(
+        self,
+        cols: dict[str, list[str]],
+        vcftype: trh.VcfTypes,
+        types: dict[str, type],
+    ) -> tuple[npt.NDArray[np.uint32], npt.NDArray[np.uint8]]:
+        """
+        Harmonize a block of TRs from the PVAR file and extract their allele lengths
 
-    def read(
+        Parameters
+        ----------
+        cols: dict[str, list[str]]
+            The columns of the block, from :py:meth:`~.GenotypesPLINK._split_pvar`
+        vcftype: trh.VcfTypes
+            See documentation for :py:meth:`~.GenotypesPLINKTR._read_pvar_meta`
+        types: dict[str, type]
+            See documentation for :py:meth:`~.GenotypesPLINKTR._read_pvar_meta`
+
+        Returns
+        -------
+        tuple[npt.NDArray[np.uint32], npt.NDArray[np.uint8]]
+            The number of alleles of each TR and the length of each of their alleles,
+            with the REF allele first
+        """
+        # the harmonizer only needs these attributes of a cyvcf2 Variant
+        Record = namedtuple("Record", "CHROM POS ID REF ALT INFO")
+        infos = cols.get("INFO", ["."] * len(cols["ID"]))
+        counts = np.empty((len(cols["ID"]),), dtype=np.uint32)
+        lengths = []
+        for idx, (chrom, pos, var_id, ref, alt, info) in enumerate(
+            zip(cols["CHROM"], cols["POS"], cols["ID"], cols["REF"], cols["ALT"], infos)
+        ):
+            record = trh.HarmonizeRecord(
+                vcftype,
+                Record(
+                    chrom,
+                    int(pos),
+                    var_id,
+                    ref,
+                    [] if alt == "." else alt.split(","),
+                    self._parse_info(info, types),
+                ),
+            )
+            lengths.append(record.ref_allele_length)
+            lengths.extend(record.alt_allele_lengths)
+            counts[idx] = len(record.alt_allele_lengths) + 1
+        # fractional lengths are truncated
+        return counts, np.array(lengths, dtype=np.float64).astype(np.uint8)
+
+    def _parse_pvar(
+        self, chunk_size: int = 100000, variants: set[str] = None
+    ) -> Iterator[tuple[npt.NDArray, VariantTable]]:
+        """
+        See documentation for :py:meth:`~.GenotypesPLINK._parse_pvar`
+
+        The allele lengths of the TRs are extracted in the same pass over the PVAR
+        file, unless they can be loaded from their binary sidecar
+        """
+        self._tr_lengths = []
+        harmonize = not self._check_sidecar(self._allele_lengths_path())
+        if harmonize:
+            vcftype, types = self._read_pvar_meta()
+        extra = ("INFO",) if harmonize else ()
+        for indices, cols in self._split_pvar(chunk_size, variants, extra):
+            if harmonize:
+                counts, lengths = self._harmonize_lengths(cols, vcftype, types)
+                self._tr_lengths.append((indices, counts, lengths))
+            yield indices, self._encode_pvar(cols)
+        if not harmonize:
+            self._tr_lengths = None
+
+    def _merge_allele_lengths(
         self,
-        region: str = None,
-        samples: set[str] = None,
-        variants: set[str] = None,
-        max_variants: int = None,
-    ):
+    ) -> tuple[npt.NDArray[np.uint32], npt.NDArray[np.int64], npt.NDArray[np.uint8]]:
         """
-        Read genotypes from a PGEN file into a numpy matrix stored in
-        :py:attr:`~.GenotypesPLINKTR.data`
+        Merge the blocks of allele lengths from
+        :py:meth:`~.GenotypesPLINKTR._parse_pvar` into a single table
+
+        Returns
+        -------
+        tuple[npt.NDArray[np.uint32], npt.NDArray[np.int64], npt.NDArray[np.uint8]]
+            The sorted indices of the TRs within the PVAR file, the offset of each of
+            their first alleles in the third array (plus the total number of alleles),
+            and the length of every allele of every TR
+        """
+        if isinstance(self._tr_lengths, list):
+            blocks = self._tr_lengths or [
+                (np.empty((0,), np.uint32), np.empty((0,), np.uint32), np.empty((0,)))
+            ]
+            indices, counts, lengths = map(np.concatenate, zip(*blocks))
+            offsets = np.zeros((len(counts) + 1,), dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._tr_lengths = (indices, offsets, lengths.astype(np.uint8))
+        return self._tr_lengths
+
+    def _load_allele_lengths(
+        self, indices: npt.NDArray[np.uint32]
+    ) -> tuple[npt.NDArray[np.uint32], npt.NDArray[np.int64], npt.NDArray[np.uint8]]:
+        """
+        Get a table of the allele lengths of at least the requested TRs
+
+        The table is loaded from the binary sidecar, if there is one. Otherwise, the
+        lengths extracted from the last pass over the PVAR file are used, or the PVAR
+        file is parsed again if they don't include every requested TR.
 
         Parameters
         ----------
-        region : str, optional
-            See documentation for :py:attr:`~.GenotypesVCF.read`
-        samples : set[str], optional
-            See documentation for :py:attr:`~.GenotypesVCF.read`
-        variants : set[str], optional
-            See documentation for :py:attr:`~.GenotypesVCF.read`
-        max_variants : int, optional
-            See documentation for :py:attr:`~.GenotypesVCF.read`
+        indices: npt.NDArray[np.uint32]
+            The indices of the TRs within the PVAR file
+
+        Returns
+        -------
+        tuple[npt.NDArray[np.uint32], npt.NDArray[np.int64], npt.NDArray[np.uint8]]
+            See documentation for :py:meth:`~.GenotypesPLINKTR._merge_allele_lengths`
+        """
+        if self._tr_lengths is not None:
+            table = self._merge_allele_lengths()
+            rows = np.searchsorted(table[0], indices)
+            if np.all(rows < len(table[0])) and np.array_equal(table[0][rows], indices):
+                return table
+        fname = self._allele_lengths_path()
+        if self._check_sidecar(fname):
+            self.log.debug(f"Loading allele lengths from {fname}")
+            table = VariantTable._load_arrays(fname)
+            self._tr_lengths = (table["indices"], table["offsets"], table["lengths"])
+        else:
+            self.log.debug("Extracting the allele lengths of every TR")
+            for _ in self._parse_pvar():
+                pass
+        return self._merge_allele_lengths()
+
+    def _allele_length_table(
+        self, indices: npt.NDArray[np.uint32]
+    ) -> npt.NDArray[np.uint8]:
         """
-        super().read(region, samples, variants, max_variants)
+        Create a lookup table from the allele indices of some TRs to their lengths
 
-        num_variants = len(self.variants)
-        # initialize a jagged array of allele lengths
-        max_num_alleles = max(map(len, self.variants["alleles"]))
-        allele_lens = np.empty(
-            (len(self.variants), max_num_alleles), dtype=self.data.dtype
+        Parameters
+        ----------
+        indices: npt.NDArray[np.uint32]
+            The indices of the TRs within the PVAR file
+
+        Returns
+        -------
+        npt.NDArray[np.uint8]
+            An array of shape len(indices) x (at least) 256, where row i holds the
+            length of each allele of TR i and the code for a missing allele (255) maps
+            to itself
+        """
+        tr_indices, offsets, lengths = self._load_allele_lengths(indices)
+        rows = np.searchsorted(tr_indices, indices)
+        starts = offsets[rows]
+        counts = offsets[rows + 1] - starts
+        table = np.zeros(
+            (len(indices), max(256, counts.max(initial=0))), dtype=np.uint8
         )
-        # iterate through each TR and extract the REF and ALT allele lengths
-        for idx, record in enumerate(self._iter_TRRecords(region, variants)):
-            if idx > num_variants:
-                # exit early if we've already found all the variants
-                break
-            # extract allele lengths from TRRecord object
-            allele_lens[idx, 0] = record.ref_allele_length
-            num_alleles = len(record.alt_allele_lengths) + 1
-            allele_lens[idx, 1:num_alleles] = record.alt_allele_lengths
-        # record missing entries and then set them all to REF
-        missing = self.data[:, :, :2] == np.iinfo(np.uint8).max
-        self.data[:, :, :2][missing] = 0
-        # convert from genotype indices to allele lengths
-        variant_coords = np.arange(num_variants)[:, np.newaxis]
-        self.data[:, :, :2] = allele_lens[variant_coords, self.data[:, :, :2]]
-        # restore missing entries
-        self.data[:, :, :2][missing] = np.iinfo(np.uint8).max
-        # clean up memory
-        del missing
-        del allele_lens
-        gc.collect()
+        # scatter the jagged rows of alleles into the table all at once
+        row_ids = np.repeat(np.arange(len(indices)), counts)
+        col_ids = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        table[row_ids, col_ids] = lengths[np.repeat(starts, counts) + col_ids]
+        table[:, np.iinfo(np.uint8).max] = np.iinfo(np.uint8).max
+        return table
 
-    def _iterate(
+    def _convert_to_lengths(
+        self, indices: npt.NDArray[np.uint32], data: npt.NDArray[np.uint8]
+    ):
+        """
+        Convert a matrix of allele indices into a matrix of allele lengths, in-place
+
+        Parameters
+        ----------
+        indices: npt.NDArray[np.uint32]
+            The indices of the TRs within the PVAR file
+        data: npt.NDArray[np.uint8]
+            An n (samples) x len(indices) (variants) x 2 (or 3) matrix of allele
+            indices
+        """
+        if not len(indices):
+            return
+        table = self._allele_length_table(indices)
+        # convert from genotype indices to allele lengths with a single gather
+        strands = data[:, :, :2]
+        strands[:] = np.take_along_axis(table[np.newaxis], strands, 2)
+
+    def _read_chunk(
         self,
         pgen: pgenlib.PgenReader,
-        region: str = None,
-        variants: set[str] = None,
+        indices: npt.NDArray[np.uint32],
+        out: npt.NDArray[np.uint8],
+        scratch: tuple[npt.NDArray, ...] = None,
     ):
         """
-        A generator over the lines of a PGEN-PVAR file pair
+        See documentation for :py:meth:`~.GenotypesPLINK._read_chunk`
 
-        This is a helper function for :py:meth:`~.GenotypesPLINKTR.__iter__`
+        The allele indices are converted into allele lengths afterward, in-place
+        """
+        super()._read_chunk(pgen, indices, out, scratch)
+        self._convert_to_lengths(indices, out)
 
-        Parameters
-        ----------
-        pgen: pgenlib.PgenReader
-            The pgenlib.PgenReader object from which to fetch variant records
-        region : str, optional
-            See documentation for :py:meth:`~.Genotypes.read`
-        variants : set[str], optional
-            See documentation for :py:meth:`~.Genotypes.read`
+    def _read_groups(
+        self,
+        indices: npt.NDArray[np.uint32],
+        sample_idxs: npt.NDArray[np.uint32],
+        chunk_size: int,
+        workers: int,
+    ):
+        """
+        See documentation for :py:meth:`~.GenotypesPLINK._read_groups`
 
-        Yields
-        ------
-        Iterator[namedtuple]
-            An iterator over each line in the file, where each line is encoded as a
-            namedtuple containing each of the class properties
+        The processes only decode the allele indices, so that the table of allele
+        lengths doesn't need to be sent to each of them. The indices are converted
+        into allele lengths afterward, chunk by chunk.
         """
-        tr_records = self._iter_TRRecords(region, variants)
-        variants = super()._iterate(pgen, region, variants)
-        for variant, record in zip(variants, tr_records):
-            # extract the REF and ALT allele lengths
-            allele_lens = np.array(
-                [record.ref_allele_length, *record.alt_allele_lengths],
-                dtype=variant.data.dtype,
-            )
-            # record missing entries and then set them all to REF
-            missing = variant.data[:, :2] == np.iinfo(np.uint8).max
-            variant.data[:, :2][missing] = 0
-            # convert from genotype indices to allele lengths
-            variant.data[:, :2] = allele_lens[variant.data[:, :2]]
-            # restore missing entries
-            variant.data[:, :2][missing] = np.iinfo(np.uint8).max
-            yield variant
+        super()._read_groups(indices, sample_idxs, chunk_size, workers)
+        for start in range(0, len(indices), chunk_size):
+            end = start + chunk_size
+            self._convert_to_lengths(indices[start:end], self.data[:, start:end])
 
     def write(self):
         raise NotImplementedError
@@ -1838,5 +4582,11 @@ class GenotypesPLINKTR(GenotypesPLINK):
     def check_biallelic(self):
         raise NotImplementedError
 
+    def qc(self, discard_missing: bool = False, chunk_size: int = 10000):
+        """
+        See documentation for :py:meth:`~.GenotypesTR.qc`
+        """
+        GenotypesTR.qc(self, discard_missing, chunk_size)
+
     def check_maf(self):
         raise NotImplementedError
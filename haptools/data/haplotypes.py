@@ -485,6 +485,9 @@ class Haplotype:
         var_IDs = self.varIDs
         # ensure the variants in the Genotypes object are ordered according to var_IDs
         gts = genotypes.subset(variants=var_IDs)
+        if gts.packed:
+            # there are only a few variants, so it's cheap to unpack them
+            gts.unpack()
         # check: were any of the variants absent from the genotypes?
         if len(gts.variants) < len(var_IDs):
             missing_IDs = set(var_IDs) - set(gts.variants["id"])
@@ -1402,6 +1405,9 @@ class Haplotypes(Data):
             raise ValueError("Some alleles were not present in the genotypes")
         # finally, obtain and merge the haplotype genotypes
         self.log.info(f"Transforming genotypes for {len(haps)} haplotypes")
+        if gts.packed:
+            hap_gts.data = self._transform_packed(gts, allele_arr.ravel(), idxs)
+            return hap_gts
         equality_arr = np.equal(allele_arr, gts.data[:, :, :2])
         self.log.debug(
             f"Allocating array with dtype {gts.data.dtype} and size "
@@ -1413,6 +1419,48 @@ class Haplotypes(Data):
             hap_gts.data[:, i] = np.all(equality_arr[:, idxs[i]], axis=1)
         return hap_gts
 
+    def _transform_packed(
+        self,
+        gts: GenotypesVCF,
+        allele_arr: npt.NDArray,
+        idxs: list[npt.NDArray],
+    ) -> npt.NDArray[np.uint64]:
+        """
+        Transform a bit-packed genotypes matrix via the current haplotypes
+
+        This is a helper function for :py:meth:`~.Haplotypes.transform`
+
+        Parameters
+        ----------
+        gts : GenotypesVCF
+            The genotypes which to transform, after they have been packed via
+            :py:meth:`~.Genotypes.pack` and subsetted to the distinct alleles
+        allele_arr : npt.NDArray
+            The allele integer of each variant in gts
+        idxs : list[npt.NDArray]
+            The indices of each haplotype's alleles in allele_arr
+
+        Returns
+        -------
+        npt.NDArray[np.uint64]
+            A packed matrix of haplotype genotypes, with shape (num_haps, 2, words)
+        """
+        # flip the bits of any REF alleles, so that a set bit always denotes that a
+        # strand carries the allele
+        equality_arr = gts.data.copy()
+        np.invert(
+            equality_arr, out=equality_arr, where=(allele_arr == 0)[:, None, None]
+        )
+        # multiallelic alleles can never be present in a biallelic genotype matrix
+        equality_arr[allele_arr > 1] = 0
+        # we can now just AND the words of each haplotype's alleles together
+        hap_data = np.empty((len(idxs), *gts.data.shape[1:]), dtype=np.uint64)
+        for i, idx in enumerate(idxs):
+            hap_data[i] = np.bitwise_and.reduce(equality_arr[idx], axis=0)
+        # make sure the unused bits at the end of each row are still unset
+        hap_data &= gts._pack_bits(np.ones(len(gts.samples), dtype=np.bool_))
+        return hap_data
+
     def sort(self):
         """
         Sorts .hap files first by chrom, followed by start, end, and lastly ID
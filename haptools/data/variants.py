@@ -0,0 +1,500 @@
+from __future__ import annotations
+import os
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import numpy.typing as npt
+
+
+class VariantTable:
+    """
+    A compact, read-only table of variant meta information
+
+    This can stand in for the structured array in :py:attr:`~.Genotypes.variants`
+    while using much less memory. Contigs are stored as integer codes into a list of
+    contig names, and each string field (like variant IDs) is stored as a single
+    buffer of UTF-8 bytes along with an array of offsets into it. The alleles of each
+    variant are joined by commas and stored in the same way. All other fields are
+    kept as regular numpy arrays.
+
+    The table can be accessed in the same ways as the structured array it replaces.
+    Indexing it by a field name (ex: "id") decodes that field into a numpy array.
+    Indexing it by an integer returns a single record. Indexing it by a slice, an
+    array of indices, or a boolean mask returns a new VariantTable. Converting it to
+    a numpy array (ex: via np.asarray) recovers the original structured array.
+
+    Attributes
+    ----------
+    dtype : np.dtype
+        The dtype of the structured array that this table stands in for
+    contigs : npt.NDArray
+        The name of each contig, indexed by the contig codes
+    _codes : npt.NDArray
+        The code of the contig of each variant
+    _strings : dict[str, tuple[npt.NDArray[np.int64], npt.NDArray[np.uint8]]]
+        The offsets and buffer of bytes of each string field
+    _columns : dict[str, npt.NDArray]
+        All other fields, stored as regular numpy arrays
+
+    Examples
+    --------
+    >>> genotypes = GenotypesVCF.load('tests/data/simple.vcf')
+    >>> variants = VariantTable(genotypes.variants)
+    >>> variants["id"]
+    >>> variants[0]["alleles"]
+    """
+
+    CATEGORICAL = ("chrom",)
+    ALLELES = ("alleles",)
+
+    def __init__(self, variants: npt.NDArray):
+        columns = {}
+        for name in variants.dtype.names:
+            if name in self.ALLELES:
+                columns[name] = [",".join(alleles) for alleles in variants[name]]
+            elif variants.dtype[name].kind == "U":
+                columns[name] = variants[name].tolist()
+            else:
+                columns[name] = variants[name].copy()
+        self._set_columns(variants.dtype, len(variants), columns)
+
+    @classmethod
+    def from_columns(
+        cls, dtype: np.dtype, columns: dict[str, list | npt.NDArray]
+    ) -> VariantTable:
+        """
+        Create a table from a set of columns, without creating a structured array
+
+        Parameters
+        ----------
+        dtype: np.dtype
+            The dtype of the structured array that the table should stand in for
+        columns: dict[str, list | npt.NDArray]
+            The values of each field in the dtype
+
+            The alleles of each variant should already be joined by commas
+
+        Returns
+        -------
+        VariantTable
+            A table containing the columns
+        """
+        table = object.__new__(cls)
+        num_variants = len(next(iter(columns.values()))) if len(columns) else 0
+        table._set_columns(np.dtype(dtype), num_variants, columns)
+        return table
+
+    def _set_columns(
+        self, dtype: np.dtype, num_variants: int, columns: dict[str, list | npt.NDArray]
+    ):
+        """
+        Encode a set of columns into the table
+
+        This is a helper function for :py:meth:`~.VariantTable.from_columns`
+
+        Parameters
+        ----------
+        dtype: np.dtype
+            See documentation for :py:meth:`~.VariantTable.from_columns`
+        num_variants: int
+            The number of values in each column
+        columns: dict[str, list | npt.NDArray]
+            See documentation for :py:meth:`~.VariantTable.from_columns`
+        """
+        self.dtype = dtype
+        self.contigs = np.array([], dtype=np.str_)
+        self._codes = np.zeros(num_variants, dtype=np.uint8)
+        self._strings = {}
+        self._columns = {}
+        for name in self.dtype.names:
+            if name in self.CATEGORICAL:
+                self.contigs, codes = np.unique(columns[name], return_inverse=True)
+                self._codes = codes.astype(self._code_dtype(len(self.contigs)))
+            elif name in self.ALLELES or self.dtype[name].kind == "U":
+                self._strings[name] = self._encode(columns[name])
+            else:
+                self._columns[name] = np.asarray(columns[name], dtype=self.dtype[name])
+
+    @classmethod
+    def concatenate(cls, tables: list[VariantTable]) -> VariantTable:
+        """
+        Concatenate a list of tables with the same dtype into a single table
+
+        Parameters
+        ----------
+        tables: list[VariantTable]
+            The tables to concatenate, in order
+
+        Returns
+        -------
+        VariantTable
+            A table containing all of the variants in each of the tables
+        """
+        table = object.__new__(cls)
+        table.dtype = tables[0].dtype
+        table.contigs = np.unique(np.concatenate([tbl.contigs for tbl in tables]))
+        code_dtype = cls._code_dtype(len(table.contigs))
+        # recode the contigs of each table according to the combined list of contigs
+        table._codes = np.concatenate(
+            [
+                np.searchsorted(table.contigs, tbl.contigs).astype(code_dtype)[
+                    tbl._codes
+                ]
+                for tbl in tables
+            ]
+        ).astype(code_dtype)
+        table._columns = {
+            name: np.concatenate([tbl._columns[name] for tbl in tables])
+            for name in tables[0]._columns
+        }
+        table._strings = {}
+        for name in tables[0]._strings:
+            offsets, buffers = [np.zeros(1, dtype=np.int64)], []
+            total = 0
+            for tbl in tables:
+                off, buf = tbl._strings[name]
+                buffers.append(buf[off[0] : off[-1]])
+                offsets.append(off[1:] - off[0] + total)
+                total += off[-1] - off[0]
+            table._strings[name] = (np.concatenate(offsets), np.concatenate(buffers))
+        return table
+
+    def save(self, dirname: Path | str):
+        """
+        Write the table to a directory containing a .npy file for each of its arrays
+
+        Parameters
+        ----------
+        dirname: Path | str
+            The path to the directory. It is replaced if it already exists.
+        """
+        arrays = {
+            "dtype": np.array(json.dumps(self.dtype.descr)),
+            "contigs": self.contigs,
+            "codes": self._codes,
+        }
+        for name, (offsets, buffer) in self._strings.items():
+            arrays[f"offsets.{name}"] = offsets - offsets[0]
+            arrays[f"buffer.{name}"] = buffer[offsets[0] : offsets[-1]]
+        for name, column in self._columns.items():
+            arrays[f"column.{name}"] = column
+        self._save_arrays(dirname, arrays)
+
+    @classmethod
+    def load(cls, dirname: Path | str) -> VariantTable:
+        """
+        Load a table from a directory created by :py:meth:`~.VariantTable.save`
+
+        The arrays in the directory are memory-mapped rather than read into memory
+
+        Parameters
+        ----------
+        dirname: Path | str
+            The path to the directory
+
+        Returns
+        -------
+        VariantTable
+            The table stored in the directory
+        """
+        arrays = cls._load_arrays(dirname)
+        table = object.__new__(cls)
+        table.dtype = np.dtype(
+            [tuple(field) for field in json.loads(str(arrays["dtype"]))]
+        )
+        table.contigs = np.asarray(arrays["contigs"])
+        table._codes = arrays["codes"]
+        table._strings = {}
+        table._columns = {}
+        for key, arr in arrays.items():
+            kind, _, name = key.partition(".")
+            if kind == "offsets":
+                table._strings[name] = (arr, arrays[f"buffer.{name}"])
+            elif kind == "column":
+                table._columns[name] = arr
+        return table
+
+    @staticmethod
+    def _save_arrays(dirname: Path | str, arrays: dict[str, npt.NDArray]):
+        """
+        Write each of a set of arrays to its own .npy file within a directory
+
+        The files are written to a temporary directory first and then moved into
+        place, so that readers never see a partially written directory
+
+        Parameters
+        ----------
+        dirname: Path | str
+            The path to the directory. It is replaced if it already exists.
+        arrays: dict[str, npt.NDArray]
+            The arrays to write, keyed by their names
+        """
+        dirname = Path(dirname)
+        tmp_dir = Path(tempfile.mkdtemp(dir=dirname.parent, prefix=".tmp-"))
+        try:
+            for name, arr in arrays.items():
+                np.save(tmp_dir / f"{name}.npy", arr, allow_pickle=False)
+            if dirname.is_dir():
+                shutil.rmtree(dirname)
+            os.rename(tmp_dir, dirname)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _load_arrays(dirname: Path | str) -> dict[str, npt.NDArray]:
+        """
+        Memory-map each of the arrays in a directory created by
+        :py:meth:`~.VariantTable._save_arrays`
+
+        Parameters
+        ----------
+        dirname: Path | str
+            The path to the directory
+
+        Returns
+        -------
+        dict[str, npt.NDArray]
+            The arrays in the directory, keyed by their names
+        """
+        arrays = {}
+        for fname in Path(dirname).glob("*.npy"):
+            try:
+                arr = np.load(fname, mmap_mode="r", allow_pickle=False)
+            except ValueError:
+                # empty arrays can't be memory-mapped, but they're small anyway
+                arr = np.load(fname, allow_pickle=False)
+            if not arr.ndim:
+                # scalars are easier to use when they aren't memory-mapped
+                arr = np.asarray(arr).copy()
+            arrays[fname.name[: -len(".npy")]] = arr
+        return arrays
+
+    @staticmethod
+    def _code_dtype(num_contigs: int) -> np.dtype:
+        """
+        Choose the smallest unsigned integer dtype that can hold each contig code
+
+        Parameters
+        ----------
+        num_contigs: int
+            The number of contigs
+
+        Returns
+        -------
+        np.dtype
+            An unsigned integer dtype
+        """
+        for dtype in (np.uint8, np.uint16):
+            if num_contigs <= np.iinfo(dtype).max + 1:
+                return dtype
+        return np.uint32
+
+    @staticmethod
+    def _encode(
+        strings: Iterator[str],
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.uint8]]:
+        """
+        Concatenate a sequence of strings into a single buffer of UTF-8 bytes
+
+        Parameters
+        ----------
+        strings: Iterator[str]
+            The strings to encode
+
+        Returns
+        -------
+        tuple[npt.NDArray[np.int64], npt.NDArray[np.uint8]]
+            An array of n+1 offsets into the buffer and the buffer itself. The bytes
+            of the i-th string are stored in buffer[offsets[i]:offsets[i+1]].
+        """
+        strings = list(strings)
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        try:
+            # numpy can encode ASCII strings into a zero-padded matrix all at once
+            padded = np.array(strings, dtype=np.bytes_).reshape(len(strings))
+        except UnicodeEncodeError:
+            encoded = [string.encode() for string in strings]
+            np.cumsum([len(string) for string in encoded], out=offsets[1:])
+            return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        lengths = np.char.str_len(padded)
+        np.cumsum(lengths, out=offsets[1:])
+        width = padded.dtype.itemsize
+        padded = padded.view(np.uint8).reshape((len(strings), width))
+        return offsets, padded[np.arange(width) < lengths[:, np.newaxis]]
+
+    @staticmethod
+    def _decode(offsets: npt.NDArray[np.int64], buffer: npt.NDArray[np.uint8]):
+        """
+        Decode a buffer of concatenated strings into an array of byte strings
+
+        This is the inverse of :py:meth:`~.VariantTable._encode`
+
+        Parameters
+        ----------
+        offsets: npt.NDArray[np.int64]
+            The n+1 offsets of the strings in the buffer
+        buffer: npt.NDArray[np.uint8]
+            The buffer of bytes
+
+        Returns
+        -------
+        npt.NDArray
+            An array of n byte strings
+        """
+        lengths = np.diff(offsets)
+        width = int(lengths.max(initial=1))
+        # copy the bytes of each string into its own row of a zero-padded matrix
+        padded = np.zeros((len(lengths), width), dtype=np.uint8)
+        padded[np.arange(width) < lengths[:, np.newaxis]] = buffer[
+            offsets[0] : offsets[-1]
+        ]
+        return padded.view(f"S{width}").ravel()
+
+    @staticmethod
+    def _take(
+        offsets: npt.NDArray[np.int64], buffer: npt.NDArray[np.uint8], idx: npt.NDArray
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.uint8]]:
+        """
+        Gather a subset of the strings in a buffer into a new buffer
+
+        Parameters
+        ----------
+        offsets: npt.NDArray[np.int64]
+            The n+1 offsets of the strings in the buffer
+        buffer: npt.NDArray[np.uint8]
+            The buffer of bytes
+        idx: npt.NDArray
+            The indices of the strings to gather
+
+        Returns
+        -------
+        tuple[npt.NDArray[np.int64], npt.NDArray[np.uint8]]
+            The offsets and buffer of the gathered strings
+        """
+        starts = offsets[:-1][idx]
+        lengths = offsets[1:][idx] - starts
+        new_offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_offsets[1:])
+        positions = np.repeat(starts - new_offsets[:-1], lengths)
+        positions += np.arange(new_offsets[-1])
+        return new_offsets, buffer[positions]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def shape(self) -> tuple[int]:
+        return (len(self),)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The total number of bytes used to store the table
+        """
+        strings = sum(off.nbytes + buf.nbytes for off, buf in self._strings.values())
+        columns = sum(column.nbytes for column in self._columns.values())
+        return self.contigs.nbytes + self._codes.nbytes + strings + columns
+
+    def __repr__(self) -> str:
+        return f"VariantTable({len(self)} variants, fields={self.dtype.names})"
+
+    def column(self, name: str, truncate: bool = True) -> npt.NDArray:
+        """
+        Decode a field of the table into a numpy array
+
+        Parameters
+        ----------
+        name: str
+            The name of the field
+        truncate: bool, optional
+            Whether to truncate strings to the width of their field in
+            :py:attr:`~.VariantTable.dtype`, just like a structured array would
+
+        Returns
+        -------
+        npt.NDArray
+            An array with the same dtype as the field in :py:attr:`~.VariantTable.dtype`
+        """
+        dtype = self.dtype[name]
+        if name in self.CATEGORICAL:
+            return self.contigs[self._codes].astype(dtype)
+        if name in self._columns:
+            return self._columns[name]
+        strings = self._decode(*self._strings[name])
+        try:
+            strings = strings.astype(np.str_)
+        except UnicodeDecodeError:
+            # numpy can only convert ASCII strings on its own
+            strings = np.char.decode(strings, "utf-8")
+        if name in self.ALLELES:
+            column = np.empty(len(strings), dtype=object)
+            for idx, alleles in enumerate(strings.tolist()):
+                column[idx] = tuple(alleles.split(","))
+            return column
+        return strings.astype(dtype) if truncate else strings
+
+    def take(self, idx: npt.NDArray | slice) -> VariantTable:
+        """
+        Create a new table containing a subset of the variants in this one
+
+        Parameters
+        ----------
+        idx: npt.NDArray | slice
+            The indices of the variants to keep, a boolean mask, or a slice
+
+        Returns
+        -------
+        VariantTable
+            A table containing only the requested variants
+        """
+        table = object.__new__(self.__class__)
+        table.dtype = self.dtype
+        table.contigs = self.contigs
+        table._codes = self._codes[idx]
+        table._columns = {name: col[idx] for name, col in self._columns.items()}
+        if isinstance(idx, slice) and idx.step in (None, 1):
+            # a contiguous range can share the buffer, so nothing needs to be copied
+            start, stop, _ = idx.indices(len(self))
+            stop = max(start, stop)
+            table._strings = {
+                name: (off[start : stop + 1], buf)
+                for name, (off, buf) in self._strings.items()
+            }
+        else:
+            idx = np.arange(len(self))[idx]
+            table._strings = {
+                name: self._take(off, buf, idx)
+                for name, (off, buf) in self._strings.items()
+            }
+        return table
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        if isinstance(key, (int, np.integer)):
+            idx = np.arange(len(self))[key]
+            return self.take(np.array([idx])).__array__()[0]
+        if isinstance(key, list) and len(key) and isinstance(key[0], str):
+            # a list of field names, just like in a structured array
+            arr = np.empty(len(self), dtype=[(name, self.dtype[name]) for name in key])
+            for name in key:
+                arr[name] = self.column(name)
+            return arr
+        return self.take(key)
+
+    def __iter__(self, chunk_size: int = 10000) -> Iterator[np.void]:
+        # decode the records a chunk at a time, to bound memory usage
+        for start in range(0, len(self), chunk_size):
+            yield from self.take(slice(start, start + chunk_size)).__array__()
+
+    def __array__(self, dtype: np.dtype = None, copy: bool = None) -> npt.NDArray:
+        arr = np.empty(len(self), dtype=self.dtype)
+        for name in self.dtype.names:
+            arr[name] = self.column(name)
+        if dtype is not None:
+            arr = arr.astype(dtype)
+        return arr
@@ -74,6 +74,7 @@ def calc_ld(
     samples: set[str] = None,
     ids: tuple[str] = None,
     chunk_size: int = None,
+    cache_dir: Path = None,
     discard_missing: bool = False,
     from_gts: bool = False,
     output: Path = Path("/dev/stdout"),
@@ -109,6 +110,12 @@ def calc_ld(
         If this value is provided, variants from the PGEN file will be loaded in
         chunks so as to use less memory. This argument is ignored if the genotypes are
         not in PGEN format.
+    cache_dir: Path, optional
+        A directory in which to cache the genotypes after they are read
+
+        If provided, later runs with the same genotypes file and parameters will load
+        the genotypes from this directory instead of parsing the file again. See
+        :py:class:`~.data.GenotypesCache` for more details.
     discard_missing : bool, optional
         Discard any samples that are missing any of the required genotypes
 
@@ -188,10 +195,12 @@ def calc_ld(
         log.info("Loading genotypes from VCF/BCF file")
         gt = data.GenotypesVCF(fname=genotypes, log=log)
     # gt._prephased = True
-    gt.read(region=region, samples=samples, variants=variants)
-    gt.check_missing(discard_also=discard_missing)
-    gt.check_biallelic()
-    gt.check_phase()
+    if cache_dir is not None:
+        cache = data.GenotypesCache(cache_dir, log=log)
+        gt.read_cached(cache, region=region, samples=samples, variants=variants)
+    else:
+        gt.read(region=region, samples=samples, variants=variants)
+    gt.qc(discard_missing=discard_missing)
 
     # check that all of the variants were loaded successfully and warn otherwise
     if variants and len(variants) < len(gt.variants):
@@ -133,7 +133,11 @@ def output_vcf(
         if pop_field:
             output_pops = np.empty((int(len(breakpoints)//2), len(vcf.variants), 2), dtype=np.uint8)
         if sample_field:
-            output_labels = np.empty((int(len(breakpoints)//2), len(vcf.variants), 2), dtype=object)
+            # store the reference haplotype of each allele as an index into hap_labels
+            # instead of as a string; the strings are only created when writing
+            hap_labels = tuple(sample for sample in vcf.samples for strand in range(2))
+            label_dtype = np.min_scalar_type(max(len(hap_labels) - 1, 0))
+            output_labels = np.empty((int(len(breakpoints)//2), len(vcf.variants), 2), dtype=label_dtype)
 
     # cover "chr" prefix cases
     if ref_vars["chrom"][0].startswith("chr"):
@@ -148,7 +152,7 @@ def output_vcf(
         if pop_field:
             ref_pops = np.empty((len(ref_vars), ), dtype=np.uint8)
         if sample_field:
-            ref_labels = np.empty((len(ref_vars), ), dtype=object)
+            ref_labels = np.empty((len(ref_vars), ), dtype=output_labels.dtype)
         # convert vcf variant chroms to ints 
         for chrom in chroms:
             # limit reference vcf variants to current chrom
@@ -188,7 +192,7 @@ def output_vcf(
                 ref_pops_chrom = np.repeat(hap_pops, inter_len)
                 ref_pops[cur_var:end_var] = ref_pops_chrom
             if sample_field:
-                ref_labels_chrom = np.repeat(hap_samples_name, inter_len)
+                ref_labels_chrom = ref_sample_inds_chrom * 2 + ref_sample_haps_chrom
                 ref_labels[cur_var:end_var] = ref_labels_chrom
             cur_var = end_var
 
@@ -206,17 +210,15 @@ def output_vcf(
     gts = None
     if not out.endswith(".pgen"):
         # Setup Genotypes class to hold our genotype data
+        if pop_field or sample_field:
+            gts = GenotypesAncestry(out, log=log)
         if pop_field:
             # Initialize Ancestry pops matrix 
-            gts = GenotypesAncestry(out, log=log)
             gts.popnum_ancestry = pop_dict
             gts.ancestry = output_pops
-
-        # Setup Genotypes class to hold our genotype data
         if sample_field:
-            if gts is None:
-                gts = GenotypesAncestry(out, log=log)
-                gts.valid_labels = output_labels
+            gts.valid_labels = output_labels
+            gts.haplotype_labels = hap_labels
 
         if not pop_field and not sample_field:
             gts = GenotypesVCF(out, log=log)
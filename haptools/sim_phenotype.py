@@ -15,6 +15,7 @@ from .data import (
     GenotypesTR,
     GenotypesPLINK,
     GenotypesPLINKTR,
+    GenotypesCache,
     Repeat as RepeatBase,
     Haplotype as HaplotypeBase,
 )
@@ -306,6 +307,7 @@ def simulate_pt(
     samples: set[str] = None,
     haplotype_ids: set[str] = None,
     chunk_size: int = None,
+    cache_dir: Path = None,
     repeats: Path = None,
     seed: int = None,
     output: Path = Path("-"),
@@ -366,6 +368,12 @@ def simulate_pt(
         If this value is provided, variants from the PGEN file will be loaded in
         chunks so as to use less memory. This argument is ignored if the genotypes are
         not in PGEN format.
+    cache_dir: Path, optional
+        A directory in which to cache the genotypes after they are read
+
+        If provided, later runs with the same genotypes file and parameters will load
+        the genotypes from this directory instead of parsing the file again. See
+        :py:class:`~.data.GenotypesCache` for more details.
     repeats: Path, optional
         The path to a genotypes file containing tandem repeats. This is only necessary
         when simulating both haplotypes *and* repeats as causal effects
@@ -431,7 +439,11 @@ def simulate_pt(
             gt = Genotypes(fname=genotypes, log=log)
 
     # gt._prephased = True
-    gt.read(region=region, samples=samples, variants=haplotype_ids)
+    cache = None if cache_dir is None else GenotypesCache(cache_dir, log=log)
+    if cache is not None:
+        gt.read_cached(cache, region=region, samples=samples, variants=haplotype_ids)
+    else:
+        gt.read(region=region, samples=samples, variants=haplotype_ids)
     log.info("QC-ing genotypes")
     gt.check_missing()
 
@@ -443,7 +455,12 @@ def simulate_pt(
         else:
             log.info("Loading repeat genotypes from VCF/BCF file")
             tr_gt = GenotypesTR(fname=repeats, log=log)
-        tr_gt.read(region=region, samples=samples, variants=haplotype_ids)
+        if cache is not None:
+            tr_gt.read_cached(
+                cache, region=region, samples=samples, variants=haplotype_ids
+            )
+        else:
+            tr_gt.read(region=region, samples=samples, variants=haplotype_ids)
         tr_gt.check_missing()
         gt = Genotypes.merge_variants((gt, tr_gt), fname=None)
 
@@ -166,8 +166,13 @@ class GenotypesAncestry(data.GenotypesVCF):
     variants : np.array
         See documentation for :py:attr:`~.GenotypesVCF.variants`
     valid_labels: np.array
-        Reference VCF sample and respective variant grabbed for
-        each sample.
+        The reference haplotype from which each allele in each sample of
+        :py:attr:`~.GenotypesAncestry.data` was drawn, encoded as an index into
+        :py:attr:`~.GenotypesAncestry.haplotype_labels`
+
+        The haplotype at index i is strand i % 2 of the reference sample i // 2
+    haplotype_labels: tuple[str]
+        The label of each reference haplotype, as written to the SAMPLE field
     ancestry : np.array
         The ancestral population of each allele in each sample of
         :py:attr:`~.GenotypesAncestry.data`
@@ -179,11 +184,56 @@ class GenotypesAncestry(data.GenotypesVCF):
         super().__init__(fname, log)
         self.ancestry = None
         self.valid_labels = None
+        self.haplotype_labels = None
         # goes from population code to encoding number
         self.ancestry_labels = {}
         # goes from encoding number to population code
         self.popnum_ancestry = {}
 
+    def _decode_ancestry(
+        self, pops: npt.NDArray, lookup: dict, out: npt.NDArray = None
+    ) -> npt.NDArray:
+        """
+        Encode the POP field of a record as an n x 2 matrix of population codes
+
+        Only the distinct values of the field are split and looked up, since a record
+        usually has far fewer of them than samples
+
+        Parameters
+        ----------
+        pops: npt.NDArray
+            The POP field of each sample in the record, as returned by cyvcf2
+        lookup: dict
+            A cache mapping the POP values that have already been seen to their pair of
+            population codes
+
+            It is updated in place, so that it can be reused for the next record
+        out: npt.NDArray, optional
+            A preallocated n x 2 np.uint8 array into which the codes should be written
+
+        Returns
+        -------
+        npt.NDArray[np.uint8]
+            The code of the ancestral population of each allele in each sample
+        """
+        values, first, inverse = np.unique(pops, return_index=True, return_inverse=True)
+        pairs = np.empty((len(values), 2), dtype=np.uint8)
+        # visit the values in the order that they appear, so that populations are
+        # encoded in the order that they are first seen
+        for i in np.argsort(first):
+            value = values[i]
+            if value not in lookup:
+                codes = []
+                for pop in value.split(","):
+                    if pop not in self.ancestry_labels:
+                        pop_count = len(self.ancestry_labels)
+                        self.ancestry_labels[pop] = pop_count
+                        self.popnum_ancestry[pop_count] = pop
+                    codes.append(self.ancestry_labels[pop])
+                lookup[value] = codes
+            pairs[i] = lookup[value]
+        return np.take(pairs, inverse.ravel(), axis=0, out=out)
+
     def _iterate(self, vcf: VCF, region: str = None, variants: set[str] = None):
         """
         See documentation for :py:meth:`~.Genotypes._iterate`
@@ -191,10 +241,10 @@ class GenotypesAncestry(data.GenotypesVCF):
         self.log.info(f"Loading genotypes from {len(self.samples)} samples")
         Record = namedtuple("Record", "data ancestry variants")
         num_seen = 0
-        pop_count = 0
+        lookup = {}
         # iterate over each line in the VCF
         # note, this can take a lot of time if there are many samples
-        for variant in vcf(region):
+        for variant in self._vcf_iter(vcf, region, variants):
             if variants is not None and variant.ID not in variants:
                 if num_seen >= len(variants):
                     # exit early if we've already found all the variants
@@ -207,23 +257,111 @@ class GenotypesAncestry(data.GenotypesVCF):
             # 1) presence of REF in strand one
             # 2) presence of REF in strand two
             # 3) whether the genotype is phased (if self._prephased is False)
-            data = np.array(variant.genotypes, dtype=np.uint8)
-            data = data[:, : (2 + (not self._prephased))]
+            data = self._return_data(variant)
+            data = data[:, : (2 + (not self._prephased))].astype(np.uint8)
             # also extract the ancestral population of each variant in each individual
-            ancestry = np.empty((data.shape[0], 2), dtype=np.uint8)
-            for i, sample in enumerate(variant.format("POP")):
-                pops = sample.split(",")
-                for pop in pops:
-                    if pop not in self.ancestry_labels:
-                        self.ancestry_labels[pop] = pop_count
-                        self.popnum_ancestry[pop_count] = pop
-                        pop_count += 1
-                ancestry[i] = tuple(map(self.ancestry_labels.get, pops))
+            ancestry = self._decode_ancestry(variant.format("POP"), lookup)
             # finally, output everything
             yield Record(data, ancestry, variant_arr)
             num_seen += 1
         vcf.close()
 
+    def _iterate_blocks(
+        self,
+        vcf: VCF,
+        region: str = None,
+        variants: set[str] = None,
+        chunk_size: int = 1000,
+        out: npt.NDArray = None,
+        min_pos: int = None,
+        out_ancestry: npt.NDArray = None,
+    ):
+        """
+        See documentation for :py:meth:`~.Genotypes._iterate_blocks`
+
+        Each block also contains a view into a buffer of shape chunk_size x n x 2
+        holding the ancestral population of each allele. Like the genotypes, the
+        population codes of each record are decoded straight into this buffer, which
+        is reused for every block.
+
+        Parameters
+        ----------
+        out_ancestry: npt.NDArray, optional
+            A preallocated np.uint8 array of shape p x n x 2 into which the ancestral
+            population of each allele should be written, in order
+
+            This must have the same length as the out parameter, if one is provided
+        """
+        self.log.info(f"Loading genotypes from {len(self.samples)} samples")
+        Block = namedtuple("Block", "data ancestry variants")
+        num_cols = 2 + (not self._prephased)
+        reuse = out is None
+        if reuse:
+            out = np.empty((chunk_size, len(self.samples), num_cols), dtype=np.uint8)
+        ancestry = out_ancestry
+        if ancestry is None:
+            ancestry = np.empty((len(out), len(self.samples), 2), dtype=np.uint8)
+        num_seen = 0
+        start = idx = 0
+        block = []
+        lookup = {}
+        if not len(out):
+            vcf.close()
+            return
+        # iterate over each line in the VCF
+        # note, this can take a lot of time if there are many samples
+        for variant in self._vcf_iter(vcf, region, variants):
+            if min_pos is not None and variant.POS < min_pos:
+                continue
+            if variants is not None and variant.ID not in variants:
+                if num_seen >= len(variants):
+                    # exit early if we've already found all the variants
+                    break
+                continue
+            # see _iterate() for a description of the last dimension
+            out[idx] = self._return_data(variant)[:, :num_cols]
+            self._decode_ancestry(variant.format("POP"), lookup, out=ancestry[idx])
+            block.append(self._variant_tuple(variant))
+            idx += 1
+            num_seen += 1
+            if len(block) == chunk_size or idx == len(out):
+                yield Block(out[start:idx], ancestry[start:idx], block)
+                block = []
+                if reuse:
+                    idx = 0
+                elif idx == len(out):
+                    # there isn't any room left in the buffer
+                    break
+                start = idx
+        if len(block):
+            yield Block(out[start:idx], ancestry[start:idx], block)
+        vcf.close()
+
+    def _iterate_chunks(
+        self,
+        vcf: VCF,
+        region: str = None,
+        variants: set[str] = None,
+        chunk_size: int = 1000,
+    ):
+        """
+        See documentation for :py:meth:`~.Genotypes._iterate_chunks`
+
+        Each chunk also contains an n x c x 2 matrix of the ancestral population of
+        each allele
+        """
+        Chunk = namedtuple("Chunk", "data ancestry variants")
+        for block in self._iterate_blocks(vcf, region, variants, chunk_size):
+            variants_arr = np.empty((len(block.variants),), dtype=self.variants.dtype)
+            variants_arr[:] = block.variants
+            # copy the genotypes and ancestry out of the reused buffers, so that
+            # samples are rows and variants are columns
+            yield Chunk(
+                block.data.transpose((1, 0, 2)).copy(),
+                block.ancestry.transpose((1, 0, 2)).copy(),
+                variants_arr,
+            )
+
     def read(
         self,
         region: str = None,
@@ -235,60 +373,60 @@ class GenotypesAncestry(data.GenotypesVCF):
         See documentation for :py:meth:`~.Genotypes.read`
         """
         super(data.Genotypes, self).read()
-        records = self.__iter__(region=region, samples=samples, variants=variants)
+        vcf = self._open_vcf(samples)
         if variants is not None:
             max_variants = len(variants)
+        elif max_variants is None:
+            max_variants = self._num_records(vcf, region)
+        num_cols = 2 + (not self._prephased)
+        num_samps = len(self.samples)
+        num_seen = 0
         # check whether we can preallocate memory instead of making copies
         if max_variants is None:
-            self.log.warning(
-                "The max_variants parameter was not specified. We have no choice but to"
-                " append to an ever-growing array, which can lead to memory overuse!"
+            self.log.debug(
+                "Couldn't determine the number of variants ahead of time. The arrays "
+                "will be resized as records are read."
             )
-            variants_arr = []
-            data_arr = []
-            ancestry_arr = []
-            for rec in records:
-                variants_arr.append(rec.variants)
-                data_arr.append(rec.data)
-                ancestry_arr.append(rec.ancestry)
-            self.log.info(f"Copying {len(variants_arr)} variants into np arrays.")
-            # convert to np array for speedy operations later on
-            self.variants = np.array(variants_arr, dtype=self.variants.dtype)
-            self.data = np.array(data_arr, dtype=np.uint8)
-            self.ancestry = np.array(ancestry_arr, dtype=np.uint8)
+            capacity = 0
+            self.variants = np.empty((capacity,), dtype=self.variants.dtype)
+            self.data = np.empty((capacity, num_samps, num_cols), dtype=np.uint8)
+            self.ancestry = np.empty((capacity, num_samps, 2), dtype=np.uint8)
+            for block in self._iterate_blocks(vcf, region, variants):
+                end = num_seen + len(block.variants)
+                if end > capacity:
+                    # grow the arrays geometrically, so that the number of resizes is
+                    # only logarithmic in the number of records
+                    capacity = max(end, 2 * capacity)
+                    self.log.debug(f"Resizing arrays to hold {capacity} variants")
+                    self._resize(capacity)
+                self.data[num_seen:end] = block.data
+                self.ancestry[num_seen:end] = block.ancestry
+                self.variants[num_seen:end] = block.variants
+                num_seen = end
         else:
             # preallocate arrays! this will save us lots of memory and speed b/c
             # appends can sometimes make copies
             self.variants = np.empty((max_variants,), dtype=self.variants.dtype)
             # in order to check_phase() later, we must store the phase info, as well
-            self.data = np.empty(
-                (max_variants, len(self.samples), (2 + (not self._prephased))),
-                dtype=np.uint8,
-            )
-            self.ancestry = np.empty(
-                (max_variants, len(self.samples), 2),
-                dtype=np.uint8,
-            )
-            self.valid_labels = np.empty(
-                (max_variants, len(self.samples), 2),
-                dtype=object,
+            self.data = np.empty((max_variants, num_samps, num_cols), dtype=np.uint8)
+            self.ancestry = np.empty((max_variants, num_samps, 2), dtype=np.uint8)
+            # the genotypes and ancestry are decoded directly into self.data and
+            # self.ancestry, so we only need to copy the variant metadata from each block
+            for block in self._iterate_blocks(
+                vcf, region, variants, out=self.data, out_ancestry=self.ancestry
+            ):
+                end = num_seen + len(block.variants)
+                self.variants[num_seen:end] = block.variants
+                num_seen = end
+            # the last block is a view into self.data and self.ancestry, which would
+            # prevent us from resizing them in place
+            block = None
+        if len(self.data) > num_seen:
+            self.log.info(
+                f"Removing {len(self.data)-num_seen} unneeded variant records that "
+                "were preallocated."
             )
-            num_seen = 0
-            for rec in records:
-                if num_seen >= max_variants:
-                    break
-                self.variants[num_seen] = rec.variants
-                self.data[num_seen] = rec.data
-                self.ancestry[num_seen] = rec.ancestry
-                num_seen += 1
-            if max_variants > num_seen:
-                self.log.info(
-                    f"Removing {max_variants-num_seen} unneeded variant records that "
-                    "were preallocated b/c max_variants was specified."
-                )
-                self.variants = self.variants[:num_seen]
-                self.data = self.data[:num_seen]
-                self.ancestry = self.ancestry[:num_seen]
+            self._resize(num_seen)
         if 0 in self.data.shape:
             self.log.warning(
                 "Failed to load genotypes. If you specified a region, check that the"
@@ -299,6 +437,15 @@ class GenotypesAncestry(data.GenotypesVCF):
         self.data = self.data.transpose((1, 0, 2))
         self.ancestry = self.ancestry.transpose((1, 0, 2))
 
+    def _resize(self, num_variants: int):
+        """
+        See documentation for :py:meth:`~.Genotypes._resize`
+
+        The ancestry labels are resized along with the genotypes
+        """
+        super()._resize(num_variants)
+        self._resize_attr("ancestry", num_variants)
+
     def subset(
         self,
         samples: tuple[str] = None,
@@ -415,10 +562,163 @@ class GenotypesAncestry(data.GenotypesVCF):
             )
         self.data = self.data.astype(np.bool_)
 
-    def write(self, chroms=None):
-        # Assumption is the data must be phased
+    def qc(
+        self,
+        discard_missing: bool = False,
+        discard_multiallelic: bool = False,
+    ):
+        """
+        See documentation for :py:meth:`~.Genotypes.qc`
+
+        The ancestry labels must be discarded along with the genotypes, so each of the
+        checks is performed separately. Thus, unlike in the parent class, the genotypes
+        are not scanned in chunks and there is no chunk_size parameter.
+        """
+        self.check_missing(discard_also=discard_missing)
+        self.check_biallelic(discard_also=discard_multiallelic)
+        self.check_phase()
+
+    def _format_header(self, contigs: list[str], samples: tuple[str] = None) -> str:
+        """
+        See documentation for :py:meth:`~.GenotypesVCF._format_header`
+
+        The POP and SAMPLE FORMAT fields are also declared if there is data for them
+        """
+        header = super()._format_header(contigs, samples)
+        formats = ""
+        if self.ancestry is not None:
+            formats += (
+                '##FORMAT=<ID=POP,Number=2,Type=String,Description="Origin Population'
+                ' of each respective allele in GT">\n'
+            )
+        if self.valid_labels is not None:
+            formats += (
+                '##FORMAT=<ID=SAMPLE,Number=2,Type=String,Description="Origin sample'
+                ' and haplotype of each respective allele in GT">\n'
+            )
+        columns = header.rindex("#CHROM")
+        return header[:columns] + formats + header[columns:]
+
+    @staticmethod
+    def _add_pair(fields: npt.NDArray, pair: npt.NDArray) -> npt.NDArray:
+        """
+        Append a FORMAT field with two values to an array of FORMAT fields
+
+        Parameters
+        ----------
+        fields: npt.NDArray
+            A p (variants) x n (samples) array of byte strings
+        pair: npt.NDArray
+            A p x n x 2 array of the byte strings to append
+
+        Returns
+        -------
+        npt.NDArray
+            The fields, with the values of the pair separated by a comma
+        """
+        fields = np.char.add(np.char.add(fields, b":"), pair[:, :, 0])
+        return np.char.add(np.char.add(fields, b","), pair[:, :, 1])
+
+    def append_chunk(
+        self,
+        data: npt.NDArray,
+        variants: npt.NDArray,
+        ancestry: npt.NDArray = None,
+        labels: npt.NDArray = None,
+    ):
+        """
+        See documentation for :py:meth:`~.GenotypesVCF.append_chunk`
+
+        Unlike in the parent class, the chunks cannot be written to a BCF
+
+        Parameters
+        ----------
+        ancestry: npt.NDArray, optional
+            A p (variants) x n (samples) x 2 matrix of the ancestral population of
+            each allele, encoded according to
+            :py:attr:`~.GenotypesAncestry.popnum_ancestry`
+        labels: npt.NDArray, optional
+            A p (variants) x n (samples) x 2 matrix of the origin haplotype of each
+            allele, encoded as in :py:attr:`~.GenotypesAncestry.valid_labels`
+        """
+        if (ancestry is None and labels is None) or not len(self.samples):
+            super().append_chunk(data, variants)
+            return
+        vcf, is_pysam, num_written, _ = self._writer
+        if is_pysam:
+            raise ValueError("POP and SAMPLE fields can only be written to a VCF")
+        num_written[0] += len(variants)
+        keys = ["GT"]
+        fields = self._gt_fields(data)
+        if ancestry is not None:
+            keys.append("POP")
+            pops = np.full(np.iinfo(np.uint8).max + 1, b".", dtype=object)
+            for code, pop in self.popnum_ancestry.items():
+                pops[code] = pop.encode()
+            fields = self._add_pair(fields, pops.astype(bytes)[ancestry])
+        if labels is not None:
+            keys.append("SAMPLE")
+            # the strings are only created for the current chunk of variants
+            names = np.array([name.encode() for name in self.haplotype_labels])
+            fields = self._add_pair(fields, names[labels])
+        lines = self._format_variants(variants, suffix=f"\t{':'.join(keys)}\t")
+        fields = self._join_fields(fields)
+        vcf.write(b"".join(line.encode() + gt for line, gt in zip(lines, fields)))
+
+    def write(self, chroms: list[str] = None, chunk_size: int = 1000):
         """
         Write the variants in this class to a VCF at :py:attr:`~.GenotypesAncestry.fname`
+
+        The GT, POP, and SAMPLE fields are rendered for a chunk of variants at a time
+
+        Parameters
+        ----------
+        chroms: list[str], optional
+            The contigs to declare in the header of the VCF, with or without a "chr"
+            prefix
+
+            Defaults to all of the contigs in :py:attr:`~.GenotypesAncestry.variants`
+        chunk_size: int, optional
+            The max number of variants to format at once
+        """
+        if str(self.fname).endswith(".bcf"):
+            # BCF is a binary format, so its records must be encoded by pysam
+            self._write_pysam(chroms)
+            return
+        contigs = self._contigs()
+        if chroms:
+            # remove chr in front of seqname if present and compare
+            contigs = [
+                contig
+                for contig in contigs
+                if contig in chroms
+                or (contig.startswith("chr") and contig[3:] in chroms)
+            ]
+        self.open(len(self.variants), contigs)
+        try:
+            for start in range(0, len(self.variants), chunk_size):
+                end = start + chunk_size
+                # pass the variants as rows
+                chunk = self._unpacked_data(start, end).transpose((1, 0, 2))
+                ancestry = labels = None
+                if self.ancestry is not None:
+                    ancestry = self.ancestry[:, start:end].transpose((1, 0, 2))
+                if self.valid_labels is not None:
+                    labels = self.valid_labels[:, start:end].transpose((1, 0, 2))
+                self.append_chunk(chunk, self.variants[start:end], ancestry, labels)
+        finally:
+            self.close()
+
+    def _write_pysam(self, chroms: list[str] = None):
+        """
+        Write the variants in this class to a VCF or BCF through pysam
+
+        This is a helper function for :py:meth:`~.GenotypesAncestry.write`
+
+        Parameters
+        ----------
+        chroms: list[str], optional
+            See documentation for :py:meth:`~.GenotypesAncestry.write`
         """
         vcf = VariantFile(str(self.fname), mode="w")
 
@@ -508,7 +808,8 @@ class GenotypesAncestry(data.GenotypesVCF):
                     )
                 if not self.valid_labels is None:
                     record.samples[sample]["SAMPLE"] = tuple(
-                        self.valid_labels[samp_idx, var_idx, :]
+                        self.haplotype_labels[label]
+                        for label in self.valid_labels[samp_idx, var_idx, :]
                     )
                 # add proper phasing info
                 if phased:
@@ -535,6 +836,7 @@ def transform_haps(
     samples: set[str] = None,
     haplotype_ids: set[str] = None,
     chunk_size: int = None,
+    cache_dir: Path = None,
     discard_missing: bool = False,
     ancestry: bool = False,
     output: Path = Path("-"),
@@ -564,6 +866,13 @@ def transform_haps(
         If this value is provided, variants from the PGEN file will be loaded in
         chunks so as to use less memory. This argument is ignored if the genotypes are
         not in PGEN format.
+    cache_dir: Path, optional
+        A directory in which to cache the genotypes after they are read
+
+        If provided, later runs with the same genotypes file and parameters will load
+        the genotypes from this directory instead of parsing the file again. See
+        :py:class:`~.data.GenotypesCache` for more details. This argument is ignored
+        (with a warning) when the ancestry labels are read from the VCF.
     discard_missing : bool, optional
         Discard any samples that are missing any of the required genotypes
 
@@ -615,7 +924,17 @@ def transform_haps(
         else:
             gt = data.GenotypesVCF(fname=genotypes, log=log)
     # gt._prephased = True
-    gt.read(region=region, samples=samples, variants=variants)
+    if cache_dir is not None and isinstance(gt, GenotypesAncestry):
+        log.warning(
+            "Ignoring the cache directory since genotypes with ancestry labels cannot "
+            "be cached"
+        )
+        cache_dir = None
+    if cache_dir is not None:
+        cache = data.GenotypesCache(cache_dir, log=log)
+        gt.read_cached(cache, region=region, samples=samples, variants=variants)
+    else:
+        gt.read(region=region, samples=samples, variants=variants)
     gt.check_missing(discard_also=discard_missing)
     gt.check_phase()
 
@@ -0,0 +1,154 @@
+from pathlib import Path
+
+import pytest
+import numpy as np
+from click.testing import CliRunner
+
+from haptools import convert
+from haptools.__main__ import main
+from haptools.convert import convert_genotypes
+from haptools.data import GenotypesVCF, GenotypesPLINK
+
+DATADIR = Path(__file__).parent.joinpath("data")
+
+
+def _check_genotypes(fname: Path, expected: GenotypesVCF, gts_class=GenotypesVCF):
+    gts = gts_class(fname)
+    gts.read()
+    gts.check_phase()
+    np.testing.assert_allclose(gts.data, expected.data)
+    assert gts.samples == expected.samples
+    for col in ("chrom", "pos", "id", "alleles"):
+        assert gts.variants[col].tolist() == expected.variants[col].tolist()
+
+
+def test_vcf_to_pgen(capfd):
+    gts_file = DATADIR / "simple.vcf"
+    tmp_file = Path("test_convert.pgen")
+
+    cmd = f"convert --chunk-size 2 {gts_file} {tmp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ""
+    assert result.exit_code == 0
+
+    expected = GenotypesVCF(gts_file)
+    expected.read()
+    expected.check_phase()
+    _check_genotypes(tmp_file, expected, GenotypesPLINK)
+
+    tmp_file.unlink()
+    tmp_file.with_suffix(".pvar").unlink()
+    tmp_file.with_suffix(".psam").unlink()
+
+
+def test_pgen_to_vcf(capfd):
+    gts_file = DATADIR / "simple.pgen"
+    tmp_file = Path("test_convert.vcf")
+
+    cmd = f"convert --chunk-size 2 -s HG00097 -s HG00100 {gts_file} {tmp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ""
+    assert result.exit_code == 0
+
+    expected = GenotypesPLINK(gts_file)
+    expected.read(samples={"HG00097", "HG00100"})
+    expected.check_phase()
+    _check_genotypes(tmp_file, expected)
+
+    tmp_file.unlink()
+
+
+def test_vcf_region(capfd):
+    gts_file = DATADIR / "simple.vcf.gz"
+    tmp_file = Path("test_convert.pgen")
+    region = "1:10115-10117"
+
+    cmd = f"convert --region {region} {gts_file} {tmp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ""
+    assert result.exit_code == 0
+
+    expected = GenotypesVCF(gts_file)
+    expected.read(region=region)
+    expected.check_phase()
+    _check_genotypes(tmp_file, expected, GenotypesPLINK)
+
+    tmp_file.unlink()
+    tmp_file.with_suffix(".pvar").unlink()
+    tmp_file.with_suffix(".psam").unlink()
+
+
+def test_pgen_to_pgen(capfd):
+    gts_file = DATADIR / "simple.pgen"
+    tmp_file = Path("test_convert.pgen")
+
+    cmd = f"convert {gts_file} {tmp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ""
+    assert result.exit_code == 0
+
+    expected = GenotypesPLINK(gts_file)
+    expected.read()
+    expected.check_phase()
+    _check_genotypes(tmp_file, expected, GenotypesPLINK)
+
+    tmp_file.unlink()
+    tmp_file.with_suffix(".pvar").unlink()
+    tmp_file.with_suffix(".psam").unlink()
+
+
+def test_unsupported_format():
+    gts_file = DATADIR / "simple.vcf"
+    tmp_file = Path("test_convert.txt")
+
+    with pytest.raises(ValueError) as info:
+        convert_genotypes(gts_file, tmp_file)
+    assert "Unsupported file extension" in str(info.value)
+    assert not tmp_file.exists()
+
+
+def test_count_mismatch(monkeypatch):
+    gts_file = DATADIR / "simple.vcf"
+    tmp_file = Path("test_convert.vcf")
+
+    # the genotypes should never be silently truncated
+    for num_variants in (2, 6):
+        monkeypatch.setattr(
+            convert, "_scan_variants", lambda *args, **kwargs: (num_variants, ["1"], 2)
+        )
+        with pytest.raises(ValueError) as info:
+            convert_genotypes(gts_file, tmp_file, chunk_size=1)
+        assert f"Expected to convert {num_variants} variants" in str(info.value)
+
+    tmp_file.unlink()
+
+
+def test_multiallelic(capfd):
+    gts_file = DATADIR / "simple-multiallelic.vcf"
+    tmp_file = Path("test_convert.pgen")
+
+    # the PGEN file must be opened for variants with more than two alleles
+    cmd = f"convert --chunk-size 2 {gts_file} {tmp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ""
+    assert result.exit_code == 0
+
+    expected = GenotypesVCF(gts_file)
+    expected.read()
+    expected.check_phase()
+    assert max(map(len, expected.variants["alleles"])) > 2
+    _check_genotypes(tmp_file, expected, GenotypesPLINK)
+
+    tmp_file.unlink()
+    tmp_file.with_suffix(".pvar").unlink()
+    tmp_file.with_suffix(".psam").unlink()
@@ -1,10 +1,13 @@
 import os
+import gzip
+import shutil
 from pathlib import Path
 from dataclasses import dataclass, field
 
 import pytest
 import numpy as np
 import numpy.lib.recfunctions as rfn
+from pysam import BGZFile, VariantFile
 from haptools.sim_phenotype import Haplotype as HaptoolsHaplotype
 from haptools.sim_phenotype import Repeat as HaptoolsRepeat
 from haptools.data import (
@@ -22,6 +25,10 @@ from haptools.data import (
     GenotypesVCF,
     GenotypesPLINK,
     GenotypesPLINKTR,
+    Data,
+    BGZFWriter,
+    VariantTable,
+    GenotypesCache,
 )
 
 
@@ -118,6 +125,60 @@ class TestGenotypes:
         gts.check_phase()
         assert len(caplog.records) > 0 and caplog.records[0].levelname == "WARNING"
 
+    def test_qc_genotypes(self):
+        expected = self._get_expected_genotypes()
+        gts = Genotypes(DATADIR / "simple.vcf")
+        gts.read()
+
+        # a missing GT should be caught before anything else
+        gts.data[1, 1, 1] = 255
+        gts.data[3, 2, 0] = 2
+        gts.data[0, 1, 2] = 0
+        with pytest.raises(ValueError) as info:
+            gts.qc(chunk_size=1)
+        assert (
+            str(info.value)
+            == "Genotype with ID 1:10116:A:G at POS 1:10116 is missing for sample"
+            " HG00097"
+        )
+        # then multiallelic variants
+        gts.data[1, 1, 1] = 1
+        with pytest.raises(ValueError) as info:
+            gts.qc(chunk_size=1)
+        assert (
+            str(info.value)
+            == "Variant with ID 1:10117:C:A at POS 1:10117 is multiallelic for sample"
+            " HG00100"
+        )
+        # and finally unphased hets
+        gts.data[3, 2, 0] = 1
+        with pytest.raises(ValueError) as info:
+            gts.qc(chunk_size=1)
+        assert (
+            str(info.value)
+            == "Variant with ID 1:10116:A:G at POS 1:10116 is unphased for sample"
+            " HG00096"
+        )
+        gts.data[0, 1, 2] = 1
+
+        # discarding the offending samples and variants should be the same as calling
+        # each of the checks in turn
+        gts.data[1, 1, 1] = 255
+        gts.data[3, 2, 0] = 2
+        gts.data[1, 1, 2] = 0
+        expected = Genotypes(DATADIR / "simple.vcf")
+        expected.data = gts.data.copy()
+        expected.samples = gts.samples
+        expected.variants = gts.variants
+        expected.check_missing(discard_also=True)
+        expected.check_biallelic(discard_also=True)
+        expected.check_phase()
+        gts.qc(discard_missing=True, discard_multiallelic=True, chunk_size=3)
+        assert gts.data.dtype == np.bool_
+        assert gts.samples == expected.samples
+        assert np.array_equal(gts.variants, expected.variants)
+        np.testing.assert_allclose(gts.data, expected.data)
+
     def test_load_genotypes_example(self):
         samples = (
             "HG00096",
@@ -161,6 +222,250 @@ class TestGenotypes:
                 assert line.variants[col] == expected.variants[col][idx]
         assert gts.samples == expected.samples
 
+    def test_load_genotypes_iter_chunks(self):
+        expected = GenotypesVCF(DATADIR / "example.vcf.gz")
+        expected.read()
+
+        # the chunks should cover all of the variants, in order
+        gts = GenotypesVCF(DATADIR / "example.vcf.gz")
+        chunks = list(gts.iter_chunks(chunk_size=4))
+        assert [chunk.data.shape[1] for chunk in chunks] == [4, 4, 4, 3]
+        assert all(chunk.data.flags["C_CONTIGUOUS"] for chunk in chunks)
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data, expected.data)
+        variants = np.concatenate([chunk.variants for chunk in chunks])
+        assert np.array_equal(variants, expected.variants)
+
+        # try it with a region, some samples, and some variants
+        region = "21:26938000-26950500"
+        samples = set(expected.samples[:5])
+        variants = set(expected.variants["id"][[1, 4, 9]])
+        expected = GenotypesVCF(DATADIR / "example.vcf.gz")
+        expected.read(region=region, samples=samples, variants=variants)
+        chunks = list(gts.iter_chunks(2, region, samples, variants))
+        assert [chunk.data.shape[1] for chunk in chunks] == [2, 1]
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data, expected.data)
+        assert gts.samples == expected.samples
+
+        # chunks of a single variant must not share the reused buffer
+        chunks = list(gts.iter_chunks(1, region, samples, variants))
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data, expected.data)
+
+    def test_load_genotypes_max_variants(self):
+        expected = self._get_expected_genotypes()
+
+        # preallocating more variants than we need should give the same result
+        gts = GenotypesVCF(DATADIR / "simple.vcf")
+        gts.read(max_variants=10)
+        np.testing.assert_allclose(gts.data, expected)
+        assert len(gts.variants) == 4
+        assert gts.variants["alleles"][0] == ("T", "C")
+
+        # but preallocating fewer should only load the first few variants
+        gts = GenotypesVCF(DATADIR / "simple.vcf")
+        gts.read(max_variants=3)
+        np.testing.assert_allclose(gts.data, expected[:, :3])
+        assert tuple(gts.variants["id"]) == (
+            "1:10114:T:C",
+            "1:10116:A:G",
+            "1:10117:C:A",
+        )
+
+    def test_load_genotypes_num_records(self):
+        expected = self._get_expected_genotypes()
+
+        # the number of records can be obtained from the index if there is one
+        gts = Genotypes(DATADIR / "simple.vcf.gz")
+        vcf = gts._open_vcf()
+        assert gts._num_records(vcf) == 4
+        assert gts._num_records(vcf, region="1:10115-10117") is None
+        gts = Genotypes(DATADIR / "simple.vcf")
+        assert gts._num_records(gts._open_vcf()) is None
+
+        # either way, we should end up with arrays of exactly the right size
+        for fname in ("simple.vcf.gz", "simple.vcf"):
+            gts = Genotypes(DATADIR / fname)
+            gts.read()
+            assert gts.variants.shape == (4,)
+            np.testing.assert_allclose(gts.data, expected)
+
+    def test_load_genotypes_blocks(self):
+        expected = self._get_expected_genotypes()
+
+        # the blocks should cover all of the variants, in order
+        gts = Genotypes(DATADIR / "simple.vcf")
+        vcf = gts._open_vcf()
+        blocks = [
+            (block.data.copy(), block.variants)
+            for block in gts._iterate_blocks(vcf, chunk_size=3)
+        ]
+        assert [len(variants) for data, variants in blocks] == [3, 1]
+        data = np.concatenate([data for data, variants in blocks], axis=0)
+        np.testing.assert_allclose(data.transpose((1, 0, 2)), expected)
+        assert blocks[1][1] == [("1:10122:A:G", "1", 10122)]
+
+    def test_load_genotypes_workers(self):
+        expected = GenotypesVCF(DATADIR / "example.vcf.gz")
+        expected.read()
+
+        # reading in parallel should give the same results as reading sequentially
+        gts = GenotypesVCF(DATADIR / "example.vcf.gz")
+        gts.read(workers=2)
+        np.testing.assert_allclose(gts.data, expected.data)
+        assert np.array_equal(gts.variants, expected.variants)
+
+        # and the same should be true when we specify a region and some variants
+        region = "21:26938000-26950500"
+        variants = set(expected.variants["id"][[1, 4, 9]])
+        expected = GenotypesVCF(DATADIR / "example.vcf.gz")
+        expected.read(region=region, variants=variants)
+        gts = GenotypesVCF(DATADIR / "example.vcf.gz")
+        gts.read(region=region, variants=variants, workers=3)
+        assert len(gts.variants) == 3
+        np.testing.assert_allclose(gts.data, expected.data)
+        assert np.array_equal(gts.variants, expected.variants)
+
+        # unindexed files should just be read sequentially
+        gts = Genotypes(DATADIR / "simple.vcf")
+        gts.read(workers=2)
+        np.testing.assert_allclose(gts.data, self._get_expected_genotypes())
+
+        # a worker should complain if it can't fill its rows of the shared matrix
+        kwargs = GenotypesVCF(DATADIR / "example.vcf.gz")._init_kwargs()
+        num_records = GenotypesVCF._count_region(kwargs, region)
+        shape = (num_records + 1, len(expected.samples), 3)
+        with Genotypes(None)._shared_matrix(shape) as (tmp_name, data):
+            with pytest.raises(ValueError):
+                GenotypesVCF._read_region(
+                    kwargs,
+                    False,
+                    region,
+                    None,
+                    None,
+                    None,
+                    tmp_name,
+                    shape,
+                    0,
+                    shape[0],
+                )
+
+    def test_load_genotypes_shared_matrix(self, monkeypatch):
+        # the matrix shouldn't be placed in /dev/shm if there isn't enough room
+        statvfs = os.statvfs
+        monkeypatch.setattr(
+            os,
+            "statvfs",
+            lambda path: (
+                os.statvfs_result((0,) * 10) if path == "/dev/shm" else statvfs(path)
+            ),
+        )
+        with Genotypes(None)._shared_matrix((2, 3, 2)) as (tmp_name, data):
+            assert not tmp_name.startswith("/dev/shm")
+            assert data.shape == (2, 3, 2)
+
+    def test_load_genotypes_id_index(self):
+        vcf_file = DATADIR / "test_ids.vcf.gz"
+        shutil.copy(DATADIR / "example.vcf.gz", vcf_file)
+        shutil.copy(DATADIR / "example.vcf.gz.tbi", str(vcf_file) + ".tbi")
+        expected = GenotypesVCF(vcf_file)
+        expected.read()
+        variants = set(expected.variants["id"][[1, 4, 5, 14]]) | {"fake_variant"}
+        expected = GenotypesVCF(vcf_file)
+        expected.read(variants=variants)
+
+        gts = GenotypesVCF(vcf_file)
+        ids_file, loci_file = gts.build_id_index()
+        assert len(np.load(ids_file)) == 15
+
+        # fetching the variants via the ID index should give the same results
+        gts.read(variants=variants)
+        assert len(gts.variants) == 4
+        np.testing.assert_allclose(gts.data, expected.data)
+        assert np.array_equal(gts.variants, expected.variants)
+
+        # and the same should be true if every variant is fetched in its own query
+        loci = gts._lookup_ids(variants)
+        assert len(loci) == 4
+        vcf = gts._open_vcf()
+        records = list(gts._fetch_loci(vcf, loci, max_gap=0))
+        assert [rec.ID for rec in records] == list(expected.variants["id"])
+
+        for fname in (vcf_file, str(vcf_file) + ".tbi", ids_file, loci_file):
+            Path(fname).unlink()
+
+    def test_load_genotypes_cache(self, caplog):
+        cache_dir = DATADIR / "test_cache"
+        cache = GenotypesCache(cache_dir)
+        region = "21:26938000-26950500"
+        samples = {"HG00097", "HG00099"}
+
+        expected = GenotypesVCF(DATADIR / "example.vcf.gz")
+        expected.read_cached(cache, region=region, samples=samples)
+        assert len(os.listdir(cache_dir)) == 1
+
+        # the second time around, the genotypes should come from the cache
+        caplog.clear()
+        gts = GenotypesVCF(DATADIR / "example.vcf.gz")
+        with caplog.at_level("INFO"):
+            gts.read_cached(cache, region=region, samples=samples)
+        assert any("from cache" in rec.message for rec in caplog.records)
+        assert isinstance(gts.data, np.memmap)
+        np.testing.assert_allclose(gts.data, expected.data)
+        assert np.array_equal(gts.variants, expected.variants)
+        assert gts.samples == expected.samples
+
+        # requesting a different set of samples should create a new entry
+        gts = GenotypesVCF(DATADIR / "example.vcf.gz")
+        gts.read_cached(cache, region=region)
+        assert len(os.listdir(cache_dir)) == 2
+        assert len(gts.samples) > len(samples)
+
+        # and so should requesting a different number of variants
+        assert cache.key(gts, region, max_variants=1) != cache.key(gts, region)
+
+        # compact variants should be loaded from the cache as they were requested
+        gts = GenotypesVCF(DATADIR / "example.vcf.gz")
+        gts.read_cached(cache, region=region, compact=True)
+        assert isinstance(gts.variants, VariantTable)
+        assert np.array_equal(np.asarray(gts.variants), expected.variants)
+
+        # but only one entry should fit in a small cache
+        entry = cache_dir / cache.key(gts, region)
+        cache.max_size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+        cache.evict()
+        assert len(os.listdir(cache_dir)) == 1
+
+        # clean up afterwards: delete the cache
+        shutil.rmtree(cache_dir)
+
+    def test_load_genotypes_resize(self, caplog):
+        expected = self._get_expected_genotypes()
+
+        # the number of records isn't known ahead of time for an unindexed VCF, so the
+        # arrays must be grown as they are read
+        gts = Genotypes(DATADIR / "simple.vcf")
+        with caplog.at_level("DEBUG", logger=gts.log.name):
+            gts.read()
+            np.testing.assert_allclose(gts.data, expected)
+            assert "Resizing arrays" in caplog.text
+            # and they must be shrunk if we preallocate too many records
+            gts.read(max_variants=10)
+            np.testing.assert_allclose(gts.data, expected)
+            assert "unneeded variant records" in caplog.text
+            # neither should have required any copies
+            assert "can't be resized in place" not in caplog.text
+
+            # but views of the arrays should remain valid if they must be copied
+            gts.data = gts.data.transpose((1, 0, 2)).copy()
+            view = gts.data[:2]
+            gts._resize(2)
+            assert "can't be resized in place" in caplog.text
+        np.testing.assert_allclose(view, expected[:, :2].transpose((1, 0, 2)))
+        np.testing.assert_allclose(gts.data, view)
+        assert len(gts.variants) == 2
+
     def test_load_genotypes_discard_multiallelic(self):
         gts = self._get_fake_genotypes()
 
@@ -246,6 +551,23 @@ class TestGenotypes:
         np.testing.assert_allclose(gts_sub.data, expected_data)
         assert np.array_equal(gts_sub.variants, expected_variants)
 
+        # subsets of subsets should be composed before anything is gathered
+        gts_sub = gts.subset(samples=("HG00101", "HG00100", "HG00097"))
+        gts_sub = gts_sub.subset(samples=samples, variants=variants[::-1])
+        assert gts_sub._view is not None
+        np.testing.assert_allclose(gts_sub.data, expected_data[:, ::-1])
+        assert gts_sub._view is None
+
+        # contiguous subsets should just be views into the original genotypes
+        gts_sub = gts.subset(variants=("1:10116:A:G", "1:10117:C:A"))
+        np.testing.assert_allclose(gts_sub.data, gts.data[:, [1, 2]])
+        assert np.shares_memory(gts_sub.data, gts.data)
+        # so callers that modify the genotypes must copy them first
+        sub_data = gts_sub.data.copy()
+        sub_data[:] = 0
+        np.testing.assert_allclose(gts_sub.data, gts.data[:, [1, 2]])
+        assert not np.shares_memory(sub_data, gts.data)
+
     def test_check_maf(self, caplog):
         gts = self._get_fake_genotypes()
         expected_maf = np.array([0, 0.4, 0, 0])
@@ -278,6 +600,43 @@ class TestGenotypes:
         assert len(gts.variants) == 0
         assert gts.data.shape[1] == 0
 
+    def test_pack_genotypes(self):
+        gts = Genotypes(DATADIR / "example.vcf.gz")
+        gts.read()
+        gts.check_biallelic()
+        gts.check_phase()
+        expected = gts.data.copy()
+        expected_maf = gts.check_maf()
+
+        gts.pack()
+        assert gts.packed
+        assert gts.data.dtype == np.uint64
+        assert gts.data.shape == (len(gts.variants), 2, 40)
+        np.testing.assert_allclose(gts.check_maf(), expected_maf)
+
+        # subset both: samples and variants
+        samples = gts.samples[-70:][::-1]
+        variants = tuple(gts.variants["id"][[9, 2, 4]])
+        gts_sub = gts.subset(samples=samples, variants=variants)
+        assert gts_sub.packed
+        assert gts_sub.data.shape == (3, 2, 2)
+        gts_sub.unpack()
+        np.testing.assert_allclose(gts_sub.data, expected[-70:][::-1][:, [9, 2, 4]])
+
+        gts.unpack()
+        assert not gts.packed
+        np.testing.assert_allclose(gts.data, expected)
+
+        # only biallelic genotypes can be packed
+        gts = self._get_fake_genotypes()
+        with pytest.raises(ValueError):
+            gts.pack()
+        gts.check_biallelic()
+        gts.pack()
+        maf = gts.check_maf(threshold=0.01, discard_also=True)
+        np.testing.assert_allclose(maf, [0.4])
+        assert gts.data.shape == (1, 2, 1)
+
     def test_check_sorted(self, caplog):
         gts = self._get_fake_genotypes()
         gts.check_sorted()
@@ -316,6 +675,18 @@ class TestGenotypes:
         assert gts.data.shape[2] == gts2.data.shape[2]
         assert gts.data.shape[1] == (gts1.data.shape[1] + gts2.data.shape[1])
 
+        # and when the genotypes are packed
+        gts2.check_phase()
+        for obj in (gts1, gts2):
+            obj.check_biallelic()
+            obj.pack()
+
+        gts = Genotypes.merge_variants((gts1, gts2), fname=None)
+
+        assert gts.packed
+        assert len(gts.variants) == len(gts1.variants) + len(gts2.variants)
+        assert gts.data.shape == (len(gts.variants), 2, 1)
+
 
 class TestGenotypesPLINK:
     def _get_fake_genotypes_plink(self):
@@ -472,6 +843,152 @@ class TestGenotypesPLINK:
             )
         assert gts.samples == expected.samples
 
+        # the variants are decoded in batches, so try some that end mid-batch
+        gts = GenotypesPLINK(DATADIR / "simple.pgen", chunk_size=2)
+        variants = {"1:10114:T:C", "1:10117:C:A", "1:10122:A:G"}
+        lines = list(gts.__iter__(variants=variants))
+        assert len(lines) == 3
+        for line, idx in zip(lines, (0, 2, 3)):
+            assert line.variants["id"] == expected.variants["id"][idx]
+            np.testing.assert_allclose(line.data[:, :2], expected.data[:, idx])
+
+    def test_load_genotypes_iter_chunks(self):
+        expected = self._get_fake_genotypes_plink()
+
+        gts = GenotypesPLINK(DATADIR / "simple.pgen")
+        chunks = list(gts.iter_chunks(chunk_size=3))
+        assert [chunk.data.shape[1] for chunk in chunks] == [3, 1]
+
+        # check that everything matches what we expected
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data[:, :, :2], expected.data)
+        variants = np.concatenate([chunk.variants for chunk in chunks])
+        for col in ("chrom", "pos", "id", "alleles"):
+            assert variants[col].tolist() == expected.variants[col].tolist()
+        assert gts.samples == expected.samples
+
+        # also try it with some samples and variants
+        samples = {"HG00097", "HG00100"}
+        variants = {"1:10114:T:C", "1:10117:C:A"}
+        chunks = list(gts.iter_chunks(1, samples=samples, variants=variants))
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data[:, :, :2], expected.data[[1, 3]][:, [0, 2]])
+
+    def test_load_genotypes_workers(self):
+        expected = self._get_fake_genotypes_plink()
+
+        # reading in parallel should give the same results as reading sequentially
+        for chunk_size in (None, 1):
+            gts = GenotypesPLINK(DATADIR / "simple.pgen", chunk_size=chunk_size)
+            gts.read(workers=3)
+            gts.check_phase()
+            np.testing.assert_allclose(gts.data, expected.data)
+            assert gts.samples == expected.samples
+
+        # and the same should be true when we specify some samples and variants
+        samples = {"HG00097", "HG00100"}
+        variants = {"1:10114:T:C", "1:10117:C:A", "1:10122:A:G"}
+        gts = GenotypesPLINK(DATADIR / "simple.pgen")
+        gts.read(samples=samples, variants=variants, workers=2)
+        gts.check_phase()
+        np.testing.assert_allclose(gts.data, expected.data[[1, 3]][:, [0, 2, 3]])
+        assert (
+            gts.variants["id"].tolist() == expected.variants["id"][[0, 2, 3]].tolist()
+        )
+
+    def test_load_genotypes_cache(self):
+        expected = self._get_fake_genotypes_plink()
+        prefix = DATADIR / "test_plink_cache"
+        for suffix in (".pgen", ".pvar", ".psam"):
+            shutil.copy(DATADIR / f"simple{suffix}", prefix.with_suffix(suffix))
+        cache_dir = DATADIR / "test_plink_gts_cache"
+        cache = GenotypesCache(cache_dir)
+
+        gts = GenotypesPLINK(prefix.with_suffix(".pgen"))
+        gts.read_cached(cache)
+        key = cache.key(gts)
+        gts = GenotypesPLINK(prefix.with_suffix(".pgen"))
+        gts.read_cached(cache)
+        gts.check_phase()
+        np.testing.assert_allclose(gts.data, expected.data)
+        assert gts.variants["id"].tolist() == expected.variants["id"].tolist()
+        assert gts.variants["alleles"].tolist() == expected.variants["alleles"].tolist()
+
+        # the entry should be invalidated once the PVAR or PSAM file changes
+        for suffix in (".pvar", ".psam"):
+            os.utime(prefix.with_suffix(suffix), (0, 0))
+            assert cache.key(gts) != key
+            key = cache.key(gts)
+
+        shutil.rmtree(cache_dir)
+        for suffix in (".pgen", ".pvar", ".psam"):
+            prefix.with_suffix(suffix).unlink()
+
+    def test_load_genotypes_pvar_cache(self, caplog):
+        prefix = DATADIR / "test_pvar_cache"
+        for suffix in (".pgen", ".pvar", ".psam"):
+            shutil.copy(DATADIR / ("simple" + suffix), prefix.with_suffix(suffix))
+        region = "1:10115-10117"
+        variants = {"1:10114:T:C", "1:10117:C:A", "fake_variant"}
+
+        expected = []
+        for kwargs in ({}, {"region": region}, {"variants": variants}):
+            gts = GenotypesPLINK(prefix.with_suffix(".pgen"))
+            gts.read(**kwargs)
+            expected.append(gts)
+
+        gts = GenotypesPLINK(prefix.with_suffix(".pgen"))
+        cache = gts.build_pvar_cache(chunk_size=3)
+        assert cache == Path(str(prefix) + ".pvar.table")
+
+        # reading from the cache should give the same results as parsing the PVAR
+        for exp, kwargs in zip(
+            expected, ({}, {"region": region}, {"variants": variants})
+        ):
+            gts = GenotypesPLINK(prefix.with_suffix(".pgen"))
+            gts.read(**kwargs)
+            np.testing.assert_allclose(gts.data, exp.data)
+            assert np.array_equal(gts.variants, exp.variants)
+
+        # regions should be looked up in the positional index
+        assert Path(str(prefix) + ".pvar.pos").is_dir()
+        np.testing.assert_allclose(gts._lookup_region(region), [1, 2])
+        np.testing.assert_allclose(gts._lookup_region("1:10116"), [1, 2, 3])
+        assert len(gts._lookup_region("2:10115-10117")) == 0
+
+        # and the index should also work when the variants aren't sorted
+        table = VariantTable.load(cache)
+        gts._build_pos_index(table[np.array([2, 0, 3, 1])])
+        np.testing.assert_allclose(gts._lookup_region(region), [0, 3])
+
+        # the cache should be ignored once it is older than the PVAR file
+        os.utime(cache, (0, 0))
+        caplog.clear()
+        gts = GenotypesPLINK(prefix.with_suffix(".pgen"))
+        gts.read_variants(variants=variants)
+        assert np.array_equal(gts.variants, expected[2].variants)
+        assert any(rec.levelname == "WARNING" for rec in caplog.records)
+
+        for suffix in (".pgen", ".pvar", ".psam"):
+            Path(str(prefix) + suffix).unlink()
+        for suffix in (".pvar.table", ".pvar.pos"):
+            shutil.rmtree(Path(str(prefix) + suffix))
+
+    def test_split_pvar_ragged(self):
+        prefix = DATADIR / "test_ragged"
+        with open(prefix.with_suffix(".pvar"), "w") as pvar:
+            pvar.write("#CHROM\tPOS\tID\tREF\tALT\tINFO\n")
+            # a line missing its INFO field next to a line with an extra field should
+            # have the same total number of fields as two complete lines
+            pvar.write("1\t10114\tvar1\tT\tC\n")
+            pvar.write("1\t10116\tvar2\tA\tG\t.\textra\n")
+        gts = GenotypesPLINK(prefix.with_suffix(".pgen"))
+        (indices, cols) = next(gts._split_pvar())
+        np.testing.assert_allclose(indices, [0, 1])
+        assert cols["ID"] == ["var1", "var2"]
+        assert cols["POS"] == ["10114", "10116"]
+        prefix.with_suffix(".pvar").unlink()
+
     def test_iter_multiallelic_tr(self):
         expected = self._get_fake_genotypes_multiallelic_tr()
 
@@ -523,6 +1040,38 @@ class TestGenotypesPLINK:
         np.testing.assert_allclose(gts.data, expected_data)
         assert gts.samples == tuple(samples)
 
+    def test_write_variants(self):
+        gts = self._get_fake_genotypes_plink()
+        gts.variants["chrom"][[0, 2]] = "2"
+        gts.variants["alleles"][3] = ("A", "G", "T")
+        fname = DATADIR / "test_write_variants.pgen"
+        gts.fname = fname
+
+        expected = [
+            "##fileformat=VCFv4.2",
+            '##FILTER=<ID=PASS,Description="All filters passed">',
+            "##contig=<ID=2>",
+            "##contig=<ID=1>",
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO",
+            "2\t10114\t1:10114:T:C\tT\tC\t.\t.\t.",
+            "1\t10116\t1:10116:A:G\tA\tG\t.\t.\t.",
+            "2\t10117\t1:10117:C:A\tC\tA\t.\t.\t.",
+            "1\t10122\t1:10122:A:G\tA\tG,T\t.\t.\t.",
+        ]
+        # the lines should be the same regardless of how they're written in blocks
+        for chunk_size in (100000, 3):
+            gts.write_variants(chunk_size=chunk_size)
+            with open(fname.with_suffix(".pvar")) as pvar:
+                assert pvar.read().splitlines() == expected
+
+        # compact variants should be written the same way
+        gts.compact_variants()
+        gts.write_variants()
+        with open(fname.with_suffix(".pvar")) as pvar:
+            assert pvar.read().splitlines() == expected
+
+        fname.with_suffix(".pvar").unlink()
+
     def test_write_genotypes_chunked(self):
         gts = self._get_fake_genotypes_plink()
 
@@ -546,6 +1095,34 @@ class TestGenotypesPLINK:
         fname.with_suffix(".pvar").unlink()
         fname.unlink()
 
+    def test_read_genotypes_unphased_chunked(self):
+        gts = self._get_fake_genotypes_plink()
+        # add an unphased genotype
+        gts.data = np.concatenate(
+            (gts.data, np.ones(gts.data.shape[:2] + (1,), dtype=np.uint8)), axis=2
+        )
+        gts.data[0, 3, :] = (0, 1, 0)
+
+        fname = DATADIR / "test_read_unphased.pgen"
+        gts.fname = fname
+        gts.write()
+
+        # the scratch buffers are reused across chunks, so nothing should leak over
+        for chunk_size in (None, 3):
+            new_gts = GenotypesPLINK(fname, chunk_size=chunk_size)
+            new_gts.read()
+            np.testing.assert_allclose(new_gts.data[:, :, :2], gts.data[:, :, :2])
+            assert new_gts.data[0, 3, 2] == 0
+            assert new_gts.data[1, 3, 2] == 1
+
+        data = np.stack([line.data for line in GenotypesPLINK(fname)], axis=1)
+        np.testing.assert_allclose(data, new_gts.data)
+
+        # clean up afterwards: delete the files we created
+        fname.with_suffix(".psam").unlink()
+        fname.with_suffix(".pvar").unlink()
+        fname.unlink()
+
     def test_write_genotypes(self):
         gts = self._get_fake_genotypes_plink()
 
@@ -569,6 +1146,113 @@ class TestGenotypesPLINK:
         fname.with_suffix(".pvar").unlink()
         fname.unlink()
 
+    def test_write_genotypes_packed(self):
+        gts = self._get_fake_genotypes_plink()
+        gts.check_biallelic()
+        expected = gts.data.copy()
+        gts.pack()
+
+        fname = DATADIR / "test_write_packed.pgen"
+        gts.fname = fname
+        gts.chunk_size = 3
+        gts.write()
+
+        new_gts = GenotypesPLINK(fname)
+        new_gts.read()
+        new_gts.check_phase()
+
+        # check that everything matches what we expected
+        np.testing.assert_allclose(new_gts.data, expected)
+        assert gts.samples == new_gts.samples
+
+        # clean up afterwards: delete the files we created
+        fname.with_suffix(".psam").unlink()
+        fname.with_suffix(".pvar").unlink()
+        fname.unlink()
+
+    def test_write_genotypes_streaming(self):
+        gts = self._get_fake_genotypes_plink()
+
+        fname = DATADIR / "test_write_streaming.pgen"
+        writer = GenotypesPLINK(fname)
+        writer.samples = gts.samples
+        writer.open(len(gts.variants), contigs=["1"])
+        # the variants are the rows of each chunk
+        data = gts.data.transpose((1, 0, 2))
+        for start in range(0, len(gts.variants), 3):
+            end = start + 3
+            writer.append_chunk(data[start:end], gts.variants[start:end])
+        writer.close()
+
+        new_gts = GenotypesPLINK(fname)
+        new_gts.read()
+        new_gts.check_phase()
+
+        # check that everything matches what we expected
+        np.testing.assert_allclose(gts.data, new_gts.data)
+        assert gts.samples == new_gts.samples
+        for i in range(len(new_gts.variants)):
+            for col in ("chrom", "pos", "id", "alleles"):
+                assert gts.variants[col][i] == new_gts.variants[col][i]
+
+        # clean up afterwards: delete the files we created
+        fname.with_suffix(".psam").unlink()
+        fname.with_suffix(".pvar").unlink()
+        fname.unlink()
+
+    def test_write_multiallelic_streaming(self):
+        gts = self._get_fake_genotypes_multiallelic()
+        assert max(map(len, gts.variants["alleles"])) == 3
+
+        fname = DATADIR / "test_write_multiallelic_streaming.pgen"
+        writer = GenotypesPLINK(fname)
+        writer.samples = gts.samples
+        data = gts.data.transpose((1, 0, 2))
+
+        # the writer should refuse variants with more alleles than it was told about
+        writer.open(len(gts.variants), contigs=["1"])
+        with pytest.raises(ValueError) as info:
+            writer.append_chunk(data, gts.variants)
+        assert "has 3 alleles" in str(info.value)
+        with pytest.raises(RuntimeError):
+            writer.close()
+
+        writer.open(len(gts.variants), contigs=["1"], max_allele_ct=3)
+        for start in range(0, len(gts.variants), 2):
+            end = start + 2
+            writer.append_chunk(data[start:end], gts.variants[start:end])
+        writer.close()
+
+        new_gts = GenotypesPLINK(fname)
+        new_gts.read()
+        new_gts.check_phase()
+        np.testing.assert_allclose(gts.data, new_gts.data)
+        assert gts.variants["alleles"].tolist() == new_gts.variants["alleles"].tolist()
+
+        fname.with_suffix(".psam").unlink()
+        fname.with_suffix(".pvar").unlink()
+        fname.unlink()
+
+    def test_write_genotypes_missing(self):
+        gts = self._get_fake_genotypes_plink()
+        gts.data[1, 1, :2] = np.iinfo(np.uint8).max
+
+        fname = DATADIR / "test_write_missing.pgen"
+        gts.fname = fname
+        gts.write()
+
+        new_gts = GenotypesPLINK(fname)
+        new_gts.read()
+        new_gts.check_phase()
+
+        # check that everything matches what we expected
+        np.testing.assert_allclose(gts.data, new_gts.data)
+
+        # clean up afterwards: delete the files we created
+        fname.with_suffix(".psam").unlink()
+        fname.with_suffix(".pvar").unlink()
+        fname.unlink()
+
     def test_write_genotypes_empty(self):
         fname = DATADIR / "test_write.pgen"
         gts = GenotypesPLINK(fname=fname)
@@ -764,6 +1448,13 @@ class TestGenotypesPLINKTR:
         # Check samples
         assert gts.samples == expected.samples
 
+    def test_iter_chunks(self):
+        expected = self._get_fake_genotypes_multiallelic()
+        gts = GenotypesPLINKTR(DATADIR / "simple-tr.pgen")
+        chunks = list(gts.iter_chunks(chunk_size=2))
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data, expected.data)
+
     def test_read(self):
         expected_alleles = self._get_fake_genotypes_multiallelic().data
         gts = GenotypesPLINKTR(DATADIR / "simple-tr.pgen")
@@ -771,6 +1462,52 @@ class TestGenotypesPLINKTR:
         # check genotypes
         np.testing.assert_allclose(expected_alleles, gts.data)
 
+        # reading in parallel should give the same results as reading sequentially
+        gts = GenotypesPLINKTR(DATADIR / "simple-tr.pgen", chunk_size=2)
+        gts.read(workers=2)
+        np.testing.assert_allclose(expected_alleles, gts.data)
+
+        # qc() should complain about the unphased genotypes that remain after
+        # discarding the samples with missing genotypes
+        with pytest.raises(ValueError) as info:
+            gts.qc(discard_missing=True)
+        assert "unphased for sample HG00099" in str(info.value)
+
+    def test_read_pvar_cache(self):
+        expected = self._get_fake_genotypes_multiallelic()
+        prefix = DATADIR / "test_tr_pvar_cache"
+        for suffix in (".pgen", ".pvar", ".psam"):
+            shutil.copy(DATADIR / ("simple-tr" + suffix), prefix.with_suffix(suffix))
+        variants = {"1:10116:ACACAC", "1:20122:GGG"}
+
+        gts = GenotypesPLINKTR(prefix.with_suffix(".pgen"))
+        gts.build_pvar_cache(chunk_size=2)
+        assert Path(str(prefix) + ".pvar.lens").is_dir()
+
+        # reading from the cache should give the same results as parsing the PVAR
+        gts = GenotypesPLINKTR(prefix.with_suffix(".pgen"))
+        gts.read()
+        np.testing.assert_allclose(gts.data, expected.data)
+        gts = GenotypesPLINKTR(prefix.with_suffix(".pgen"))
+        gts.read(variants=variants)
+        np.testing.assert_allclose(gts.data, expected.data[:, [1, 4]])
+        chunks = list(gts.iter_chunks(chunk_size=1, region="1:11000-20000"))
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data, expected.data[:, 1:4])
+
+        # the allele lengths should be extracted again once the cache is outdated
+        for suffix in (".pvar.table", ".pvar.lens"):
+            os.utime(Path(str(prefix) + suffix), (0, 0))
+        gts = GenotypesPLINKTR(prefix.with_suffix(".pgen"))
+        gts.read(variants=variants)
+        np.testing.assert_allclose(gts.data, expected.data[:, [1, 4]])
+
+        Path(str(prefix) + ".pvar").unlink()
+        for suffix in (".table", ".pos", ".lens"):
+            shutil.rmtree(Path(str(prefix) + ".pvar" + suffix))
+        for suffix in (".pgen", ".psam"):
+            prefix.with_suffix(suffix).unlink()
+
 
 class TestPhenotypes:
     def _get_expected_phenotypes(self):
@@ -1626,6 +2363,25 @@ class TestHaplotypes:
         if return_also:
             return hap_gt
 
+    def test_haps_transform_packed(self):
+        expected = self.test_haps_transform(return_also=True).data
+
+        haps = self._get_dummy_haps()
+        gens = TestGenotypesVCF()._get_fake_genotypes_refalt()
+        gens.data[[2, 4], 0, 1] = 1
+        gens.data[[1, 4], 2, 0] = 1
+        gens.check_biallelic()
+        gens.pack()
+        hap_gt = GenotypesVCF(fname=None)
+        haps.transform(gens, hap_gt)
+        assert hap_gt.packed
+        hap_gt.unpack()
+        np.testing.assert_allclose(hap_gt.data, expected)
+
+        # also try transforming just one haplotype
+        hap = list(haps.data.values())[0]
+        np.testing.assert_allclose(hap.transform(gens), expected[:, 0])
+
     def test_haps_transform_multiallelic(self, return_also=False):
         expected = np.array(
             [
@@ -1865,6 +2621,59 @@ class TestGenotypesVCF:
 
         fname.unlink()
 
+    def test_compact_variants(self):
+        gts = GenotypesVCF.load(DATADIR / "example.vcf.gz")
+        expected = gts.variants.copy()
+        gts.compact_variants()
+        assert isinstance(gts.variants, VariantTable)
+        assert gts.variants.nbytes < expected.nbytes
+
+        # all of the usual ways of accessing the variants should still work
+        assert len(gts.variants) == len(expected)
+        assert np.array_equal(np.asarray(gts.variants), expected)
+        for field in ("id", "chrom", "pos"):
+            assert np.array_equal(gts.variants[field], expected[field])
+        assert list(gts.variants["alleles"]) == list(expected["alleles"])
+        assert tuple(gts.variants[3]) == tuple(expected[3])
+        assert gts.variants[-1]["alleles"] == expected[-1]["alleles"]
+        assert [tuple(rec) for rec in gts.variants] == [tuple(rec) for rec in expected]
+        assert np.array_equal(gts.variants[["chrom", "id"]], expected[["chrom", "id"]])
+        for idx in ([5, 2, 9], slice(2, 7), expected["pos"] > 26940000):
+            assert np.array_equal(np.asarray(gts.variants[idx]), expected[idx])
+
+        # subsetting should keep the variants compact
+        variants = tuple(expected["id"][[3, 1]])
+        gts_sub = gts.subset(variants=variants)
+        assert isinstance(gts_sub.variants, VariantTable)
+        assert tuple(gts_sub.variants["id"]) == variants
+
+        # and so should writing them
+        gts.fname = DATADIR / "test_compact.vcf"
+        gts.write()
+        new_gts = GenotypesVCF.load(gts.fname)
+        assert np.array_equal(new_gts.variants, expected)
+        gts.fname.unlink()
+
+        # the readers can also compact the variants as they read them
+        for fname, workers in (("example.vcf.gz", 1), ("example.vcf.gz", 2)):
+            gts = GenotypesVCF(DATADIR / fname)
+            gts.read(compact=True, workers=workers)
+            assert isinstance(gts.variants, VariantTable)
+            assert np.array_equal(np.asarray(gts.variants), expected)
+        gts = GenotypesVCF(DATADIR / "simple.vcf")
+        gts.read(compact=True)
+        assert isinstance(gts.variants, VariantTable)
+        assert len(gts.variants) == gts.data.shape[1]
+        gts = GenotypesPLINK(DATADIR / "simple.pgen")
+        gts.read(compact=True)
+        assert isinstance(gts.variants, VariantTable)
+        assert len(gts.variants) == gts.data.shape[1]
+
+        # discarding variants shouldn't convert the table back into an array
+        gts.check_missing()
+        gts.check_biallelic(discard_also=True)
+        assert isinstance(gts.variants, VariantTable)
+
     def test_write_empty(self):
         fname = Path("test.vcf")
         gts = GenotypesVCF(fname=fname)
@@ -1944,6 +2753,47 @@ class TestGenotypesVCF:
 
         gts.fname.unlink()
 
+    def test_write_formats(self):
+        gts = self._get_fake_genotypes_refalt()
+        # add phasing information back
+        gts.data = np.dstack((gts.data, np.ones(gts.data.shape[:2], dtype=np.uint8)))
+        gts.data[:2, 1, 2] = 0
+        gts.data[3, 0, :2] = (255, 1)
+        # include an allele index with more than one digit
+        gts.variants["alleles"][2] = tuple("CATCATCATCATC")
+        gts.data[2, 2, 1] = 12
+
+        # BCFs are always written by pysam, so we can compare against them
+        records = {}
+        for ext in ("vcf", "vcf.gz", "bcf"):
+            gts.fname = DATADIR / f"test_write_formats.{ext}"
+            gts.write()
+            with VariantFile(str(gts.fname)) as vcf:
+                records[ext] = [str(rec) for rec in vcf]
+            new_gts = GenotypesVCF(gts.fname)
+            new_gts.read()
+            np.testing.assert_allclose(gts.data, new_gts.data)
+            gts.fname.unlink()
+
+        assert records["vcf"] == records["bcf"]
+        assert records["vcf.gz"] == records["bcf"]
+
+    def test_write_index(self):
+        gts = self._get_fake_genotypes_refalt()
+        for ext, index_ext in (("vcf.gz", ".tbi"), ("bcf", ".csi")):
+            gts.fname = DATADIR / f"test_write_index.{ext}"
+            gts.write(index=True)
+            index = Path(str(gts.fname) + index_ext)
+            assert index.exists()
+
+            # the index should allow us to fetch just a region of the file
+            new_gts = GenotypesVCF(gts.fname)
+            new_gts.read(region="1:10115-10117")
+            assert len(new_gts.variants) == 2
+
+            gts.fname.unlink()
+            index.unlink()
+
     def test_merge_variants_vcf(self):
         gts1 = Genotypes(DATADIR / "example.vcf.gz")
         gts2 = self._get_fake_genotypes_refalt()
@@ -1961,6 +2811,70 @@ class TestGenotypesVCF:
         assert gts.data.shape[1] == (gts1.data.shape[1] + gts2.data.shape[1])
 
 
+class TestBGZFWriter:
+    def _get_payload(self):
+        lines = "".join(f"1\t{i}\tvar{i}\tA\tT\n" for i in range(20000))
+        # include some random bytes that can't be compressed
+        rng = np.random.default_rng(42)
+        return lines.encode() + rng.bytes(3 * BGZFWriter.BLOCK_SIZE)
+
+    def test_write(self, threads=1):
+        payload = self._get_payload()
+        fname = DATADIR / "test_bgzf.gz"
+
+        with BGZFWriter(fname, threads=threads) as bgzf:
+            for start in range(0, len(payload), 10000):
+                bgzf.write(payload[start : start + 10000])
+
+        with gzip.open(fname) as bgzf:
+            assert bgzf.read() == payload
+        # htslib should also be able to read it as a BGZF file
+        with BGZFile(str(fname)) as bgzf:
+            assert bgzf.read() == payload
+        with open(fname, "rb") as bgzf:
+            assert bgzf.read()[-28:] == BGZFWriter.EOF
+
+        fname.unlink()
+
+    def test_write_threads(self):
+        self.test_write(threads=4)
+
+    def test_default_threads(self, monkeypatch):
+        monkeypatch.setattr(os, "cpu_count", lambda: 64)
+        payload = self._get_payload()
+        fname = DATADIR / "test_bgzf.gz"
+
+        with BGZFWriter(fname) as bgzf:
+            assert bgzf.threads == BGZFWriter.MAX_DEFAULT_THREADS
+            # small files shouldn't start any threads
+            bgzf.write(payload[: BGZFWriter.BLOCK_SIZE * 2])
+            bgzf.flush()
+            assert bgzf._pool is None
+            # but larger ones should
+            for _ in range(BGZFWriter.THREAD_THRESHOLD // 4):
+                bgzf.write(payload)
+            assert bgzf._pool is not None
+
+        with gzip.open(fname) as bgzf:
+            contents = bgzf.read()
+        assert contents == payload[: BGZFWriter.BLOCK_SIZE * 2] + payload * (
+            BGZFWriter.THREAD_THRESHOLD // 4
+        )
+
+        fname.unlink()
+
+    def test_hook_compressed(self):
+        fname = DATADIR / "test_bgzf.txt.gz"
+        with Data.hook_compressed(fname, mode="w") as out:
+            assert isinstance(out.buffer, BGZFWriter)
+            out.write("hello\nworld\n")
+
+        with Data.hook_compressed(fname, mode="r") as bgzf:
+            assert bgzf.read() == "hello\nworld\n"
+
+        fname.unlink()
+
+
 class TestGenotypesTR:
     def _get_fake_tr_alleles(self):
         # max uint8 codes for empty ("em") genotype
@@ -1994,6 +2908,60 @@ class TestGenotypesTR:
         for idx, line in enumerate(gts):
             np.testing.assert_allclose(line.data[:, :3], expected[:, idx])
 
+    def test_read_many_alleles(self):
+        # a TR with more alleles than can be encoded as np.uint8 allele indices
+        expected = self._get_fake_tr_alleles()
+        alts = ["A" * (idx % 200 + 1) for idx in range(1, 300)]
+        lines = open(DATADIR / "simple_tr.vcf").read().splitlines(keepends=True)
+        lines.append(
+            f"1\t15000\t1:15000:A\tA\t{','.join(alts)}\t.\t.\t"
+            "START=15000;END=15000;PERIOD=1\tGT\t299|0\t0|1\t200|201\t3|.\t0|0\n"
+        )
+        tr_file = DATADIR / "many_alleles_tr.vcf"
+        with open(tr_file, "w") as file:
+            file.writelines(lines)
+
+        gts = GenotypesTR(tr_file)
+        gts.read()
+        np.testing.assert_allclose(gts.data[:, :5], expected)
+        np.testing.assert_allclose(
+            gts.data[:, 5, :2], [[100, 1], [1, 2], [1, 2], [4, 255], [1, 1]]
+        )
+
+        tr_file.unlink()
+
+    def test_qc(self):
+        expected = self._get_fake_tr_alleles()
+
+        gts = GenotypesTR(DATADIR / "simple_tr.vcf")
+        gts.read()
+        with pytest.raises(ValueError) as info:
+            gts.qc(chunk_size=1)
+        assert "missing" in str(info.value)
+
+        # samples with missing genotypes should be discarded, but no variants
+        gts = GenotypesTR(DATADIR / "simple_tr.vcf")
+        gts.read()
+        gts.data = gts.data[:, :4]
+        gts.variants = gts.variants[:4]
+        gts.qc(discard_missing=True, chunk_size=3)
+        assert gts.samples == ("HG00096", "HG00099", "HG00100")
+        np.testing.assert_allclose(gts.data, expected[[0, 2, 3], :4, :2])
+
+        # heterozygous TRs are unphased if their alleles have different lengths
+        gts = GenotypesTR(DATADIR / "simple_tr.vcf")
+        gts.read()
+        gts.data = gts.data[:, :3].copy()
+        gts.data[2, 2, 2] = 0
+        gts.qc(chunk_size=2)
+        gts = GenotypesTR(DATADIR / "simple_tr.vcf")
+        gts.read()
+        gts.data = gts.data[:, :3].copy()
+        gts.data[2, 0, 2] = 0
+        with pytest.raises(ValueError) as info:
+            gts.qc(chunk_size=2)
+        assert "unphased" in str(info.value)
+
 
 class TestBreakpoints:
     def _get_expected_breakpoints(self):
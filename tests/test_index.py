@@ -4,7 +4,7 @@ from pathlib import Path
 import numpy as np
 from click.testing import CliRunner
 
-from haptools.data import Data
+from haptools.data import Data, VariantTable
 from haptools.__main__ import main
 
 DATADIR = Path(__file__).parent.joinpath("data")
@@ -82,3 +82,48 @@ def test_no_sort(capfd):
 
     Path("test.hap.gz").unlink()
     Path("test.hap.gz").with_suffix(".gz.tbi").unlink()
+
+
+def test_vcf_ids(capfd):
+    tmp_file = Path("test.vcf.gz")
+
+    # copy the file so that we don't affect anything in the tests/data directory
+    shutil.copy(str(DATADIR / "example.vcf.gz"), str(tmp_file))
+
+    cmd = f"index {tmp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ""
+    assert result.exit_code == 0
+    # check that the IDs in the index are sorted
+    ids = np.load("test.vcf.gz.ids.npy")
+    assert len(ids) == 15
+    assert np.array_equal(ids, np.sort(ids))
+    assert Path("test.vcf.gz.loci.npy").is_file()
+
+    tmp_file.unlink()
+    Path("test.vcf.gz.ids.npy").unlink()
+    Path("test.vcf.gz.loci.npy").unlink()
+
+
+def test_pvar_cache(capfd):
+    tmp_file = Path("test.pvar")
+
+    # copy the file so that we don't affect anything in the tests/data directory
+    shutil.copy(str(DATADIR / "simple.pvar"), str(tmp_file))
+
+    cmd = f"index {tmp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ""
+    assert result.exit_code == 0
+    # check that the cache has all of the variants in the PVAR file
+    table = VariantTable.load("test.pvar.table")
+    assert len(table) == 4
+    assert Path("test.pvar.pos").is_dir()
+
+    tmp_file.unlink()
+    shutil.rmtree("test.pvar.table")
+    shutil.rmtree("test.pvar.pos")
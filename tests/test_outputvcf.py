@@ -317,6 +317,11 @@ def test_vcf_output():
     # 1	10114    GT:POP  0|0:YRI,YRI  1|1:CEU,CEU
     # 1	59423090 GT:POP  0|1:CEU,YRI  1|0:YRI,CEU
     # 2	10122    GT:POP  1|0:YRI,CEU  0|1:CEU,YRI
+
+    # the population of each reference sample
+    with open(sampleinfo_file) as info:
+        ref_pops = dict(line.split() for line in info)
+
     # read in vcf file
     vcf = VCF(str(out_file))
     for var in vcf:
@@ -341,6 +346,11 @@ def test_vcf_output():
         else:
             assert False
 
+        # each allele should come from a reference sample of the right population
+        for pops, labels in zip(var.format("POP"), var.format("SAMPLE")):
+            for pop, label in zip(pops.split(","), labels.split(",")):
+                assert ref_pops[label] == pop
+
     # Clean up by removing the output file from output_vcf
     out_file.unlink()
 
@@ -1,9 +1,11 @@
 import os
+import shutil
 from pathlib import Path
 
 import pytest
 import numpy as np
 import numpy.lib.recfunctions as rfn
+from pysam import VariantFile
 from click.testing import CliRunner
 
 from haptools.transform import (
@@ -59,6 +61,22 @@ class TestGenotypesAncestry:
         np.testing.assert_allclose(gts.ancestry, expected.ancestry)
         assert gts.samples == expected.samples
 
+    def test_load_genotypes_resize(self, caplog):
+        expected = self._get_fake_genotypes()
+
+        # the arrays are grown as records are read and then shrunk to fit
+        gts = GenotypesAncestry(self.file)
+        with caplog.at_level("DEBUG", logger=gts.log.name):
+            for max_variants in (None, 10):
+                gts.read(max_variants=max_variants)
+                np.testing.assert_allclose(gts.data, expected.data)
+                np.testing.assert_allclose(gts.ancestry, expected.ancestry)
+                assert len(gts.variants) == len(expected.variants)
+        assert "Resizing arrays" in caplog.text
+        assert "unneeded variant records" in caplog.text
+        # the ancestry labels should also have been resized in place
+        assert "can't be resized in place" not in caplog.text
+
     def test_load_genotypes_iterate(self, caplog):
         expected = self._get_expected_ancestry().transpose((1, 0, 2))
 
@@ -67,6 +85,26 @@ class TestGenotypesAncestry:
         for idx, line in enumerate(gts):
             np.testing.assert_allclose(line.ancestry, expected[idx])
 
+    def test_load_genotypes_iter_chunks(self):
+        expected = self._get_fake_genotypes()
+
+        gts = GenotypesAncestry(self.file)
+        chunks = list(gts.iter_chunks(chunk_size=3))
+        assert [chunk.data.shape[1] for chunk in chunks] == [3, 1]
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data, expected.data)
+        ancestry = np.concatenate([chunk.ancestry for chunk in chunks], axis=1)
+        np.testing.assert_allclose(ancestry, expected.ancestry)
+        variants = np.concatenate([chunk.variants for chunk in chunks])
+        assert variants["id"].tolist() == expected.variants["id"].tolist()
+
+        # chunks of a single variant must not share the reused buffers
+        chunks = list(gts.iter_chunks(chunk_size=1))
+        data = np.concatenate([chunk.data for chunk in chunks], axis=1)
+        np.testing.assert_allclose(data, expected.data)
+        ancestry = np.concatenate([chunk.ancestry for chunk in chunks], axis=1)
+        np.testing.assert_allclose(ancestry, expected.ancestry)
+
     def test_load_genotypes_discard_multiallelic(self):
         gts = self._get_fake_genotypes()
 
@@ -126,13 +164,74 @@ class TestGenotypesAncestry:
         np.testing.assert_allclose(gts_sub.ancestry, expected_ancestry)
         assert np.array_equal(gts_sub.variants, expected_variants)
 
-    @pytest.mark.xfail(reason="not implemented yet")
     def test_write_genotypes(self):
-        assert False
+        gts = self._get_fake_genotypes()
+        gts.popnum_ancestry = {v: k for k, v in gts.ancestry_labels.items()}
+        gts.valid_labels = np.arange(gts.ancestry.size).reshape(gts.ancestry.shape)
+        gts.haplotype_labels = tuple(f"REF{i // 2}" for i in range(gts.ancestry.size))
+
+        # BCFs are always written by pysam, so we can compare against them
+        records = {}
+        for ext in ("vcf", "bcf"):
+            gts.fname = DATADIR / f"test_write_ancestry.{ext}"
+            gts.write(chunk_size=3)
+            with VariantFile(str(gts.fname)) as vcf:
+                records[ext] = [str(rec) for rec in vcf]
+        assert records["vcf"] == records["bcf"]
+        assert records["vcf"][0].split("\t")[8:10] == [
+            "GT:POP:SAMPLE",
+            "0|0:YRI,CEU:REF0,REF0",
+        ]
+
+        new_gts = GenotypesAncestry(DATADIR / "test_write_ancestry.vcf")
+        new_gts.read()
+        np.testing.assert_allclose(gts.data, new_gts.data)
+        np.testing.assert_allclose(gts.ancestry, new_gts.ancestry)
+        assert gts.samples == new_gts.samples
+
+        for ext in ("vcf", "bcf"):
+            (DATADIR / f"test_write_ancestry.{ext}").unlink()
+
+    def test_write_genotypes_unicode_labels(self):
+        gts = self._get_fake_genotypes()
+        gts.popnum_ancestry = {v: k for k, v in gts.ancestry_labels.items()}
+        gts.valid_labels = np.arange(gts.ancestry.size).reshape(gts.ancestry.shape)
+        gts.haplotype_labels = tuple(f"RÉF{i // 2}" for i in range(gts.ancestry.size))
+
+        gts.fname = DATADIR / "test_write_ancestry_unicode.vcf"
+        gts.write(chunk_size=3)
+        with VariantFile(str(gts.fname)) as vcf:
+            records = [str(rec) for rec in vcf]
+        assert records[0].split("\t")[9] == "0|0:YRI,CEU:RÉF0,RÉF0"
+
+        gts.fname.unlink()
 
-    @pytest.mark.xfail(reason="not implemented yet")
     def test_write_genotypes_phase(self, prephased=True):
-        assert False
+        gts = self._get_fake_genotypes()
+        gts.popnum_ancestry = {v: k for k, v in gts.ancestry_labels.items()}
+
+        fname = DATADIR / "test_write_ancestry_phase.vcf"
+        gts.fname = fname
+        if prephased:
+            gts.data = gts.data[:, :, :2]
+            gts._prephased = True
+        else:
+            gts.data[:2, 1, 2] = 0
+        gts.write()
+
+        new_gts = GenotypesAncestry(fname)
+        if prephased:
+            new_gts._prephased = True
+        new_gts.read()
+
+        # check that everything matches what we expected
+        np.testing.assert_allclose(gts.data, new_gts.data)
+        np.testing.assert_allclose(gts.ancestry, new_gts.ancestry)
+
+        fname.unlink()
+
+    def test_write_genotypes_unphased(self):
+        self.test_write_genotypes_phase(prephased=False)
 
 
 class TestHaplotypesAncestry:
@@ -234,6 +333,29 @@ def test_basic(capfd):
     assert result.exit_code == 0
 
 
+def test_basic_cache(capfd, caplog):
+    gt_file = DATADIR / "simple.vcf.gz"
+    hp_file = DATADIR / "simple.hap"
+    cache_dir = DATADIR / "test_transform_cache"
+
+    cmd = f"transform --cache-dir {cache_dir} {gt_file} {hp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    first_out = capfd.readouterr().out
+    assert result.exit_code == 0
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # the second run should load the genotypes from the cache
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert "from cache" in caplog.text
+    assert captured.out == first_out
+    assert result.exit_code == 0
+
+    # clean up afterwards: delete the cache
+    shutil.rmtree(cache_dir)
+
+
 def test_basic_multiallelic(capfd):
     expected = """##fileformat=VCFv4.2
 ##FILTER=<ID=PASS,Description="All filters passed">
@@ -361,6 +483,22 @@ def test_ancestry_from_vcf(capfd):
     assert result.exit_code == 0
 
 
+def test_ancestry_from_vcf_cache(capfd, caplog):
+    gt_file = DATADIR / "simple-ancestry.vcf"
+    hp_file = DATADIR / "simple.hap"
+    cache_dir = DATADIR / "test_transform_ancestry_cache"
+
+    cmd = f"transform --ancestry --cache-dir {cache_dir} {gt_file} {hp_file}"
+    runner = CliRunner()
+    result = runner.invoke(main, cmd.split(" "), catch_exceptions=False)
+    captured = capfd.readouterr()
+    assert captured.out == ancestry_results
+    assert result.exit_code == 0
+    # the ancestry labels cannot be cached, so the cache directory is ignored
+    assert "Ignoring the cache directory" in caplog.text
+    assert not cache_dir.exists()
+
+
 def test_ancestry_from_bp(capfd):
     gt_file = DATADIR / "simple.vcf"
     hp_file = DATADIR / "simple.hap"